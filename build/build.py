@@ -175,6 +175,9 @@ def compile() -> None:
         out_path = SNESIDEOUT / rel_path.with_suffix(".exe")
         out_path.parent.mkdir(parents=True, exist_ok=True)
 
+        # Modules without an entry point are bundled into the executables importing them
+        is_entry = '__name__ == "__main__"' in file.read_text(encoding="utf-8")
+
         if len(sys.argv) > 1 and sys.argv[1] == "linux":
             # On Linux, copy the .py file and create a .bat file to call it with python
 
@@ -182,13 +185,16 @@ def compile() -> None:
             py_out.parent.mkdir(parents=True, exist_ok=True)
             shutil.copy(file, py_out)
 
+            if not is_entry:
+                continue
+
             bat_path = out_path.with_suffix(".bat")
 
             with open(bat_path, "w") as bat_file:
 
                 bat_file.write(f'@echo off\npython "{Path(py_out).resolve().absolute()}" %*\n')
 
-        else:
+        elif is_entry:
 
             from buildModules.buildPy import main as mpy
 
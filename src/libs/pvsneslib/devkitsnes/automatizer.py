@@ -1,8 +1,25 @@
+from concurrent.futures import ThreadPoolExecutor
+from buildtrace import BuildTrace, wait_with_cpu_time
+from depscan import DependencyScanner
+from objcache import ObjectCache, default_cache_dir
+from toolchain import Toolchain
+from watcher import ProjectWatcher
+from linkorder import LinkOrder
+from wlaobj import SymbolIndex
+from symfile import SymbolTable, read_rom_banks, print_report
 from tkinter import messagebox
 from pathlib import Path
 import tkinter as tk
 import subprocess
+import threading
+import argparse
+import tempfile
+import shutil
+import hashlib
+import json
+import time
 import sys
+import os
 
 def get_executable_path():
     """
@@ -159,8 +176,13 @@ class ReorderList:
 
 class SNESAutomatizer:
 
-    def __init__(self, src_dir: Path, memory_map: str, speed: str, debug: bool):
-        """Initialize the SNESAutomatizer with source directory, memory map, speed, and debug mode."""
+    MANIFEST_VERSION = 1
+
+    # Dropped in every build directory, so builds of other configurations or debug runs are never taken as sources
+    BUILD_MARKER = '.snes-ide-build'
+
+    def __init__(self, src_dir: Path, memory_map: str, speed: str, debug: bool, jobs: int = 1, incremental: bool = False, scratch_root: Path | None = None, reorder: bool = False, timings_dir: Path | None = None, object_cache: ObjectCache | None = None, all_libs: bool = False, build_dir: Path | None = None, output: Path | None = None, deps: DependencyScanner | None = None, tool_commands: dict[str, list[str]] | None = None, wine_batch: bool = True, bank_report: bool = False):
+        """Initialize the SNESAutomatizer with source directory, memory map, speed, debug mode, parallel jobs, build caches, scratch area, linkfile GUI, timing reports, library selection, build directory, ROM path, toolchain backend options and bank report."""
 
         self.base_dir = Path(get_executable_path()).parent
 
@@ -174,6 +196,15 @@ class SNESAutomatizer:
 
         self.debug = debug
 
+        # 0 (or less) means one job per available core
+        self.jobs = jobs if jobs > 0 else (os.cpu_count() or 1)
+
+        # Keep objects between runs and only rebuild units whose key changed
+        self.incremental = incremental
+
+        # Objects shared by every project of the user; debug builds need the intermediates so they skip it
+        self.object_cache = None if debug else object_cache
+
         if not self.src_dir.exists() or not self.src_dir.is_dir():
 
             raise Exception("Path does not exists or is not a path")
@@ -190,6 +221,77 @@ class SNESAutomatizer:
         self.opt = self.tools_dir / '816-opt.exe'
         self.ctf = self.tools_dir / 'constify.exe'
 
+        # How each tool runs: natively, under Wine (one batch file per worker and stage when possible), or overridden by tool_commands
+        self.toolchain = Toolchain(default_cache_dir().parent / 'toolchain.json', tool_commands, wine_batch)
+        self._tool_env = self.toolchain.environment()
+
+        # Fail-fast state shared by the compile jobs
+        self._cancel = threading.Event()
+        self._procs: set[subprocess.Popen] = set()
+        self._procs_lock = threading.Lock()
+        self._failure: Exception | None = None
+
+        # Objects, debug intermediates, linkfile, symbols and caches go beside the sources unless a build directory mirrors the layout
+        self.settings_dir = self.src_dir / '.snes-ide'
+        self.build_dir = Path(build_dir).absolute() if build_dir else None
+        self.cache_dir = self.build_dir or self.settings_dir
+
+        # The ROM always ends up in the project, a build directory gets the linker output and its .sym first
+        self.rom_path = Path(output) if output else self.src_dir / 'output.sfc'
+        self.output_path = self.build_dir / self.rom_path.name if self.build_dir else self.rom_path
+
+        # Build manifest: source path -> key of the inputs its object was built from
+        self.manifest_path = self.cache_dir / 'manifest.json'
+        self._manifest: dict[str, str] = {}
+        self._pending_keys: dict[Path, str] = {}
+        self._toolchain_key: str | None = None
+
+        # Include/incbin graph, so a header or asset change rebuilds the units using it; a shared one is loaded, scanned and saved by its owner
+        self._owns_deps = deps is None
+        self.deps = deps or DependencyScanner(self.src_dir, [self.devkit_dir / 'include'], self.cache_dir / 'deps.json')
+
+        # Outside debug mode .ps/.asp/.asm intermediates live in a throwaway (preferably in-memory) directory
+        self.scratch_root = Path(scratch_root) if scratch_root else self._default_scratch_root()
+        self._scratch: tempfile.TemporaryDirectory | None = None
+
+        # Headless linkfile ordering, the ReorderList window only opens when asked for
+        self.reorder = reorder
+        self.link_order = LinkOrder(self.build_dir or self.src_dir, self.lib_dir, self.settings_dir / 'linkorder.json')
+
+        # Only the library objects the project references are linked, unless all_libs is set
+        self.all_libs = all_libs
+        self.symbols = SymbolIndex(self.cache_dir / f'symbols-{self.lib_dir.name}.json')
+
+        # ROM bank occupancy from the linker's symbol file, printed after each link
+        self.bank_report = bank_report
+
+        # Wall and CPU time of every tool invocation, written to timings_dir after each build
+        self.trace = BuildTrace()
+        self.timings_dir = Path(timings_dir) if timings_dir else None
+
+        # Manifest and dependency state stay in memory across the rebuilds of watch mode
+        self._state_loaded = False
+
+    @staticmethod
+    def _default_scratch_root() -> Path | None:
+        """Return a tmpfs mount for intermediates when there is one, or None for the system temp dir."""
+
+        shm = Path('/dev/shm')
+
+        if shm.is_dir() and os.access(shm, os.W_OK):
+            return shm
+
+        return None
+
+    @classmethod
+    def default_build_dir(cls, src_dir: Path, root: Path | None = None) -> Path:
+        """Return a build directory for a project on tmpfs (or the temp dir), stable across runs so incremental builds work."""
+
+        src_dir = Path(src_dir).resolve()
+        root = root or cls._default_scratch_root() or Path(tempfile.gettempdir())
+
+        return root / f"snes-ide-{src_dir.name}-{hashlib.sha256(str(src_dir).encode()).hexdigest()[:12]}"
+
     def _get_lib_dir(self):
         """Return the library directory based on memory map and speed."""
 
@@ -220,57 +322,510 @@ class SNESAutomatizer:
         if not self.src_dir.exists() or not self.src_dir.is_dir():
             raise Exception("Source directory does not exist or is not a directory.")
 
-        self.c_files = list(self.src_dir.rglob("*.c"))
-        self.asm_files = list(self.src_dir.rglob("*.asm"))
+        self.c_files = []
+        self.asm_files = []
+
+        for dirpath, dirnames, filenames in os.walk(self.src_dir):
+
+            # Build outputs are never sources, even when a build directory lives inside the project
+            dirnames[:] = [name for name in dirnames if not self._is_build_dir(Path(dirpath) / name)]
+
+            for filename in filenames:
+
+                file = Path(dirpath) / filename
+
+                if file.suffix == '.c':
+                    self.c_files.append(file)
+
+                elif file.suffix == '.asm' and not self._is_c_intermediate(file):
+                    self.asm_files.append(file)
+
+    def _c_flags(self) -> list[str]:
+        """Return the compiler flags derived from memory map and speed."""
+
+        flags = []
+
+        if self.memory_map == "HIROM":
+            flags.append('-H')
+
+        if self.speed == "FAST":
+            flags.append('-F')
+
+        return flags
+
+    def _get_toolchain_key(self) -> str:
+        """Hash the toolchain binaries once, so a toolchain update invalidates every object."""
+
+        if self._toolchain_key is None:
+
+            digest = hashlib.sha256()
+
+            for tool in (self.cc, self.opt, self.ctf, self.assembler):
+
+                digest.update(tool.name.encode())
+                digest.update(tool.read_bytes() if tool.exists() else b"missing")
+                digest.update(self.toolchain.describe(tool).encode())
+
+            self._toolchain_key = digest.hexdigest()
+
+        return self._toolchain_key
+
+    def _portable_name(self, dep: str) -> str:
+        """Name a dependency relative to the project or the devkit includes, so equal trees share keys."""
+
+        path = Path(dep)
+
+        for base in (self.src_dir.resolve(), (self.devkit_dir / 'include').resolve()):
+
+            try:
+
+                return path.relative_to(base).as_posix()
+
+            except ValueError:
+
+                continue
+
+        return path.as_posix()
+
+    def _unit_key(self, file: Path) -> str:
+        """Return the cache key of a unit: its source, everything it includes, its flags and the toolchain."""
+
+        flags = self._c_flags() if file.suffix == '.c' else ['-d', '-s', '-x']
+
+        digest = hashlib.sha256(self.deps.digest(file).encode())
+
+        # Location independent, so the shared object cache hits across projects
+        for dep in self.deps.dependencies(file):
+
+            digest.update(self._portable_name(dep).encode())
+            digest.update(self.deps.digest(dep).encode())
+
+        digest.update(" ".join(flags).encode())
+        digest.update(self._get_toolchain_key().encode())
+
+        return digest.hexdigest()
+
+    def load_manifest(self):
+        """Load the build manifest left by the previous incremental build, if any."""
+
+        self._manifest = {}
+
+        try:
+
+            with open(self.manifest_path) as f:
+
+                data = json.load(f)
+
+            if data.get("version") == self.MANIFEST_VERSION:
+                self._manifest = data["units"]
+
+        except (OSError, ValueError, KeyError):
+
+            print("No usable build manifest found.")
+
+    def save_manifest(self):
+        """Write the build manifest, dropping units that are no longer part of the project."""
+
+        sources = {str(file.relative_to(self.src_dir)) for file in self.c_files + self.asm_files}
+        units = {name: key for name, key in self._manifest.items() if name in sources}
+
+        self.manifest_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.manifest_path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+
+            json.dump({"version": self.MANIFEST_VERSION, "units": units}, f, indent=1)
+
+        os.replace(tmp_path, self.manifest_path)
+
+    def affected_units(self, changed: list[Path]) -> list[Path]:
+        """Return the C and ASM files that have to be rebuilt after the given files changed."""
+
+        return self.deps.affected(changed, self.c_files + self.asm_files)
+
+    def _object(self, file: Path) -> Path:
+        """Return the object file of a source: beside it, or at the same place below the build directory."""
+
+        if self.build_dir is None:
+            return file.with_suffix('.obj')
+
+        return self.build_dir / file.relative_to(self.src_dir).with_suffix('.obj')
+
+    def _stale(self, files: list[Path]) -> list[Path]:
+        """Return the files whose object is missing or was built from different inputs, keying them for the caches."""
+
+        if not (self.incremental or self.object_cache):
+            return files
+
+        stale = []
+
+        for file in files:
+
+            key = self._unit_key(file)
+            name = str(file.relative_to(self.src_dir))
+
+            if self.incremental and self._manifest.get(name) == key and self._object(file).exists():
+                continue
+
+            self._pending_keys[file] = key
+            stale.append(file)
+
+        if len(stale) < len(files):
+            print(f"{len(files) - len(stale)} of {len(files)} files up to date, skipping them.")
+
+        return stale
+
+    def _run_stage(self, args: list, stdout=None, unit: Path | None = None, stage: str | None = None, units: list[Path] | None = None) -> str:
+        """Run one toolchain stage for a unit (or a batch of units), timing it and returning its output; raise if it fails or the build was cancelled."""
+
+        if self._cancel.is_set():
+            raise Exception("Build cancelled")
+
+        start = time.perf_counter()
+
+        proc = subprocess.Popen(
+            self.toolchain.command(args[0]) + list(args[1:]),
+            stdout=stdout if stdout is not None else subprocess.PIPE,
+            stderr=subprocess.STDOUT if stdout is None else subprocess.PIPE,
+            text=True,
+            env=self._tool_env
+        )
+
+        with self._procs_lock:
+
+            self._procs.add(proc)
+
+            if self._cancel.is_set():
+                proc.kill()
+
+        try:
+
+            # A single pipe is read, so reading it to the end can't deadlock
+            pipe = proc.stdout if stdout is None else proc.stderr
+            output = pipe.read()
+            pipe.close()
+
+            returncode, cpu = wait_with_cpu_time(proc)
+
+        finally:
+
+            with self._procs_lock:
+                self._procs.discard(proc)
+
+        self.trace.record(stage or Path(args[0]).stem, unit, start, time.perf_counter() - start, cpu, units)
+
+        if self._cancel.is_set():
+            raise Exception("Build cancelled")
+
+        if returncode != 0:
+            raise Exception(f"{Path(args[0]).name} failed with exit code {returncode}:\n{output}")
+
+        return output
+
+    def _abort(self, error: Exception):
+        """Record the first failure and stop every stage still running."""
+
+        with self._procs_lock:
+
+            if self._failure is None:
+                self._failure = error
+
+            self._cancel.set()
+
+            for proc in self._procs:
+                proc.kill()
+
+    def _run_job(self, job, file: Path) -> str:
+        """Run a single per-file job, aborting the whole build when it fails."""
+
+        key = self._pending_keys.get(file)
+        obj_file = self._object(file)
+        obj_file.parent.mkdir(parents=True, exist_ok=True)
+
+        try:
+
+            if key and self.object_cache and self.object_cache.fetch(key, obj_file):
+
+                output = f"{file.name}: taken from the object cache\n"
+
+            else:
+
+                output = job(file)
+
+                if key and self.object_cache:
+                    self.object_cache.store(key, obj_file)
+
+        except Exception as e:
+
+            self._abort(e)
+            raise
+
+        self._built(file)
+
+        return output
+
+    def _built(self, file: Path):
+        """Record in the manifest the key an up to date object was built from."""
+
+        if file in self._pending_keys:
+
+            with self._procs_lock:
+                self._manifest[str(file.relative_to(self.src_dir))] = self._pending_keys.pop(file)
+
+    def _run_batch(self, steps, files: list[Path]) -> str:
+        """Build files in one Wine batch file, a single cmd session for all their tool steps; objects in the object cache are fetched."""
+
+        output = ""
+        todo = []
+
+        try:
+
+            for file in files:
+
+                obj_file = self._object(file)
+                obj_file.parent.mkdir(parents=True, exist_ok=True)
+                key = self._pending_keys.get(file)
+
+                if key and self.object_cache and self.object_cache.fetch(key, obj_file):
+
+                    output += f"{file.name}: taken from the object cache\n"
+                    self._built(file)
+
+                else:
+
+                    todo.append(file)
+
+            if not todo:
+                return output
+
+            units = [(file, steps(file)) for file in todo]
+
+            # The batch is named after its first file, batches of a stage never share one; even debug builds keep it out of the project
+            bat_file = self._scratch_file(todo[0], '.bat')
+            stamps = bat_file.with_suffix('.stamps')
+            shutil.rmtree(stamps, ignore_errors=True)
+            stamps.mkdir()
+
+            self.toolchain.write_batch(bat_file, [(f"{'Compiling' if file.suffix == '.c' else 'Assembling'} {file.name}...", file_steps) for file, file_steps in units], stamps)
+
+            try:
+
+                output += self._run_stage([bat_file], stage='wine-batch', units=todo)
+
+            finally:
+
+                self._trace_batch(stamps, units)
+
+            for file in todo:
+
+                key = self._pending_keys.get(file)
+
+                if key and self.object_cache:
+                    self.object_cache.store(key, self._object(file))
+
+                self._built(file)
+
+        except Exception as e:
+
+            self._abort(e)
+            raise
+
+        return output
+
+    def _trace_batch(self, stamps: Path, units: list[tuple[Path, list]]):
+        """Turn the stamps a Wine batch left around its steps into per-unit, per-stage trace events (without CPU time, only known for the whole batch)."""
+
+        # Stamps carry wall clock times, the trace counts on perf_counter
+        offset = time.perf_counter() - time.time()
+        times = []
+
+        while True:
+
+            try:
+
+                times.append(os.stat(stamps / str(len(times))).st_mtime_ns / 1e9 + offset)
+
+            except OSError:
+
+                break
+
+        steps = [(file, Path(args[0]).stem) for file, file_steps in units for args, _ in file_steps]
+
+        # A failed step leaves no stamp after it, it and the steps never run get no event
+        for (file, stage), start, end in zip(steps, times, times[1:]):
+            self.trace.record(stage, file, start, max(end - start, 0.0), None)
+
+    def _run_batches(self, steps, files: list[Path]):
+        """Split files over self.jobs Wine batch files run at once, so Wine starts once per worker instead of once per tool run."""
+
+        self._cancel.clear()
+        self._failure = None
+
+        shares = [files[i::self.jobs] for i in range(min(self.jobs, len(files)))]
+
+        with ThreadPoolExecutor(max_workers=max(len(shares), 1)) as pool:
+
+            futures = [pool.submit(self._run_batch, steps, share) for share in shares]
+
+            try:
+
+                for future in futures:
+                    print(future.result(), end="")
+
+            except Exception as e:
+
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise self._failure or e
+
+    def _run_jobs(self, job, files: list[Path]):
+        """Run job for every file on at most self.jobs workers, printing each output in file order."""
+
+        self._cancel.clear()
+        self._failure = None
+
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+
+            futures = [pool.submit(self._run_job, job, file) for file in files]
+
+            try:
+
+                for future in futures:
+                    print(future.result(), end="")
+
+            except Exception as e:
 
-    def compile_c_files(self):
-        """Compile C files to assembly files using the devkit tools."""
+                pool.shutdown(wait=True, cancel_futures=True)
+                raise self._failure or e
 
-        for c_file in self.c_files:
+    def _intermediate(self, c_file: Path, suffix: str) -> Path:
+        """Return where an intermediate of a C file goes: beside its object in debug mode, in the scratch area otherwise."""
 
-            ps_file = c_file.with_suffix('.ps')
-            asp_file = c_file.with_suffix('.asp')
-            asm_file = c_file.with_suffix('.asm')
-            obj_file = c_file.with_suffix('.obj')
+        if self.debug:
+            return self._object(c_file).with_suffix(suffix)
 
-            args = [self.cc, '-I' + str(self.devkit_dir / "include"), '-Wall', '-c', c_file]
+        return self._scratch_file(c_file, suffix)
 
-            if self.memory_map == "HIROM":
-                args.append('-H')
+    def _scratch_file(self, file: Path, suffix: str) -> Path:
+        """Return the path of a file derived from a source in the scratch area, created on first use."""
 
-            if self.speed == "FAST":
-                args.append('-F')
+        with self._procs_lock:
 
-            args += ['-o', ps_file]
-            subprocess.run(args)
+            if self._scratch is None:
+                self._scratch = tempfile.TemporaryDirectory(prefix="snes-ide-", dir=self.scratch_root)
 
-            with open(asp_file, "w") as f:
+        path = Path(self._scratch.name) / file.relative_to(self.src_dir).with_suffix(suffix)
+        path.parent.mkdir(parents=True, exist_ok=True)
 
-                subprocess.run([self.opt, ps_file], stdout=f)
+        return path
 
-            subprocess.run([self.ctf, c_file, asp_file, asm_file])
-            subprocess.run([self.assembler, '-d', '-s', '-x', '-o', obj_file, asm_file])
+    def _remove_scratch(self):
+        """Delete the scratch area and every intermediate in it."""
 
-    def assemble_asm_files(self):
-        """Assemble ASM files to object files using the assembler."""
+        if self._scratch is not None:
 
-        for asm_file in self.asm_files:
+            self._scratch.cleanup()
+            self._scratch = None
 
-            subprocess.run([self.assembler, '-d', '-s', '-x', '-o', asm_file.with_suffix('.obj'), asm_file])
+    def _c_steps(self, c_file: Path) -> list[tuple[list, Path | None]]:
+        """Return the tcc -> 816-opt -> constify -> wla-65816 chain of one C file as (command, stdout file) steps."""
+
+        ps_file = self._intermediate(c_file, '.ps')
+        asp_file = self._intermediate(c_file, '.asp')
+        asm_file = self._intermediate(c_file, '.asm')
+
+        args = [self.cc, '-I' + str(self.devkit_dir / "include"), '-Wall', '-c', c_file]
+        args += self._c_flags()
+        args += ['-o', ps_file]
+
+        return [
+            (args, None),
+            ([self.opt, ps_file], asp_file),
+            ([self.ctf, c_file, asp_file, asm_file], None),
+            ([self.assembler, '-d', '-s', '-x', '-o', self._object(c_file), asm_file], None)
+        ]
+
+    def _asm_steps(self, asm_file: Path) -> list[tuple[list, Path | None]]:
+        """Return the wla-65816 step of one ASM file."""
+
+        return [([self.assembler, '-d', '-s', '-x', '-o', self._object(asm_file), asm_file], None)]
+
+    def _compile_c_file(self, c_file: Path) -> str:
+        """Run the tcc -> 816-opt -> constify -> wla-65816 chain for one C file."""
+
+        output = f"Compiling {c_file.name}...\n"
+
+        for args, stdout in self._c_steps(c_file):
+
+            if stdout is None:
+
+                output += self._run_stage(args, unit=c_file)
+                continue
+
+            with open(stdout, "w") as f:
+
+                output += self._run_stage(args, stdout=f, unit=c_file)
+
+        return output
+
+    def _assemble_asm_file(self, asm_file: Path) -> str:
+        """Assemble one ASM file to an object file."""
+
+        output = f"Assembling {asm_file.name}...\n"
+
+        return output + self._run_stage(self._asm_steps(asm_file)[0][0], unit=asm_file)
+
+    def compile_c_files(self, files: list[Path] | None = None) -> int:
+        """Compile C files (all of them by default) to object files, self.jobs files at a time; return how many were built."""
+
+        stale = self._stale(self.c_files if files is None else files)
+
+        # Under Wine each worker runs the chains of all its files in one cmd session instead of paying four emulator launches per file
+        if stale and self.toolchain.can_batch([self.cc, self.opt, self.ctf, self.assembler]):
+            self._run_batches(self._c_steps, stale)
+
+        else:
+            self._run_jobs(self._compile_c_file, stale)
+
+        return len(stale)
+
+    def assemble_asm_files(self, files: list[Path] | None = None) -> int:
+        """Assemble ASM files (all of them by default) to object files, self.jobs files at a time; return how many were built."""
+
+        stale = self._stale(self.asm_files if files is None else files)
+
+        if stale and self.toolchain.can_batch([self.assembler]):
+            self._run_batches(self._asm_steps, stale)
+
+        else:
+            self._run_jobs(self._assemble_asm_file, stale)
+
+        return len(stale)
 
     def create_linkfile(self):
-        """Create a linkfile for the linker with all object files and libraries."""
+        """Create a linkfile for the linker with the object files and the libraries they need, in the saved or default order."""
+
+        objects = list(dict.fromkeys(self._object(file) for file in self.asm_files + self.c_files))
+        libraries = sorted(file for file in self.lib_dir.rglob("*") if file.is_file())
 
-        linkfile: list[str] = [str(obj_file.with_suffix('.obj')) for obj_file in self.asm_files + self.c_files]
-        linkfile.insert(0, "[objects]")
+        if not self.all_libs:
 
-        for file in self.lib_dir.rglob("*"):
+            selected = self.symbols.select(objects, libraries)
+            self.symbols.save()
 
-            linkfile.append(str(file))
+            if len(selected) < len(libraries):
+                print(f"Linking {len(selected)} of {len(libraries)} library objects.")
 
-        linkfile = ReorderList(linkfile).reorder_list()
+            libraries = selected
 
-        linkfile_path = self.src_dir / 'linkfile'
+        linkfile = self.link_order.resolve(objects, libraries)
+
+        # The drag and drop window only opens on request, its confirmed order is kept for the next builds
+        if self.reorder:
+
+            linkfile = ReorderList(linkfile).reorder_list()
+            self.link_order.save(linkfile)
+
+        linkfile_path = (self.build_dir or self.src_dir) / 'linkfile'
 
         print("Creating Linkfile...")
 
@@ -288,37 +843,60 @@ class SNESAutomatizer:
         
         print("Linking files...")
 
-        subprocess.run([
+        print(self._run_stage([
             self.linker, '-d', '-s', '-c', '-v', '-A', '-L' + str(self.lib_dir),
-            linkfile_path, self.src_dir / 'output.sfc'
-        ])
+            linkfile_path, self.output_path
+        ]), end="")
+
+        if self.output_path != self.rom_path:
+            shutil.copyfile(self.output_path, self.rom_path)
+
+        if self.bank_report:
+            self.print_bank_report()
 
         print("\nBuild finished succesfully!\n")
 
-    def cleanup(self):
-        """Remove temporary files created during the build process."""
+    def print_bank_report(self):
+        """Print per-bank fill, the largest sections and the free space, read from the symbol file of the last link."""
 
-        try:
+        sym_path = self.output_path.with_suffix('.sym')
 
-            for c_file in self.c_files:
+        if not sym_path.exists():
 
-                for ext in ['.ps', '.asp', '.asm', '.obj']:
+            print("No symbol file, no bank report.")
+            return
 
-                    Path.unlink(c_file.with_suffix(ext), missing_ok=True)
+        table = SymbolTable(sym_path, self.memory_map)
+        rom_banks = read_rom_banks(self.src_dir / 'hdr.asm') or max((bank["bank"] + 1 for bank in table.bank_usage(0)), default=1)
 
-            for asm_file in self.asm_files:
+        print_report(table.report(rom_banks))
+
+    def remove_temp_files(self):
+        """Remove the objects (unless incremental), linkfile and symbol file of the last build."""
+
+        try:
 
-                Path.unlink(asm_file.with_suffix('.obj'), missing_ok=True)
+            # .ps/.asp/.asm intermediates only land beside the objects in debug mode, which never cleans up
+            if not self.incremental:
 
+                for file in self.c_files + self.asm_files:
 
-            Path.unlink(self.src_dir / "linkfile", missing_ok=True)
+                    Path.unlink(self._object(file), missing_ok=True)
 
-            Path.unlink(self.src_dir / 'output.sym', missing_ok=True)
+
+            Path.unlink((self.build_dir or self.src_dir) / "linkfile", missing_ok=True)
+
+            Path.unlink(self.output_path.with_suffix('.sym'), missing_ok=True)
             
         except Exception as e:
 
             print(f"Cleanup error: {e}")
 
+    def cleanup(self):
+        """Remove temporary files created during the build process."""
+
+        self.remove_temp_files()
+
         print("TEMP FILES REMOVED SUCCESFULLY!")
 
         input("PRESS ANY KEY TO EXIT...")
@@ -327,20 +905,169 @@ class SNESAutomatizer:
     def debug_info(self):
         """Display debug information and instructions for the user."""
 
-        print("Debug files in source directory: .ps -> tcc_dbg, .asp -> opt_dbg, .asm -> constifier debug, .sym -> linker debug")
+        print(f"Debug files in {self.build_dir or 'source directory'}: .ps -> tcc_dbg, .asp -> opt_dbg, .asm -> constifier debug, .sym -> linker debug")
         input("PRESS ANY KEY TO EXIT...")
 
+    def _is_build_dir(self, directory: Path) -> bool:
+        """Tell whether a directory holds project settings or build outputs rather than sources."""
+
+        directory = directory.absolute()
+
+        return directory in (self.settings_dir.absolute(), self.build_dir) or (directory / self.BUILD_MARKER).exists()
+
+    def _in_build_tree(self, path: Path) -> bool:
+        """Tell whether a path is below the project settings or a build directory."""
+
+        return any(self._is_build_dir(parent) for parent in path.absolute().parents)
+
+    def _is_c_intermediate(self, path: Path) -> bool:
+        """Tell whether an .asm file is the constify output of a C file rather than a source."""
+
+        return path.suffix == '.asm' and path.with_suffix('.c').exists()
+
+    def _update_file_index(self, changed: set[Path]):
+        """Add created and drop deleted C/ASM files (or whole deleted directories) without rescanning the whole tree."""
+
+        for path in changed:
+
+            if not path.exists():
+
+                # A deleted or moved-away directory takes every indexed file below it along
+                self.c_files = [file for file in self.c_files if file != path and path not in file.parents]
+                self.asm_files = [file for file in self.asm_files if file != path and path not in file.parents]
+                continue
+
+            if path.suffix not in ('.c', '.asm') or self._in_build_tree(path) or self._is_c_intermediate(path):
+                continue
+
+            files = self.c_files if path.suffix == '.c' else self.asm_files
+
+            if path not in files:
+                files.append(path)
+
+    def build(self, changed: set[Path] | None = None, collect: bool = True) -> int:
+        """Compile what is out of date and link; with changed files, only the units they affect are checked. Return the units built.
+
+        With collect off the C/ASM file lists already set (by a matrix build) are used instead of walking the project.
+        """
+
+        self.trace.start()
+        self.toolchain.warm_up([self.cc, self.opt, self.ctf, self.assembler, self.linker])
+
+        if self.build_dir:
+
+            self.build_dir.mkdir(parents=True, exist_ok=True)
+            (self.build_dir / self.BUILD_MARKER).touch()
+
+        if changed is not None:
+            self._update_file_index(changed)
+
+        elif collect:
+            self.collect_files()
+
+        if self.incremental or self.object_cache:
+
+            if not self._state_loaded:
+
+                self.load_manifest()
+
+                if self._owns_deps:
+                    self.deps.load()
+
+                self._state_loaded = True
+
+            if self._owns_deps:
+                self.deps.scan(self.c_files + self.asm_files)
+
+        units = None if changed is None else self.affected_units(list(changed))
+
+        try:
+
+            built = self.compile_c_files(None if units is None else [f for f in units if f.suffix == '.c'])
+            built += self.assemble_asm_files(None if units is None else [f for f in units if f.suffix == '.asm'])
+
+        finally:
+
+            self._remove_scratch()
+
+            if self.incremental or self.object_cache:
+
+                self.save_manifest()
+
+                if self._owns_deps:
+                    self.deps.save()
+
+            self.toolchain.save()
+
+            if self.object_cache:
+
+                print(f"Object cache: {self.object_cache.hits} hit(s), {self.object_cache.misses} miss(es)")
+                self.object_cache.evict()
+
+        # Removing a file changes the ROM without rebuilding anything
+        if built or changed is None or any(not path.exists() for path in changed):
+            self.link(self.create_linkfile())
+
+        if self.timings_dir:
+
+            self.trace.write(self.timings_dir)
+            print(f"Build timings written to {self.timings_dir}")
+
+        return built
+
+    def _is_build_output(self, path: Path) -> bool:
+        """Tell the watcher which paths it should not react to: outputs, intermediates and caches."""
+
+        if self._in_build_tree(path):
+            return True
+
+        if path.suffix in ('.obj', '.ps', '.asp', '.bat', '.sfc', '.sym', '.tmp') or path.name == 'linkfile':
+            return True
+
+        return self._is_c_intermediate(path)
+
+    def watch(self, debounce: float = 0.3, polling: bool = False):
+        """Build once, then keep rebuilding what each burst of saved files affects until interrupted."""
+
+        self.incremental = True
+
+        self.build()
+
+        # A rebuild never reopens the reorder window, the confirmed order is saved
+        self.reorder = False
+
+        watcher = ProjectWatcher(self.src_dir, self._is_build_output, polling)
+        print(f"Watching {self.src_dir} ({watcher.mode}), press Ctrl+C to stop...")
+
+        try:
+
+            while True:
+
+                changed = watcher.wait(debounce)
+                start = time.perf_counter()
+
+                try:
+
+                    built = self.build(changed)
+                    print(f"Rebuilt {built} unit(s) for {len(changed)} changed file(s) in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+                except Exception as e:
+
+                    print(f"Build failed after {(time.perf_counter() - start) * 1000:.0f} ms: {e}")
+
+        except KeyboardInterrupt:
+
+            print("Watch mode stopped.")
+
+        finally:
+
+            watcher.close()
+
     def run(self):
         """Run the automatizer to collect files, compile C files, assemble ASM files, create linkfile, and link."""
         print("Starting SNES Automatizer...")
 
-        self.collect_files()
-        self.compile_c_files()
-        self.assemble_asm_files()
-
-        linkfile_path = self.create_linkfile()
-
-        self.link(linkfile_path)
+        self.build()
 
         if not self.debug:
 
@@ -350,18 +1077,186 @@ class SNESAutomatizer:
 
             self.debug_info()
 
+class SNESMatrixBuild:
+
+    CONFIGURATIONS = [("LOROM", "SLOW"), ("LOROM", "FAST"), ("HIROM", "SLOW"), ("HIROM", "FAST")]
+
+    def __init__(self, src_dir: Path, configurations: list[tuple[str, str]], debug: bool, **options):
+        """Initialize a matrix build of several memory map / speed configurations, options are passed to every SNESAutomatizer."""
+
+        self.src_dir = Path(src_dir)
+        self.debug = debug
+        self.variants: list[SNESAutomatizer] = []
+
+        timings_dir = options.pop('timings_dir', None)
+        build_root = Path(options.pop('build_dir', None) or self.src_dir / '.snes-ide' / 'build')
+
+        # The include graph and file hashes are shared: only the matrix loads, scans and saves them, variants just read them
+        self.deps = DependencyScanner(self.src_dir, [Path(get_executable_path()).parent / 'devkitsnes' / 'include'], build_root / 'deps.json')
+
+        for memory_map, speed in dict.fromkeys(configurations):
+
+            name = self.variant_name(memory_map, speed)
+
+            # Each configuration keeps its own objects and ROM
+            self.variants.append(SNESAutomatizer(
+                self.src_dir, memory_map, speed, debug, deps=self.deps,
+                build_dir=build_root / name,
+                output=self.src_dir / f'output_{name}.sfc',
+                timings_dir=Path(timings_dir) / name if timings_dir else None,
+                **options
+            ))
+
+    @staticmethod
+    def variant_name(memory_map: str, speed: str) -> str:
+        """Name a configuration after its library directory, e.g. LoROM_SlowROM."""
+
+        return ("HiROM" if memory_map == "HIROM" else "LoROM") + "_" + ("FastROM" if speed == "FAST" else "SlowROM")
+
+    def build(self) -> dict[str, int]:
+        """Walk, scan and hash the project once, then build every configuration concurrently; return the units built per variant."""
+
+        # Every build directory is marked first, so the single walk skips all of them
+        for variant in self.variants:
+
+            variant.build_dir.mkdir(parents=True, exist_ok=True)
+            (variant.build_dir / variant.BUILD_MARKER).touch()
+
+        first = self.variants[0]
+        first.collect_files()
+
+        for variant in self.variants[1:]:
+            variant.c_files, variant.asm_files = list(first.c_files), list(first.asm_files)
+
+        if first.incremental or first.object_cache:
+
+            self.deps.load()
+            self.deps.scan(first.c_files + first.asm_files)
+
+            # Every variant runs the same toolchain
+            for variant in self.variants:
+                variant._toolchain_key = first._get_toolchain_key()
+
+        built: dict[str, int] = {}
+        errors: dict[str, Exception] = {}
+
+        try:
+
+            with ThreadPoolExecutor(max_workers=len(self.variants)) as pool:
+
+                futures = {variant.lib_dir.name: pool.submit(variant.build, None, False) for variant in self.variants}
+
+                for name, future in futures.items():
+
+                    try:
+
+                        built[name] = future.result()
+
+                    except Exception as e:
+
+                        errors[name] = e
+
+        finally:
+
+            if first.incremental or first.object_cache:
+                self.deps.save()
+
+        for variant in self.variants:
+
+            if variant.lib_dir.name in built:
+                print(f"{variant.lib_dir.name}: {built[variant.lib_dir.name]} unit(s) built -> {variant.rom_path.name}")
+
+        if errors:
+            raise Exception("\n".join(f"{name} failed: {error}" for name, error in errors.items()))
+
+        return built
+
+    def run(self):
+        """Build every configuration, then clean up or show the debug information once."""
+
+        print(f"Starting SNES Automatizer for {len(self.variants)} configuration(s)...")
+
+        self.build()
+
+        if not self.debug:
+
+            for variant in self.variants[1:]:
+                variant.remove_temp_files()
+
+            self.variants[0].cleanup()
+
+        else:
+
+            for variant in self.variants:
+                print(f"{variant.lib_dir.name} debug files: {variant.build_dir}")
+
+            self.variants[0].debug_info()
+
 if __name__ == "__main__":
 
     base_dir = Path(get_executable_path()).parent
 
-    src_dir = Path(sys.argv[1])
-    memory_map: str = sys.argv[2]
-    speed: str = sys.argv[3]
+    parser = argparse.ArgumentParser(description="Compile and link a pvsneslib project into a SNES ROM.")
+    parser.add_argument("src_dir", type=Path, help="project source directory")
+    parser.add_argument("memory_map", nargs="?", help="HIROM or LOROM")
+    parser.add_argument("speed", nargs="?", help="FAST or SLOW")
+    parser.add_argument("-m", "--matrix", nargs="+", metavar="MAP:SPEED", help="build several configurations at once, e.g. LOROM:SLOW HIROM:FAST, or all")
+    parser.add_argument("-j", "--jobs", type=int, default=1, help="files compiled in parallel, 0 uses every core")
+    parser.add_argument("-i", "--incremental", action="store_true", help="keep objects and only rebuild changed files")
+    parser.add_argument("--reorder", action="store_true", help="open the linkfile reorder window and save the confirmed order")
+    parser.add_argument("-w", "--watch", action="store_true", help="keep running and rebuild whenever project files change")
+    parser.add_argument("--debounce", type=int, default=300, help="milliseconds without changes before a watch rebuild starts")
+    parser.add_argument("--poll", action="store_true", help="watch by polling file stats instead of inotify")
+    parser.add_argument("--timings", type=Path, default=None, help="write build-timings.json and a Chrome build-trace.json to this directory (under Wine batches, CPU time is per batch, not per step)")
+    parser.add_argument("--object-cache", nargs="?", const="", default=None, metavar="DIR", help="reuse objects across projects from a shared cache (default: per-user cache dir)")
+    parser.add_argument("--object-cache-size", type=int, default=512, metavar="MB", help="size cap of the shared object cache")
+    parser.add_argument("--all-libs", action="store_true", help="link every library object instead of only the referenced ones")
+    parser.add_argument("-b", "--build-dir", nargs="?", const="", default=None, metavar="DIR", help="write objects, linkfile, symbols and caches here instead of the project (default: a per-project dir on tmpfs)")
+    parser.add_argument("--no-wine-batch", action="store_true", help="launch every tool on its own under Wine instead of one batch file per worker and stage")
+    parser.add_argument("--bank-report", action="store_true", help="print ROM bank usage, the largest sections and free space after linking")
+    parser.add_argument("--scratch", type=Path, default=None, help="directory for intermediate files (defaults to /dev/shm or the temp dir)")
+
+    cli = parser.parse_args()
+
+    src_dir: Path = cli.src_dir
+    memory_map: str = cli.memory_map
+    speed: str = cli.speed
 
     if not src_dir.exists() or not src_dir.is_dir():
 
         raise Exception("Source directory does not exist or is not a directory.")
     
+    options = dict(
+        jobs=cli.jobs,
+        incremental=cli.incremental,
+        scratch_root=cli.scratch,
+        build_dir=None if cli.build_dir is None else Path(cli.build_dir or SNESAutomatizer.default_build_dir(src_dir, cli.scratch)),
+        timings_dir=cli.timings,
+        object_cache=None if cli.object_cache is None else ObjectCache(cli.object_cache or None, cli.object_cache_size * 1024 * 1024),
+        all_libs=cli.all_libs,
+        wine_batch=not cli.no_wine_batch,
+        bank_report=cli.bank_report
+    )
+
+    if cli.matrix:
+
+        if cli.watch or cli.reorder:
+            raise Exception("--watch and --reorder work on a single configuration, not with --matrix.")
+
+        if cli.matrix == ["all"]:
+
+            configurations = SNESMatrixBuild.CONFIGURATIONS
+
+        else:
+
+            configurations = [tuple(config.upper().split(":", 1)) for config in cli.matrix]
+
+            if any(config not in SNESMatrixBuild.CONFIGURATIONS for config in configurations):
+                raise Exception("Configurations must be HIROM or LOROM and FAST or SLOW, e.g. LOROM:SLOW.")
+
+        SNESMatrixBuild(src_dir, configurations, DebugModeSelector.ask_debug_mode(), **options).run()
+        sys.exit()
+
     if memory_map not in {"HIROM", "LOROM"}:
         
         raise Exception("Memory map must be either 'HIROM' or 'LOROM'.")
@@ -370,7 +1265,15 @@ if __name__ == "__main__":
         src_dir=src_dir, 
         memory_map=memory_map, 
         speed=speed, 
-        debug=DebugModeSelector.ask_debug_mode()
+        debug=DebugModeSelector.ask_debug_mode(),
+        reorder=cli.reorder,
+        **options
     )
 
-    automatizer.run()
+    if cli.watch:
+
+        automatizer.watch(cli.debounce / 1000, cli.poll)
+
+    else:
+
+        automatizer.run()
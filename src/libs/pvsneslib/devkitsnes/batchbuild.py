@@ -0,0 +1,245 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from automatizer import SNESAutomatizer, get_executable_path
+from toolstubs import stub_commands
+from pathlib import Path
+import contextlib
+import statistics
+import argparse
+import tempfile
+import difflib
+import json
+import time
+import io
+import os
+import re
+
+# SNESHEADER entries selecting the memory map and speed, comments stripped first
+HEADER_MAP = re.compile(r'^\s*(HIROM|LOROM)\b', re.MULTILINE | re.IGNORECASE)
+HEADER_SPEED = re.compile(r'^\s*(FASTROM|SLOWROM)\b', re.MULTILINE | re.IGNORECASE)
+
+
+def find_projects(corpus: Path) -> list[Path]:
+    """Return every project of a corpus: the directories holding an hdr.asm."""
+
+    return sorted(hdr.parent for hdr in Path(corpus).rglob("hdr.asm") if not (hdr.parent / SNESAutomatizer.BUILD_MARKER).exists())
+
+
+def project_configuration(project: Path) -> tuple[str, str]:
+    """Return the memory map and speed a project's hdr.asm asks for, LOROM/SLOW by default."""
+
+    text = re.sub(r';.*', '', (project / 'hdr.asm').read_text(errors="replace"))
+
+    memory_map = HEADER_MAP.search(text)
+    speed = HEADER_SPEED.search(text)
+
+    return (
+        memory_map.group(1).upper() if memory_map else "LOROM",
+        "FAST" if speed and speed.group(1).upper() == "FASTROM" else "SLOW"
+    )
+
+
+def _normalize(name: str) -> str:
+    """Reduce a project or ROM name to lowercase letters and digits."""
+
+    return re.sub(r'[^a-z0-9]', '', name.lower())
+
+
+def match_references(projects: list[Path], references: Path) -> dict[Path, Path | None]:
+    """Pair each project with its reference ROM by name: exact, then closest spelling, then the longest contained name."""
+
+    roms = {_normalize(rom.stem): rom for rom in sorted(Path(references).glob("*.sfc"))}
+    matches = {}
+
+    for project in projects:
+
+        name = _normalize(project.name)
+        rom = roms.get(name)
+
+        # e.g. Mode1ContinuosScroll -> Mode1ContinuousScroll.sfc
+        if rom is None:
+
+            close = difflib.get_close_matches(name, roms, n=1, cutoff=0.85)
+            rom = roms[close[0]] if close else None
+
+        # e.g. snes-logo-konami -> LogoKonami.sfc, typeconsole -> typeconsole_ntsc.sfc
+        if rom is None:
+
+            contained = sorted((key for key in roms if key in name or name in key), key=len, reverse=True)
+            rom = roms[contained[0]] if contained else None
+
+        matches[project] = rom
+
+    return matches
+
+
+def compare_roms(built: Path, reference: Path) -> dict:
+    """Compare a built ROM with its reference: identical or not, size and share of equal bytes."""
+
+    a, b = built.read_bytes(), reference.read_bytes()
+    equal = sum(x == y for x, y in zip(a, b))
+
+    return {
+        "identical": a == b,
+        "size": len(a),
+        "reference_size": len(b),
+        "equal_bytes": round(equal / max(len(a), len(b), 1), 4)
+    }
+
+
+def build_project(project: Path, build_root: Path, corpus: Path, options: dict) -> dict:
+    """Build one project in its own build directory and return its status, timings and ROM (runs in a worker process)."""
+
+    memory_map, speed = project_configuration(project)
+    build_dir = build_root / project.relative_to(corpus)
+    log = io.StringIO()
+
+    result = {"project": project.relative_to(corpus).as_posix(), "memory_map": memory_map, "speed": speed}
+    start, cpu_start = time.perf_counter(), os.times()
+
+    try:
+
+        with contextlib.redirect_stdout(log):
+
+            automatizer = SNESAutomatizer(project, memory_map, speed, False, build_dir=build_dir, output=build_dir / 'output.sfc', **options)
+            result["units"] = automatizer.build()
+
+        result["status"] = "ok"
+        result["rom"] = str(automatizer.rom_path)
+
+    except Exception as e:
+
+        result["status"] = "failed"
+        result["error"] = str(e).strip().splitlines()[-1] if str(e).strip() else type(e).__name__
+
+    cpu_end = os.times()
+
+    result["wall_s"] = time.perf_counter() - start
+    result["cpu_s"] = (cpu_end.user - cpu_start.user) + (cpu_end.system - cpu_start.system) + (cpu_end.children_user - cpu_start.children_user) + (cpu_end.children_system - cpu_start.children_system)
+
+    build_dir.mkdir(parents=True, exist_ok=True)
+    (build_dir / 'build.log').write_text(log.getvalue())
+
+    return result
+
+
+class BatchBuilder:
+
+    def __init__(self, corpus: Path, references: Path | None, build_root: Path, workers: int = 0, **options):
+        """Initialize a BatchBuilder over every project of corpus, options are passed to each SNESAutomatizer."""
+
+        self.corpus = Path(corpus).absolute()
+        self.references = Path(references) if references else None
+        self.build_root = Path(build_root).absolute()
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.options = options
+        self.projects = find_projects(self.corpus)
+
+    def run(self) -> dict:
+        """Build every project on all workers, then compare the ROMs and return the report."""
+
+        matches = match_references(self.projects, self.references) if self.references else {}
+        results = []
+
+        print(f"Building {len(self.projects)} projects on {self.workers} workers...")
+
+        start = time.perf_counter()
+
+        with ProcessPoolExecutor(max_workers=self.workers) as pool:
+
+            futures = {pool.submit(build_project, project, self.build_root, self.corpus, self.options): project for project in self.projects}
+
+            for future in as_completed(futures):
+
+                result = future.result()
+                reference = matches.get(futures[future])
+
+                result["reference"] = reference.name if reference else None
+
+                if result["status"] == "ok" and reference:
+                    result.update(compare_roms(Path(result["rom"]), reference))
+
+                results.append(result)
+                print(f"{result['status']:>6} {result['wall_s']:7.2f}s  {result['project']}" + (f"  ({result['error']})" if result["status"] != "ok" else ""))
+
+        wall = time.perf_counter() - start
+
+        return self.report(sorted(results, key=lambda result: result["project"]), wall)
+
+    def report(self, results: list[dict], wall: float) -> dict:
+        """Summarize throughput, per-project latency and reference comparisons."""
+
+        latencies = sorted(result["wall_s"] for result in results)
+        built = [result for result in results if result["status"] == "ok"]
+        compared = [result for result in built if "identical" in result]
+
+        def percentile(p: float) -> float:
+
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else 0.0
+
+        return {
+            "projects": len(results),
+            "built": len(built),
+            "failed": len(results) - len(built),
+            "workers": self.workers,
+            "wall_s": wall,
+            "throughput_per_s": len(results) / wall if wall else 0.0,
+            "latency_s": {
+                "mean": statistics.fmean(latencies) if latencies else 0.0,
+                "p50": percentile(0.5),
+                "p95": percentile(0.95),
+                "max": latencies[-1] if latencies else 0.0
+            },
+            "cpu_s": sum(result["cpu_s"] for result in results),
+            "compared": len(compared),
+            "identical": sum(result["identical"] for result in compared),
+            "results": results
+        }
+
+
+def print_report(report: dict):
+    """Print the summary of a batch build report."""
+
+    latency = report["latency_s"]
+
+    print(f"\n{report['built']} of {report['projects']} projects built, {report['failed']} failed, in {report['wall_s']:.2f}s on {report['workers']} workers")
+    print(f"Throughput: {report['throughput_per_s']:.2f} projects/s, CPU {report['cpu_s']:.2f}s")
+    print(f"Latency: mean {latency['mean']:.2f}s, p50 {latency['p50']:.2f}s, p95 {latency['p95']:.2f}s, max {latency['max']:.2f}s")
+    print(f"Reference ROMs: {report['identical']} of {report['compared']} compared ROMs identical")
+
+
+if __name__ == "__main__":
+
+    base_dir = Path(get_executable_path()).parent
+
+    parser = argparse.ArgumentParser(description="Build every example project, report throughput and latency and compare with the reference ROMs.")
+    parser.add_argument("corpus", type=Path, help="directory of projects, e.g. docs/examples")
+    parser.add_argument("--references", type=Path, default=base_dir.parent / 'bsnes' / 'Roms' / 'examples', help="directory of reference .sfc files (default: libs/bsnes/Roms/examples)")
+    parser.add_argument("--build-root", type=Path, default=None, help="where the build directories go (default: a temp dir)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="projects built at once, 0 uses every core")
+    parser.add_argument("--stub", action="store_true", help="replace the toolchain by hashing stand-ins, to measure the automatizer's own overhead")
+    parser.add_argument("--stub-delay", type=int, default=0, metavar="MS", help="milliseconds each stand-in tool sleeps")
+    parser.add_argument("--report", type=Path, default=None, help="write the full JSON report here")
+
+    cli = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="snes-ide-batch-") as tmp:
+
+        builder = BatchBuilder(
+            cli.corpus,
+            cli.references if cli.references.is_dir() else None,
+            cli.build_root or Path(tmp),
+            cli.workers,
+            tool_commands=stub_commands(cli.stub_delay) if cli.stub else None
+        )
+
+        report = builder.run()
+
+    print_report(report)
+
+    if cli.report:
+
+        with open(cli.report, 'w') as f:
+
+            json.dump(report, f, indent=1)
+
+        print(f"Report written to {cli.report}")
@@ -0,0 +1,106 @@
+from pathlib import Path
+import argparse
+import tempfile
+import socket
+import json
+import sys
+import os
+
+DEFAULT_PORT = 47811
+
+# Exit code telling scripts that no build server answered, so they can fall back to the automatizer (argparse already uses 2)
+NO_SERVER = 3
+
+
+def default_address() -> str:
+    """Return the address the build server listens on by default: a per-user UNIX socket, or a localhost port on Windows."""
+
+    if os.environ.get('SNES_IDE_BUILD_SERVER'):
+        return os.environ['SNES_IDE_BUILD_SERVER']
+
+    if hasattr(socket, 'AF_UNIX') and sys.platform != 'win32':
+
+        runtime_dir = os.environ.get('XDG_RUNTIME_DIR') or tempfile.gettempdir()
+
+        return f"unix:{Path(runtime_dir) / f'snes-ide-build-{os.getuid()}.sock'}"
+
+    return f"127.0.0.1:{DEFAULT_PORT}"
+
+
+def parse_address(address: str) -> tuple[int, str | tuple[str, int]]:
+    """Turn "unix:/path/to.sock" or "host:port" into a socket family and address."""
+
+    if address.startswith("unix:"):
+        return socket.AF_UNIX, address[5:]
+
+    host, _, port = address.rpartition(":")
+
+    return socket.AF_INET, (host or "127.0.0.1", int(port))
+
+
+def request(address: str, message: dict, timeout: float | None = None) -> dict:
+    """Send one JSON request to the build server and return its JSON response."""
+
+    family, target = parse_address(address)
+
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+
+        sock.settimeout(timeout)
+        sock.connect(target)
+        sock.sendall(json.dumps(message).encode() + b"\n")
+
+        with sock.makefile('rb') as f:
+
+            line = f.readline()
+
+    if not line:
+        raise ConnectionError("The build server closed the connection without answering")
+
+    return json.loads(line)
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Ask a running build server (buildserver.py) to build a project.")
+    parser.add_argument("src_dir", type=Path, nargs="?", help="project source directory")
+    parser.add_argument("memory_map", nargs="?", default="LOROM", help="HIROM or LOROM")
+    parser.add_argument("speed", nargs="?", default="SLOW", help="FAST or SLOW")
+    parser.add_argument("-d", "--debug", action="store_true", help="keep the intermediates, like the automatizer's debug mode")
+    parser.add_argument("--address", default=default_address(), help="unix:/path/to.sock or host:port of the server")
+    parser.add_argument("--ping", action="store_true", help="only check that the server is running")
+    parser.add_argument("--shutdown", action="store_true", help="stop the server")
+
+    cli = parser.parse_args()
+
+    if cli.ping:
+        message = {"command": "ping"}
+
+    elif cli.shutdown:
+        message = {"command": "shutdown"}
+
+    elif cli.src_dir is None:
+        parser.error("src_dir is required for a build")
+
+    else:
+        message = {"command": "build", "project": str(cli.src_dir.absolute()), "memory_map": cli.memory_map.upper(), "speed": cli.speed.upper(), "debug": cli.debug}
+
+    try:
+
+        response = request(cli.address, message)
+
+    except (OSError, ValueError) as e:
+
+        print(f"No build server at {cli.address}: {e}")
+        sys.exit(NO_SERVER)
+
+    if response.get("log"):
+        print(response["log"], end="")
+
+    if response.get("ok"):
+
+        print(response.get("message", "OK"))
+
+    else:
+
+        print(f"Build failed: {response.get('error')}")
+        sys.exit(1)
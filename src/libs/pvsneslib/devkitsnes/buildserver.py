@@ -0,0 +1,193 @@
+from buildclient import default_address, parse_address
+from automatizer import SNESAutomatizer
+from objcache import ObjectCache
+from pathlib import Path
+import socketserver
+import contextlib
+import threading
+import argparse
+import socket
+import json
+import time
+import io
+import os
+
+
+class BuildRequestHandler(socketserver.StreamRequestHandler):
+
+    def handle(self):
+        """Answer every JSON request line of a connection with a JSON response line."""
+
+        for line in self.rfile:
+
+            try:
+
+                response = self.server.build_server.dispatch(json.loads(line))
+
+            except Exception as e:
+
+                response = {"ok": False, "error": str(e)}
+
+            self.wfile.write(json.dumps(response).encode() + b"\n")
+            self.wfile.flush()
+
+            # Only stop once the shutdown request got its answer; shutdown() waits for serve_forever(), so not from this thread
+            if self.server.build_server.stopping:
+
+                threading.Thread(target=self.server.shutdown, daemon=True).start()
+                return
+
+
+class BuildServer:
+
+    def __init__(self, address: str, jobs: int = 0, tmpfs_build: bool = False, object_cache: ObjectCache | None = None):
+        """Initialize a resident BuildServer on address, keeping one warm SNESAutomatizer per project and configuration."""
+
+        self.address = address
+        self.jobs = jobs
+        self.tmpfs_build = tmpfs_build
+        self.object_cache = object_cache
+
+        # (project, memory map, speed, debug) -> automatizer with its manifest and dependency graph in memory
+        self._automatizers: dict[tuple, SNESAutomatizer] = {}
+
+        # Builds capture stdout, which is process wide, so they run one at a time (each one uses all its jobs)
+        self._build_lock = threading.Lock()
+        self.stopping = False
+
+    def _automatizer(self, project: Path, memory_map: str, speed: str, debug: bool) -> SNESAutomatizer:
+        """Return the warm automatizer of a project and configuration, creating it on first use."""
+
+        key = (str(project), memory_map, speed, debug)
+
+        if key not in self._automatizers:
+
+            self._automatizers[key] = SNESAutomatizer(
+                project, memory_map, speed, debug,
+                jobs=self.jobs,
+                incremental=True,
+                object_cache=self.object_cache,
+                build_dir=SNESAutomatizer.default_build_dir(project) if self.tmpfs_build else None
+            )
+
+        return self._automatizers[key]
+
+    def build(self, request: dict) -> dict:
+        """Build the project of a request and return the build log, ROM path and timing."""
+
+        project = Path(request["project"]).absolute()
+        memory_map = request.get("memory_map", "LOROM").upper()
+        speed = request.get("speed", "SLOW").upper()
+        debug = bool(request.get("debug", False))
+
+        if memory_map not in {"HIROM", "LOROM"} or speed not in {"FAST", "SLOW"}:
+            raise Exception("memory_map must be HIROM or LOROM and speed FAST or SLOW")
+
+        log = io.StringIO()
+
+        with self._build_lock:
+
+            start = time.perf_counter()
+
+            try:
+
+                with contextlib.redirect_stdout(log):
+
+                    automatizer = self._automatizer(project, memory_map, speed, debug)
+                    units = automatizer.build()
+
+                    if not debug:
+                        automatizer.remove_temp_files()
+
+            except Exception as e:
+
+                return {"ok": False, "error": str(e), "log": log.getvalue()}
+
+            wall = time.perf_counter() - start
+
+        return {
+            "ok": True,
+            "units": units,
+            "rom": str(automatizer.rom_path),
+            "wall_s": wall,
+            "log": log.getvalue(),
+            "message": f"Built {units} unit(s) in {wall * 1000:.0f} ms -> {automatizer.rom_path}"
+        }
+
+    def dispatch(self, request: dict) -> dict:
+        """Run one request: build (the default), ping or shutdown."""
+
+        command = request.get("command", "build")
+
+        if command == "ping":
+            return {"ok": True, "message": f"Build server running, {len(self._automatizers)} warm project(s)"}
+
+        if command == "shutdown":
+
+            self.stopping = True
+
+            return {"ok": True, "message": "Build server stopping"}
+
+        if command == "build":
+            return self.build(request)
+
+        raise Exception(f"Unknown command: {command}")
+
+    def serve_forever(self):
+        """Listen on the address and answer requests until a shutdown request or Ctrl+C."""
+
+        family, target = parse_address(self.address)
+
+        if family == socket.AF_UNIX:
+
+            # A socket file left by a crashed server would make bind() fail
+            if os.path.exists(target):
+                os.unlink(target)
+
+            server = socketserver.ThreadingUnixStreamServer(target, BuildRequestHandler)
+            os.chmod(target, 0o600)
+
+        else:
+
+            socketserver.ThreadingTCPServer.allow_reuse_address = True
+            server = socketserver.ThreadingTCPServer(target, BuildRequestHandler)
+
+        server.daemon_threads = True
+        server.build_server = self
+
+        print(f"Build server listening on {self.address}, press Ctrl+C to stop...")
+
+        try:
+
+            server.serve_forever()
+
+        except KeyboardInterrupt:
+
+            pass
+
+        finally:
+
+            server.server_close()
+
+            if family == socket.AF_UNIX:
+                Path(target).unlink(missing_ok=True)
+
+            print("Build server stopped.")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Keep project state warm and build projects on request (see buildclient.py).")
+    parser.add_argument("--address", default=default_address(), help="unix:/path/to.sock or host:port to listen on (default: per-user socket, localhost on Windows)")
+    parser.add_argument("-j", "--jobs", type=int, default=0, help="files compiled in parallel per build, 0 uses every core")
+    parser.add_argument("-b", "--build-dir", action="store_true", help="build every project in its own directory on tmpfs instead of the project")
+    parser.add_argument("--object-cache", nargs="?", const="", default=None, metavar="DIR", help="reuse objects across projects from a shared cache (default: per-user cache dir)")
+
+    cli = parser.parse_args()
+
+    BuildServer(
+        cli.address,
+        jobs=cli.jobs,
+        tmpfs_build=cli.build_dir,
+        object_cache=None if cli.object_cache is None else ObjectCache(cli.object_cache or None)
+    ).serve_forever()
@@ -0,0 +1,141 @@
+from pathlib import Path
+import subprocess
+import threading
+import ctypes
+import json
+import time
+import sys
+import os
+
+
+def wait_with_cpu_time(proc: subprocess.Popen) -> tuple[int, float | None]:
+    """Wait for a process and return its exit code and the CPU seconds it used (None if unknown)."""
+
+    if hasattr(os, 'wait4') and proc.returncode is None:
+
+        try:
+
+            _, status, usage = os.wait4(proc.pid, 0)
+            proc.returncode = os.waitstatus_to_exitcode(status)
+
+            return proc.returncode, usage.ru_utime + usage.ru_stime
+
+        except ChildProcessError:
+
+            # Already reaped by Popen itself (e.g. a concurrent kill()), the usage is lost
+            return proc.wait(), None
+
+    returncode = proc.wait()
+
+    if sys.platform == 'win32':
+
+        # GetProcessTimes reports 100 ns ticks, the handle stays valid until Popen is collected
+        creation, exit_, kernel, user = (ctypes.c_ulonglong() for _ in range(4))
+
+        if ctypes.windll.kernel32.GetProcessTimes(int(proc._handle), ctypes.byref(creation), ctypes.byref(exit_), ctypes.byref(kernel), ctypes.byref(user)):
+            return returncode, (kernel.value + user.value) / 1e7
+
+    return returncode, None
+
+
+class BuildTrace:
+
+    def __init__(self):
+        """Initialize an empty BuildTrace."""
+
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self):
+        """Forget previous records and start timing a new build."""
+
+        with self._lock:
+
+            self.origin = time.perf_counter()
+            self.events: list[dict] = []
+            self._threads: dict[int, int] = {}
+
+    def record(self, stage: str, file: Path | None, start: float, wall: float, cpu: float | None, files: list[Path] | None = None):
+        """Record one tool invocation: its stage, the file (or files, for a batch) it worked on, and its wall and CPU seconds."""
+
+        with self._lock:
+
+            thread = self._threads.setdefault(threading.get_ident(), len(self._threads) + 1)
+
+            self.events.append({
+                "stage": stage,
+                "file": str(file) if file else None,
+                "files": [str(path) for path in files] if files else None,
+                "start": start - self.origin,
+                "wall": wall,
+                "cpu": cpu,
+                "thread": thread
+            })
+
+    def summary(self) -> dict:
+        """Return wall and CPU time per stage and per file, plus the slowest invocations."""
+
+        stages: dict[str, dict] = {}
+        files: dict[str, dict] = {}
+
+        for event in self.events:
+
+            # A batch's time is already counted per file by the step events found inside it
+            tables = [(stages, event["stage"])] if event["files"] else [(stages, event["stage"]), (files, event["file"] or "<link>")]
+
+            for table, key in tables:
+
+                entry = table.setdefault(key, {"count": 0, "wall_s": 0.0, "cpu_s": 0.0})
+                entry["count"] += 1
+                entry["wall_s"] += event["wall"]
+                entry["cpu_s"] += event["cpu"] or 0.0
+
+        end = max((event["start"] + event["wall"] for event in self.events), default=0.0)
+        slowest = sorted(self.events, key=lambda event: event["wall"], reverse=True)[:10]
+
+        return {
+            "wall_s": end,
+            "cpu_s": sum(event["cpu"] or 0.0 for event in self.events),
+            "stages": stages,
+            "files": dict(sorted(files.items(), key=lambda item: item[1]["wall_s"], reverse=True)),
+            "slowest": slowest
+        }
+
+    def chrome_trace(self) -> dict:
+        """Return the records in Chrome trace_event format (chrome://tracing, Perfetto)."""
+
+        events = [
+            {"name": "thread_name", "ph": "M", "pid": 1, "tid": thread, "args": {"name": f"worker {thread}"}}
+            for thread in sorted(set(self._threads.values()))
+        ]
+
+        for event in self.events:
+
+            events.append({
+                "name": f"{event['stage']} {Path(event['file']).name if event['file'] else ''}".strip(),
+                "cat": event["stage"],
+                "ph": "X",
+                "pid": 1,
+                "tid": event["thread"],
+                "ts": round(event["start"] * 1e6),
+                "dur": round(event["wall"] * 1e6),
+                "args": {"file": event["file"], "files": event["files"], "cpu_ms": None if event["cpu"] is None else round(event["cpu"] * 1000, 3)}
+            })
+
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write(self, out_dir: Path):
+        """Write build-timings.json and build-trace.json to out_dir."""
+
+        out_dir = Path(out_dir)
+        out_dir.mkdir(parents=True, exist_ok=True)
+
+        with self._lock:
+
+            with open(out_dir / 'build-timings.json', 'w') as f:
+
+                json.dump(self.summary(), f, indent=1)
+
+            with open(out_dir / 'build-trace.json', 'w') as f:
+
+                json.dump(self.chrome_trace(), f)
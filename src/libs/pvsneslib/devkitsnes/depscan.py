@@ -0,0 +1,202 @@
+from pathlib import Path
+from typing import Iterable
+import hashlib
+import json
+import os
+import re
+
+# C "#include" and WLA ".include"/".incbin" directives, matched on raw bytes
+C_INCLUDE = re.compile(rb'^[ \t]*#[ \t]*include[ \t]*([<"])([^>"\r\n]+)[>"]', re.MULTILINE)
+ASM_INCLUDE = re.compile(rb'^[ \t]*\.(?:include|incbin)[ \t]+"([^"\r\n]+)"', re.MULTILINE | re.IGNORECASE)
+
+C_SUFFIXES = {'.c', '.h'}
+ASM_SUFFIXES = {'.asm', '.inc', '.s'}
+
+
+class DependencyScanner:
+
+    CACHE_VERSION = 1
+
+    def __init__(self, root: Path, include_dirs: list[Path], cache_path: Path):
+        """Initialize the DependencyScanner for a project root, its system include dirs and an on-disk cache."""
+
+        self.root = Path(root)
+        self.include_dirs = [Path(d) for d in include_dirs]
+        self.cache_path = Path(cache_path)
+
+        # path -> {"stat": [mtime_ns, size], "digest": content hash, "deps": [direct dependencies]}
+        self._entries: dict[str, dict] = {}
+
+        # path -> paths that directly include it
+        self.reverse: dict[str, set[str]] = {}
+
+    def load(self):
+        """Load the scan results of a previous run, ignoring a missing or outdated cache."""
+
+        self._entries = {}
+
+        try:
+
+            with open(self.cache_path) as f:
+
+                data = json.load(f)
+
+            if data.get("version") == self.CACHE_VERSION:
+                self._entries = data["files"]
+
+        except (OSError, ValueError, KeyError):
+
+            pass
+
+        self._build_reverse()
+
+    def save(self):
+        """Write the scan results so the next run only rescans files that changed."""
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+
+            json.dump({"version": self.CACHE_VERSION, "files": self._entries}, f)
+
+        os.replace(tmp_path, self.cache_path)
+
+    def _resolve(self, name: str, including: Path, system: bool) -> Path:
+        """Resolve an included name the way tcc and wla do: local dir, project root, then include dirs."""
+
+        local = [] if system else [including.parent, self.root]
+
+        for base in local + self.include_dirs + ([self.root] if system else []):
+
+            candidate = base / name
+
+            if candidate.is_file():
+                return candidate.resolve()
+
+        # Not generated yet (e.g. a .pic from gfx4snes): track it so its creation triggers a rebuild
+        return (self.root / name).resolve()
+
+    def _parse(self, file: Path, data: bytes) -> list[str]:
+        """Return the direct dependencies of a file from its include directives."""
+
+        deps = []
+
+        if file.suffix.lower() in C_SUFFIXES:
+
+            for match in C_INCLUDE.finditer(data):
+
+                name = match.group(2).decode(errors="replace").strip()
+                deps.append(str(self._resolve(name, file, match.group(1) == b'<')))
+
+        elif file.suffix.lower() in ASM_SUFFIXES:
+
+            for match in ASM_INCLUDE.finditer(data):
+
+                name = match.group(1).decode(errors="replace").strip()
+                deps.append(str(self._resolve(name, file, False)))
+
+        return list(dict.fromkeys(deps))
+
+    def _update(self, key: str) -> dict:
+        """Return the entry of a file, rescanning and rehashing it only if its stat changed."""
+
+        path = Path(key)
+
+        try:
+
+            st = path.stat()
+
+        except OSError:
+
+            entry = {"stat": None, "digest": "missing", "deps": []}
+            self._entries[key] = entry
+
+            return entry
+
+        stat = [st.st_mtime_ns, st.st_size]
+        entry = self._entries.get(key)
+
+        if entry is None or entry["stat"] != stat:
+
+            data = path.read_bytes()
+
+            entry = {
+                "stat": stat,
+                "digest": hashlib.sha256(data).hexdigest(),
+                "deps": self._parse(path, data)
+            }
+
+            self._entries[key] = entry
+
+        return entry
+
+    def scan(self, sources: Iterable[Path]):
+        """Scan the sources and everything they include, refreshing only files that changed."""
+
+        pending = [str(Path(source).resolve()) for source in sources]
+        seen: set[str] = set()
+
+        while pending:
+
+            key = pending.pop()
+
+            if key in seen:
+                continue
+
+            seen.add(key)
+            pending.extend(self._update(key)["deps"])
+
+        self._build_reverse()
+
+    def _build_reverse(self):
+        """Rebuild the reverse-dependency index from the forward edges."""
+
+        self.reverse = {}
+
+        for key, entry in self._entries.items():
+
+            for dep in entry["deps"]:
+                self.reverse.setdefault(dep, set()).add(key)
+
+    def dependencies(self, source: Path) -> list[str]:
+        """Return every file a source depends on, directly or through other includes."""
+
+        start = str(Path(source).resolve())
+        pending = list(self._entries.get(start, {}).get("deps", []))
+        seen: set[str] = set()
+
+        while pending:
+
+            key = pending.pop()
+
+            if key in seen or key == start:
+                continue
+
+            seen.add(key)
+            pending.extend(self._entries.get(key, {}).get("deps", []))
+
+        return sorted(seen)
+
+    def digest(self, file: Path | str) -> str:
+        """Return the content hash of a scanned file."""
+
+        return self._update(str(Path(file).resolve()))["digest"]
+
+    def affected(self, changed: Iterable[Path], sources: Iterable[Path]) -> list[Path]:
+        """Return the sources that are, or transitively include, one of the changed files."""
+
+        pending = [str(Path(file).resolve()) for file in changed]
+        seen: set[str] = set()
+
+        while pending:
+
+            key = pending.pop()
+
+            if key in seen:
+                continue
+
+            seen.add(key)
+            pending.extend(self.reverse.get(key, ()))
+
+        return [source for source in sources if str(Path(source).resolve()) in seen]
@@ -0,0 +1,146 @@
+from wlaobj import read_symbols
+from pathlib import Path
+import json
+import os
+
+
+class LinkOrder:
+
+    def __init__(self, src_dir: Path, lib_dir: Path, order_path: Path):
+        """Initialize the LinkOrder of a project, persisted in order_path."""
+
+        self.src_dir = Path(src_dir)
+        self.lib_dir = Path(lib_dir)
+        self.order_path = Path(order_path)
+
+    def _key(self, entry: str) -> str:
+        """Turn a linkfile line into a key that survives a change of lib dir or project location."""
+
+        path = Path(entry)
+
+        for prefix, base in (("obj:", self.src_dir), ("lib:", self.lib_dir)):
+
+            try:
+
+                return prefix + path.relative_to(base).as_posix()
+
+            except ValueError:
+
+                continue
+
+        # Section headers and entries added by hand are kept verbatim
+        return entry
+
+    def _entry(self, key: str) -> str:
+        """Turn a key back into a linkfile line."""
+
+        if key.startswith("obj:"):
+            return str(self.src_dir / key[4:])
+
+        if key.startswith("lib:"):
+            return str(self.lib_dir / key[4:])
+
+        return key
+
+    @staticmethod
+    def _library_order(libraries: list[Path]) -> list[Path]:
+        """Order libraries so that each one comes before the libraries it takes symbols from."""
+
+        objects = {lib: read_symbols(lib) for lib in libraries}
+        providers: dict[str, Path] = {}
+
+        for lib in sorted(libraries):
+
+            for name in (objects[lib].exports if objects[lib] else ()):
+                providers.setdefault(name, lib)
+
+        uses = {
+            lib: {providers[name] for name in (objects[lib].imports if objects[lib] else ()) if providers.get(name, lib) != lib}
+            for lib in libraries
+        }
+
+        # Kahn's algorithm on "is used by" edges, ties broken by name; cycles fall back to name order
+        users = {lib: sum(lib in used for used in uses.values()) for lib in libraries}
+        remaining = sorted(libraries)
+        order = []
+
+        while remaining:
+
+            ready = [lib for lib in remaining if users[lib] == 0] or remaining[:1]
+            lib = ready[0]
+
+            remaining.remove(lib)
+            order.append(lib)
+
+            for used in uses[lib]:
+                users[used] -= 1
+
+        return order
+
+    def default(self, objects: list[Path], libraries: list[Path]) -> list[str]:
+        """Return the stable default order: the object defining main, the other objects, then libraries."""
+
+        def defines_main(obj: Path) -> bool:
+
+            symbols = read_symbols(obj)
+
+            return symbols is not None and "main" in symbols.exports
+
+        project = sorted(objects, key=lambda obj: (not defines_main(obj), self._key(str(obj))))
+
+        return ["[objects]"] + [self._key(str(obj)) for obj in project + self._library_order(libraries)]
+
+    def load(self) -> list[str] | None:
+        """Return the confirmed order saved for this project, if any."""
+
+        try:
+
+            with open(self.order_path) as f:
+
+                return list(json.load(f)["order"])
+
+        except (OSError, ValueError, KeyError):
+
+            return None
+
+    def save(self, lines: list[str]):
+        """Persist a confirmed linkfile order."""
+
+        self.order_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.order_path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+
+            json.dump({"order": [self._key(line) for line in lines]}, f, indent=1)
+
+        os.replace(tmp_path, self.order_path)
+
+    def resolve(self, objects: list[Path], libraries: list[Path]) -> list[str]:
+        """Return the linkfile lines: the saved order with new entries placed where the default order puts them."""
+
+        default = self.default(objects, libraries)
+        saved = self.load()
+
+        if saved is None:
+            return [self._entry(key) for key in default]
+
+        current = set(default)
+        order = [key for key in saved if key in current or not key.startswith(("obj:", "lib:"))]
+
+        for i, key in enumerate(default):
+
+            if key in order:
+                continue
+
+            position = 0
+
+            for previous in reversed(default[:i]):
+
+                if previous in order:
+
+                    position = order.index(previous) + 1
+                    break
+
+            order.insert(position, key)
+
+        return [self._entry(key) for key in order]
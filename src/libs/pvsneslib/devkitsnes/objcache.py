@@ -0,0 +1,113 @@
+from pathlib import Path
+import tempfile
+import shutil
+import sys
+import os
+
+
+def default_cache_dir() -> Path:
+    """Return the per-user object cache directory, SNES_IDE_CACHE overrides it."""
+
+    if os.environ.get('SNES_IDE_CACHE'):
+        return Path(os.environ['SNES_IDE_CACHE'])
+
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'snes-ide' / 'objcache'
+
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'snes-ide' / 'objcache'
+
+
+class ObjectCache:
+
+    def __init__(self, root: Path | None = None, max_size: int = 512 * 1024 * 1024):
+        """Initialize a content-addressed cache of compiled objects, capped at max_size bytes."""
+
+        self.root = Path(root) if root else default_cache_dir()
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def _path(self, key: str) -> Path:
+        """Return where the object of a key is stored."""
+
+        return self.root / key[:2] / (key[2:] + '.obj')
+
+    def fetch(self, key: str, obj_file: Path) -> bool:
+        """Copy the cached object of key to obj_file; return False on a miss."""
+
+        cached = self._path(key)
+
+        try:
+
+            shutil.copyfile(cached, obj_file)
+
+            # Hits refresh the entry for LRU eviction
+            os.utime(cached)
+
+        except OSError:
+
+            self.misses += 1
+            return False
+
+        self.hits += 1
+        return True
+
+    def store(self, key: str, obj_file: Path):
+        """Add a freshly built object to the cache, ignoring failures (the cache is best effort)."""
+
+        cached = self._path(key)
+
+        try:
+
+            cached.parent.mkdir(parents=True, exist_ok=True)
+
+            # Write then rename, so concurrent builds never read half an object
+            fd, tmp_name = tempfile.mkstemp(dir=cached.parent, suffix='.tmp')
+
+            try:
+
+                with os.fdopen(fd, 'wb') as f, open(obj_file, 'rb') as src:
+
+                    shutil.copyfileobj(src, f)
+
+                os.replace(tmp_name, cached)
+
+            except OSError:
+
+                # Nothing else would ever remove a half-written object from the cache
+                Path(tmp_name).unlink(missing_ok=True)
+                raise
+
+        except OSError as e:
+
+            print(f"Object cache store failed: {e}")
+
+    def evict(self):
+        """Delete the least recently used objects until the cache is back under 90% of its size cap."""
+
+        entries = []
+
+        for path in self.root.glob('*/*.obj'):
+
+            try:
+
+                st = path.stat()
+
+            except OSError:
+
+                continue
+
+            entries.append((st.st_mtime, st.st_size, path))
+
+        total = sum(size for _, size, _ in entries)
+
+        if total <= self.max_size:
+            return
+
+        for _, size, path in sorted(entries):
+
+            if total <= self.max_size * 0.9:
+                break
+
+            path.unlink(missing_ok=True)
+            total -= size
@@ -0,0 +1,279 @@
+from pathlib import Path
+import argparse
+import bisect
+import json
+import re
+
+# "bb:aaaa name" (or "bbbbaaaa name") label lines and "vvvvvvvv name" definition lines of a NO$SNES symbol file
+LABEL_LINE = re.compile(r'^(?:([0-9a-fA-F]{2}):|([0-9a-fA-F]{4}))([0-9a-fA-F]{4})\s+(\S+)')
+DEFINITION_LINE = re.compile(r'^([0-9a-fA-F]{8})\s+(\S+)')
+
+HDR_ROMBANKS = re.compile(r'^\s*\.ROMBANKS\s+(\$[0-9a-fA-F]+|\d+)', re.MULTILINE | re.IGNORECASE)
+
+BANK_SIZES = {"LOROM": 0x8000, "HIROM": 0x10000}
+
+
+class SymbolTable:
+
+    def __init__(self, sym_path: Path, memory_map: str = "LOROM"):
+        """Parse a wlalink -s symbol file into labels, definitions, sections and an address index."""
+
+        self.path = Path(sym_path)
+        self.memory_map = memory_map
+        self.bank_size = BANK_SIZES[memory_map]
+
+        self.labels: dict[str, int] = {}
+        self.definitions: dict[str, int] = {}
+
+        # Sorted (address, name) pairs with addresses as bank << 16 | offset, for address -> symbol lookups
+        self._index: list[tuple[int, str]] = []
+
+        self._read()
+
+        self._addresses = [address for address, _ in self._index]
+        self.sections = self._sections()
+
+    def _read(self):
+        """Read the [labels] and [definitions] sections."""
+
+        part = None
+
+        for line in self.path.read_text(errors="replace").splitlines():
+
+            line = line.strip()
+
+            if not line or line.startswith(';'):
+                continue
+
+            if line.startswith('['):
+
+                part = line.lower()
+                continue
+
+            if part == '[labels]' and (match := LABEL_LINE.match(line)):
+
+                address = int(match.group(1) or match.group(2), 16) << 16 | int(match.group(3), 16)
+                self.labels[match.group(4)] = address
+                self._index.append((address, match.group(4)))
+
+            elif part == '[definitions]' and (match := DEFINITION_LINE.match(line)):
+
+                self.definitions[match.group(2)] = int(match.group(1), 16)
+
+        self._index.sort()
+
+    def rom_location(self, address: int) -> tuple[int, int] | None:
+        """Return the ROM bank and offset in it of a CPU address, or None for RAM, I/O and SRAM."""
+
+        bank, offset = address >> 16, address & 0xFFFF
+
+        if bank in (0x7E, 0x7F):
+            return None
+
+        # .BASE $80/$C0/$40 mirrors are folded back; banks $00-$3F only hold ROM from $8000 up
+        bank &= 0x7F
+
+        if self.memory_map == "HIROM":
+
+            if bank < 0x40 and offset < 0x8000:
+                return None
+
+            return bank & 0x3F, offset
+
+        # LoROM maps ROM to the upper half of every bank, below $8000 is RAM, I/O or SRAM (e.g. $70:0000)
+        if offset < 0x8000:
+            return None
+
+        return bank, offset - 0x8000
+
+    def _sections(self) -> list[dict]:
+        """Pair SECTIONSTART_x / SECTIONEND_x labels into sections with their size and ROM bank."""
+
+        sections = []
+
+        for name, start in self.labels.items():
+
+            if not name.startswith('SECTIONSTART_'):
+                continue
+
+            section = name[len('SECTIONSTART_'):]
+            end = self.labels.get('SECTIONEND_' + section)
+
+            if end is None or end < start:
+                continue
+
+            location = self.rom_location(start)
+
+            sections.append({
+                "name": section,
+                "start": start,
+                "size": end - start,
+                "bank": location[0] if location else None,
+                "offset": location[1] if location else None
+            })
+
+        return sorted(sections, key=lambda section: section["start"])
+
+    def lookup(self, address: int) -> tuple[str, int] | None:
+        """Return the label at or before an address and the distance from it."""
+
+        i = bisect.bisect_right(self._addresses, address) - 1
+
+        if i < 0:
+            return None
+
+        label_address, name = self._index[i]
+
+        return name, address - label_address
+
+    def label_sizes(self) -> dict[str, int]:
+        """Estimate each label's size as the distance to the next label in the same bank."""
+
+        sizes = {}
+
+        for (address, name), (next_address, _) in zip(self._index, self._index[1:]):
+
+            if address >> 16 == next_address >> 16:
+                sizes[name] = next_address - address
+
+        return sizes
+
+    def bank_usage(self, rom_banks: int) -> list[dict]:
+        """Return the used and free bytes of every ROM bank, from the union of the section extents in it."""
+
+        extents: dict[int, list[tuple[int, int]]] = {bank: [] for bank in range(rom_banks)}
+
+        for section in self.sections:
+
+            if section["bank"] is not None and section["size"]:
+                extents.setdefault(section["bank"], []).append((section["offset"], section["offset"] + section["size"]))
+
+        usage = []
+
+        for bank in sorted(extents):
+
+            used, end = 0, 0
+
+            # Overlapping sections (e.g. FORCE/OVERWRITE ones) are counted once
+            for start, stop in sorted(extents[bank]):
+
+                start = max(start, end)
+
+                if stop > start:
+
+                    used += stop - start
+                    end = stop
+
+            usage.append({"bank": bank, "used": used, "free": self.bank_size - used, "fill": used / self.bank_size, "declared": bank < rom_banks})
+
+        return usage
+
+    def report(self, rom_banks: int, top: int = 10) -> dict:
+        """Return bank occupancy, the largest sections and labels, and the free space of the ROM."""
+
+        banks = self.bank_usage(rom_banks)
+        labels = [
+            {"name": name, "size": size, "bank": self.rom_location(self.labels[name])[0]}
+            for name, size in self.label_sizes().items()
+            if size and not name.startswith(('SECTIONSTART_', 'SECTIONEND_')) and self.rom_location(self.labels[name])
+        ]
+        used = sum(bank["used"] for bank in banks)
+        capacity = rom_banks * self.bank_size
+
+        return {
+            "memory_map": self.memory_map,
+            "rom_banks": rom_banks,
+            "bank_size": self.bank_size,
+            "used": used,
+            "free": capacity - used,
+            "banks_needed": -(-used // self.bank_size),
+            "banks": banks,
+            "largest_sections": sorted(
+                (section for section in self.sections if section["bank"] is not None),
+                key=lambda section: section["size"],
+                reverse=True
+            )[:top],
+            "largest_labels": sorted(labels, key=lambda label: label["size"], reverse=True)[:top]
+        }
+
+
+def read_rom_banks(hdr_path: Path) -> int | None:
+    """Return the .ROMBANKS count declared by a project's hdr.asm."""
+
+    try:
+
+        text = re.sub(r';.*', '', Path(hdr_path).read_text(errors="replace"))
+
+    except OSError:
+
+        return None
+
+    values = HDR_ROMBANKS.findall(text)
+
+    if not values:
+        return None
+
+    value = values[-1]
+
+    return int(value[1:], 16) if value.startswith('$') else int(value)
+
+
+def print_report(report: dict):
+    """Print a bank occupancy report."""
+
+    size = report["bank_size"]
+
+    print(f"ROM: {report['used']} of {report['rom_banks'] * size} bytes used, {report['free']} free "
+          f"({report['rom_banks']} banks of {size // 1024} KiB declared, {report['banks_needed']} needed at least)")
+
+    for bank in report["banks"]:
+
+        bar = '#' * round(bank["fill"] * 32)
+        note = "" if bank["declared"] else "  OUTSIDE .ROMBANKS"
+
+        print(f"  bank {bank['bank']:02X}: [{bar:<32}] {bank['fill'] * 100:5.1f}%  {bank['free']:6d} bytes free{note}")
+
+    print("Largest sections:")
+
+    for section in report["largest_sections"]:
+        print(f"  {section['size']:7d}  bank {section['bank']:02X}:{section['offset']:04X}  {section['name']}")
+
+    print("Largest labels (distance to the next label):")
+
+    for label in report["largest_labels"]:
+        print(f"  {label['size']:7d}  bank {label['bank']:02X}  {label['name']}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Report ROM bank usage from a wlalink symbol file (output.sym).")
+    parser.add_argument("sym_file", type=Path, help="symbol file written by wlalink -s")
+    parser.add_argument("memory_map", nargs="?", default="LOROM", help="HIROM or LOROM")
+    parser.add_argument("--hdr", type=Path, default=None, help="hdr.asm declaring .ROMBANKS (default: next to the symbol file)")
+    parser.add_argument("--banks", type=int, default=None, help="ROM bank count, overriding hdr.asm")
+    parser.add_argument("--lookup", default=None, metavar="BB:AAAA", help="print the symbol at an address")
+    parser.add_argument("--json", type=Path, default=None, help="also write the report as JSON")
+
+    cli = parser.parse_args()
+
+    table = SymbolTable(cli.sym_file, cli.memory_map.upper())
+
+    if cli.lookup:
+
+        bank, _, offset = cli.lookup.replace('$', '').partition(':')
+        found = table.lookup(int(bank, 16) << 16 | int(offset, 16))
+
+        print(f"{found[0]}+${found[1]:X}" if found else "No symbol at or before this address")
+
+    else:
+
+        rom_banks = cli.banks or read_rom_banks(cli.hdr or cli.sym_file.parent / 'hdr.asm') or max((bank["bank"] + 1 for bank in table.bank_usage(0)), default=1)
+        report = table.report(rom_banks)
+
+        print_report(report)
+
+        if cli.json:
+
+            with open(cli.json, 'w') as f:
+
+                json.dump(report, f, indent=1)
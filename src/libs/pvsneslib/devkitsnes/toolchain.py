@@ -0,0 +1,255 @@
+from pathlib import Path
+import subprocess
+import threading
+import tempfile
+import shutil
+import json
+import re
+import sys
+import os
+
+# Absolute Unix paths in arguments, alone or after a one letter option such as -I or -L
+UNIX_PATH_ARG = re.compile(r'^(-[A-Za-z])?(/.*)$')
+
+# Seconds an idle wineserver stays up, so consecutive tool launches skip its startup
+WINESERVER_LINGER = 300
+
+
+def windows_path(path: Path | str) -> str:
+    """Return the path Wine sees for a Unix path, through its default Z: drive mapping of /."""
+
+    return "Z:" + str(Path(path).absolute()).replace("/", "\\")
+
+
+class Toolchain:
+
+    CACHE_VERSION = 1
+
+    def __init__(self, cache_path: Path | None = None, tool_commands: dict[str, list[str]] | None = None, batch: bool = True):
+        """Initialize the Toolchain backend: resolves how each tool runs (native or under Wine), caching the answer in cache_path."""
+
+        self.cache_path = Path(cache_path) if cache_path else None
+
+        # Command prefixes replacing tools by name (e.g. "816-tcc"), such as the stand-ins of toolstubs.py
+        self.tool_commands = dict(tool_commands or {})
+
+        self.wine = None if sys.platform == 'win32' else (shutil.which('wine') or shutil.which('wine64'))
+        self.wineserver = None if self.wine is None else shutil.which('wineserver')
+        self.batch = batch and self.wine is not None
+
+        # path -> {"stat": [mtime_ns, size], "kind": "native" | "wine"}
+        self._entries: dict[str, dict] = {}
+        self._commands: dict[Path, list[str]] = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._warm = False
+
+        self._load()
+
+    def _load(self):
+        """Load the tool kinds resolved by previous runs."""
+
+        if self.cache_path is None:
+            return
+
+        try:
+
+            with open(self.cache_path) as f:
+
+                data = json.load(f)
+
+            if data.get("version") == self.CACHE_VERSION:
+                self._entries = data["tools"]
+
+        except (OSError, ValueError, KeyError):
+
+            pass
+
+    def save(self):
+        """Write the resolved tool kinds if a tool was (re)inspected."""
+
+        if self.cache_path is None or not self._dirty:
+            return
+
+        try:
+
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+            # Concurrent builds (e.g. the variants of a matrix build) each write their own temporary file
+            f = tempfile.NamedTemporaryFile('w', dir=self.cache_path.parent, suffix='.tmp', delete=False)
+
+            try:
+
+                with f:
+
+                    json.dump({"version": self.CACHE_VERSION, "tools": self._entries}, f, indent=1)
+
+                os.replace(f.name, self.cache_path)
+
+            except OSError:
+
+                Path(f.name).unlink(missing_ok=True)
+                raise
+
+            self._dirty = False
+
+        except OSError as e:
+
+            print(f"Toolchain cache not saved: {e}")
+
+    def kind(self, tool: Path) -> str:
+        """Tell whether a tool binary runs natively or needs Wine, from its first bytes (MZ is a Windows executable)."""
+
+        if sys.platform == 'win32':
+            return "native"
+
+        key = str(Path(tool).absolute())
+
+        try:
+
+            st = Path(tool).stat()
+
+        except OSError:
+
+            return "native"
+
+        stat = [st.st_mtime_ns, st.st_size]
+
+        with self._lock:
+
+            entry = self._entries.get(key)
+
+            if entry is None or entry["stat"] != stat:
+
+                with open(tool, 'rb') as f:
+
+                    magic = f.read(2)
+
+                entry = {"stat": stat, "kind": "wine" if magic == b'MZ' else "native"}
+                self._entries[key] = entry
+                self._dirty = True
+
+        return entry["kind"]
+
+    def command(self, tool: Path) -> list[str]:
+        """Return the command prefix running a tool: an override, the binary itself, a native build next to it, or Wine."""
+
+        tool = Path(tool)
+
+        if tool in self._commands:
+            return self._commands[tool]
+
+        if tool.stem in self.tool_commands:
+
+            command = list(self.tool_commands[tool.stem])
+
+        elif tool.suffix.lower() == '.bat' and self.wine:
+
+            command = [self.wine, 'cmd', '/c', windows_path(tool)]
+
+        elif self.kind(tool) == "wine" and self.wine:
+
+            # A native build shipped beside the .exe (e.g. tools/tilesetextractor) beats emulation
+            native = tool.with_suffix('')
+
+            if native.is_file() and os.access(native, os.X_OK) and self.kind(native) == "native":
+                command = [str(native)]
+
+            else:
+                command = [self.wine, str(tool)]
+
+        else:
+
+            command = [str(tool)]
+
+        self._commands[tool] = command
+
+        return command
+
+    def uses_wine(self, tool: Path) -> bool:
+        """Tell whether a tool runs under Wine."""
+
+        return bool(self.wine) and self.command(tool)[0] == self.wine
+
+    def can_batch(self, tools: list[Path]) -> bool:
+        """Tell whether the tools can run from one Wine batch file instead of one Wine launch per tool."""
+
+        return self.batch and all(self.uses_wine(tool) for tool in tools)
+
+    def describe(self, tool: Path) -> str:
+        """Return how a tool runs, for cache keys and logs."""
+
+        return " ".join(self.command(tool))
+
+    def warm_up(self, tools: list[Path]):
+        """Start a persistent wineserver once if any of the tools runs under Wine, so each launch skips the server startup."""
+
+        if self._warm or not self.wineserver or not any(self.uses_wine(tool) for tool in tools):
+            return
+
+        self._warm = True
+
+        try:
+
+            # wineserver forks into the background and exits at once when one is already running
+            subprocess.run([self.wineserver, f'-p{WINESERVER_LINGER}'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=30)
+
+        except (OSError, subprocess.SubprocessError) as e:
+
+            print(f"Could not start wineserver: {e}")
+
+    @staticmethod
+    def environment() -> dict[str, str]:
+        """Return the environment for tool processes, with Wine's debug channels silenced."""
+
+        env = dict(os.environ)
+        env.setdefault('WINEDEBUG', '-all')
+
+        return env
+
+    @staticmethod
+    def _batch_arg(arg) -> str:
+        """Return an argument as cmd has to see it, with Unix paths turned into Wine paths."""
+
+        if isinstance(arg, Path):
+            return windows_path(arg)
+
+        match = UNIX_PATH_ARG.match(str(arg))
+
+        return (match.group(1) or "") + windows_path(match.group(2)) if match else str(arg)
+
+    @staticmethod
+    def write_batch(path: Path, units: list[tuple[str, list[tuple[list, Path | None]]]], stamps: Path | None = None):
+        """Write a batch file running the steps (command, stdout file) of every unit in order, echoing the unit's title
+        before them and stopping at the first failure.
+
+        With stamps, an empty file numbered 0, 1, ... is created in that directory before every step and after the last
+        one, its modification time tells when each step started and ended.
+        """
+
+        lines = ["@echo off"]
+        count = 0
+
+        for title, steps in units:
+
+            # Titles are file names, cmd's special characters in them are escaped
+            lines.append("echo " + re.sub(r'([\^&|<>()])', r'^\1', title).replace('%', '%%'))
+
+            for args, stdout in steps:
+
+                if stamps is not None:
+
+                    lines.append(f'type nul > "{windows_path(Path(stamps) / str(count))}"')
+                    count += 1
+
+                line = " ".join(f'"{Toolchain._batch_arg(arg)}"' for arg in args)
+
+                if stdout is not None:
+                    line += f' > "{windows_path(stdout)}"'
+
+                lines += [line, "if errorlevel 1 exit /b 1"]
+
+        if stamps is not None:
+            lines.append(f'type nul > "{windows_path(Path(stamps) / str(count))}"')
+
+        Path(path).write_text("\r\n".join(lines) + "\r\n")
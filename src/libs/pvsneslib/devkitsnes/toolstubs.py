@@ -0,0 +1,96 @@
+from pathlib import Path
+import argparse
+import hashlib
+import time
+import sys
+
+# Stand-ins for the pvsneslib toolchain: they take the same arguments and read and write the same
+# files, but only hash them. Builds driven by them measure the automatizer's own overhead.
+
+TOOLS = ('816-tcc', '816-opt', 'constify', 'wla-65816', 'wlalink')
+
+
+def stub_commands(delay_ms: int = 0) -> dict[str, list[str]]:
+    """Return the SNESAutomatizer tool_commands that replace every tool by this stub."""
+
+    # Frozen builds ship this module as its own executable next to the others
+    if getattr(sys, 'frozen', False):
+        prefix = [str(Path(sys.executable).parent / 'toolstubs.exe')]
+
+    else:
+        prefix = [sys.executable, str(Path(__file__).absolute())]
+
+    return {tool: prefix + ['--delay', str(delay_ms), tool] for tool in TOOLS}
+
+
+def _option(args: list[str], flag: str) -> str:
+    """Return the value following a flag."""
+
+    return args[args.index(flag) + 1]
+
+
+def _stub_text(tool: str, data: bytes) -> str:
+    """Return the deterministic output a tool stub writes for its input."""
+
+    return f"; {tool} stub {hashlib.sha256(data).hexdigest()}\n"
+
+
+def tcc(args: list[str]):
+    """816-tcc -I<dir> -Wall -c <file.c> [-H] [-F] -o <file.ps>"""
+
+    source = next(arg for arg in args if arg.endswith('.c'))
+
+    Path(_option(args, '-o')).write_text(_stub_text('816-tcc', Path(source).read_bytes()))
+
+
+def opt(args: list[str]):
+    """816-opt <file.ps>, writes to stdout"""
+
+    sys.stdout.write(_stub_text('816-opt', Path(args[0]).read_bytes()))
+
+
+def constify(args: list[str]):
+    """constify <file.c> <file.asp> <file.asm>"""
+
+    c_file, asp_file, asm_file = args[:3]
+
+    Path(asm_file).write_text(_stub_text('constify', Path(c_file).read_bytes() + Path(asp_file).read_bytes()))
+
+
+def assembler(args: list[str]):
+    """wla-65816 -d -s -x -o <file.obj> <file.asm>"""
+
+    Path(_option(args, '-o')).write_bytes(_stub_text('wla-65816', Path(args[-1]).read_bytes()).encode())
+
+
+def linker(args: list[str]):
+    """wlalink -d -s -c -v -A -L<dir> <linkfile> <output.sfc>, writes a 32 KiB aligned image of its objects"""
+
+    linkfile, output = Path(args[-2]), Path(args[-1])
+    image = bytearray()
+
+    for line in linkfile.read_text().splitlines():
+
+        if line and not line.startswith('['):
+            image += hashlib.sha256(Path(line).read_bytes()).digest()
+
+    image += bytes(-len(image) % 0x8000)
+
+    output.write_bytes(image)
+    output.with_suffix('.sym').write_text("; wlalink stub\n")
+
+    print(f"linking {linkfile} -> {output}")
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Stand-in for a pvsneslib toolchain binary.")
+    parser.add_argument("--delay", type=int, default=0, help="milliseconds to sleep, simulating the real tool")
+    parser.add_argument("tool", choices=TOOLS)
+    parser.add_argument("args", nargs=argparse.REMAINDER)
+
+    cli = parser.parse_args()
+
+    time.sleep(cli.delay / 1000)
+
+    {'816-tcc': tcc, '816-opt': opt, 'constify': constify, 'wla-65816': assembler, 'wlalink': linker}[cli.tool](cli.args)
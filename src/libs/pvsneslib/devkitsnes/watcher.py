@@ -0,0 +1,235 @@
+from typing import Callable
+from pathlib import Path
+import ctypes.util
+import ctypes
+import select
+import struct
+import time
+import os
+
+IN_MODIFY = 0x002
+IN_ATTRIB = 0x004
+IN_CLOSE_WRITE = 0x008
+IN_MOVED_FROM = 0x040
+IN_MOVED_TO = 0x080
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_ISDIR = 0x40000000
+
+WATCH_MASK = IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyBackend:
+
+    def __init__(self, root: Path):
+        """Watch every directory below root with Linux inotify."""
+
+        libc_name = ctypes.util.find_library('c')
+
+        if not libc_name:
+            raise OSError("libc not found")
+
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError("inotify is not available")
+
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | getattr(os, 'O_CLOEXEC', 0))
+
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+
+        self._dirs: dict[int, Path] = {}
+
+        try:
+
+            # An unwatched directory would miss saves silently, so the watcher falls back to polling instead
+            self._add_tree(Path(root), strict=True)
+
+        except OSError:
+
+            os.close(self._fd)
+            raise
+
+    def _add_tree(self, top: Path, strict: bool = False):
+        """Add a watch on a directory and on every directory below it; a failure raises when strict, else it is logged."""
+
+        for dirpath, _, _ in os.walk(top):
+
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(dirpath), WATCH_MASK)
+
+            if wd >= 0:
+
+                self._dirs[wd] = Path(dirpath)
+                continue
+
+            errno = ctypes.get_errno()
+
+            # ENOSPC: fs.inotify.max_user_watches is exhausted
+            if strict:
+                raise OSError(errno, f"inotify_add_watch failed for {dirpath}: {os.strerror(errno)}")
+
+            print(f"Watcher: cannot watch {dirpath} ({os.strerror(errno)}), changes below it are missed until the watch restarts")
+
+    def _remove_tree(self, top: Path):
+        """Forget the watches of a directory that was deleted or moved away, and of every directory below it."""
+
+        for wd, path in list(self._dirs.items()):
+
+            if path == top or top in path.parents:
+
+                # Deleted directories already lost their watch, moved ones keep it until removed
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._dirs[wd]
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        """Wait up to timeout seconds (forever if None) and return the paths that changed."""
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+
+        if not readable:
+            return set()
+
+        data = os.read(self._fd, 64 * 1024)
+        changed = set()
+        i = 0
+
+        while i < len(data):
+
+            wd, mask, _, length = EVENT_HEADER.unpack_from(data, i)
+            name = data[i + EVENT_HEADER.size:i + EVENT_HEADER.size + length].rstrip(b'\0')
+            i += EVENT_HEADER.size + length
+
+            if wd not in self._dirs or not name:
+                continue
+
+            path = self._dirs[wd] / os.fsdecode(name)
+
+            # New directories are watched too, their files may already be there
+            if mask & IN_ISDIR:
+
+                if mask & (IN_CREATE | IN_MOVED_TO):
+
+                    self._add_tree(path)
+                    changed.update(p for p in path.rglob("*") if p.is_file())
+
+                # A removed directory is reported itself: every indexed file below it is gone
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+
+                    self._remove_tree(path)
+                    changed.add(path)
+
+                continue
+
+            changed.add(path)
+
+        return changed
+
+    def close(self):
+        """Release the inotify descriptor."""
+
+        os.close(self._fd)
+
+
+class PollingBackend:
+
+    def __init__(self, root: Path, interval: float = 0.5):
+        """Watch root by comparing file stats every interval seconds."""
+
+        self.root = Path(root)
+        self.interval = interval
+        self._snapshot = self._scan()
+
+    def _scan(self) -> dict[Path, tuple[int, int]]:
+        """Return the mtime and size of every file below root."""
+
+        snapshot = {}
+
+        for dirpath, _, filenames in os.walk(self.root):
+
+            for filename in filenames:
+
+                path = Path(dirpath) / filename
+
+                try:
+
+                    st = path.stat()
+
+                except OSError:
+
+                    continue
+
+                snapshot[path] = (st.st_mtime_ns, st.st_size)
+
+        return snapshot
+
+    def poll(self, timeout: float | None) -> set[Path]:
+        """Wait up to timeout seconds (forever if None) and return the paths that changed."""
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+
+        while True:
+
+            snapshot = self._scan()
+            changed = {path for path in snapshot.keys() | self._snapshot.keys() if snapshot.get(path) != self._snapshot.get(path)}
+            self._snapshot = snapshot
+
+            if changed:
+                return changed
+
+            if deadline is not None and time.monotonic() >= deadline:
+                return set()
+
+            time.sleep(self.interval if deadline is None else max(0.0, min(self.interval, deadline - time.monotonic())))
+
+    def close(self):
+        """Nothing to release."""
+
+        pass
+
+
+class ProjectWatcher:
+
+    def __init__(self, root: Path, ignore: Callable[[Path], bool], polling: bool = False):
+        """Watch a project tree with inotify when available, polling otherwise; ignore filters out build outputs."""
+
+        self.ignore = ignore
+
+        try:
+
+            if polling:
+                raise OSError("polling requested")
+
+            self._backend = InotifyBackend(root)
+            self.mode = "inotify"
+
+        except (OSError, AttributeError) as e:
+
+            if not polling:
+                print(f"Watcher: inotify unavailable ({e}), polling instead")
+
+            self._backend = PollingBackend(root)
+            self.mode = "polling"
+
+    def wait(self, debounce: float) -> set[Path]:
+        """Block until files change, then keep collecting until no change arrived for debounce seconds."""
+
+        changed: set[Path] = set()
+
+        while True:
+
+            batch = {path for path in self._backend.poll(debounce if changed else None) if not self.ignore(path)}
+
+            if batch:
+
+                changed |= batch
+                continue
+
+            if changed:
+                return changed
+
+    def close(self):
+        """Stop watching."""
+
+        self._backend.close()
@@ -0,0 +1,272 @@
+from pathlib import Path
+import json
+import re
+import os
+
+# Names of pending calculation items ("\x02" item type, sign byte, NUL terminated name)
+STACK_NAME = re.compile(rb'\x02[\x00\x01]([A-Za-z_.@][\w.@]*)\x00')
+
+LABEL_RECORD = 25
+REFERENCE_RECORD = 27
+
+
+def _is_global(name: str) -> bool:
+    """Tell whether a label is visible to other objects (not anonymous +/-/__ and not _local)."""
+
+    return bool(name) and not name.startswith('_') and name.strip('+-') != ''
+
+
+class WlaObject:
+
+    def __init__(self, path: Path):
+        """Read the exported and imported symbols of a WLA DX object file."""
+
+        self.path = Path(path)
+        self.exports: set[str] = set()
+        self.imports: set[str] = set()
+
+        self._read(self.path.read_bytes())
+
+    @staticmethod
+    def _int(data: bytes, i: int) -> int:
+        """Read a big-endian 32-bit integer."""
+
+        return int.from_bytes(data[i:i + 4], 'big')
+
+    def _find_source_table(self, data: bytes) -> int:
+        """Return the offset of the source file table, which follows the variable sized rom bank map."""
+
+        for start in range(5, min(len(data) - 4, 4096)):
+
+            count = self._int(data, start)
+
+            if not 0 < count < 256:
+                continue
+
+            i = start + 4
+            valid = True
+
+            for file_id in range(1, count + 1):
+
+                end = data.find(b'\0', i, i + 256)
+
+                if end <= i or not data[i:end].isascii() or self._int(data, end + 1) != file_id:
+
+                    valid = False
+                    break
+
+                i = end + 9
+
+            if valid:
+                return start
+
+        raise ValueError(f"{self.path.name} is not a WLA DX object file")
+
+    def _read(self, data: bytes):
+        """Parse the definitions, labels and references sections."""
+
+        if data[:3] != b'WLA':
+            raise ValueError(f"{self.path.name} is not a WLA DX object file")
+
+        # Source files: count, then name, id and checksum per file
+        i = self._find_source_table(data)
+        count = self._int(data, i)
+        i += 4
+
+        for _ in range(count):
+            i = data.index(b'\0', i) + 9
+
+        # Definitions: none of them name code or data, skip them
+        count = self._int(data, i)
+        i += 4
+
+        for _ in range(count):
+
+            i = data.index(b'\0', i) + 1
+            kind = data[i]
+            i += 1
+
+            if kind == 0:
+                i += 8
+
+            elif kind == 1:
+                i = data.index(b'\0', i) + 1
+
+            else:
+                i += 4
+
+        # Labels: name terminated by its status byte, then a fixed size record
+        labels = set()
+        count = self._int(data, i)
+        i += 4
+
+        for _ in range(count):
+
+            end = i
+
+            while data[end] > 2:
+                end += 1
+
+            labels.add(data[i:end].decode(errors="replace"))
+            i = end + 1 + LABEL_RECORD
+
+        # References: names resolved by the linker, then a fixed size record
+        references = set()
+        count = self._int(data, i)
+        i += 4
+
+        for _ in range(count):
+
+            end = data.index(b'\0', i)
+            references.add(data[i:end].decode(errors="replace"))
+            i = end + 1 + REFERENCE_RECORD
+
+        # Pending calculations also name labels (e.g. "label+2" or ":label")
+        references.update(match.group(1).decode() for match in STACK_NAME.finditer(data, i))
+
+        self.exports = {name for name in labels if _is_global(name)}
+        self.imports = {name for name in references if _is_global(name)} - labels
+
+
+def read_symbols(path: Path) -> WlaObject | None:
+    """Return the symbols of an object file, or None when it can't be parsed."""
+
+    try:
+
+        return WlaObject(path)
+
+    except (OSError, ValueError, IndexError):
+
+        return None
+
+
+class SymbolIndex:
+
+    CACHE_VERSION = 1
+
+    def __init__(self, cache_path: Path):
+        """Initialize a SymbolIndex of object files, cached in cache_path and refreshed by file stat."""
+
+        self.cache_path = Path(cache_path)
+
+        # path -> {"stat": [mtime_ns, size], "valid": bool, "exports": [...], "imports": [...]}
+        self._entries: dict[str, dict] = {}
+        self._dirty = False
+
+        try:
+
+            with open(self.cache_path) as f:
+
+                data = json.load(f)
+
+            if data.get("version") == self.CACHE_VERSION:
+                self._entries = data["objects"]
+
+        except (OSError, ValueError, KeyError):
+
+            pass
+
+    def save(self):
+        """Write the index if something was (re)read."""
+
+        if not self._dirty:
+            return
+
+        self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.cache_path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+
+            json.dump({"version": self.CACHE_VERSION, "objects": self._entries}, f)
+
+        os.replace(tmp_path, self.cache_path)
+        self._dirty = False
+
+    def symbols(self, path: Path) -> tuple[set[str], set[str]] | None:
+        """Return the exports and imports of an object, or None when it can't be parsed."""
+
+        key = str(Path(path).resolve())
+
+        try:
+
+            st = Path(path).stat()
+
+        except OSError:
+
+            return None
+
+        stat = [st.st_mtime_ns, st.st_size]
+        entry = self._entries.get(key)
+
+        if entry is None or entry["stat"] != stat:
+
+            obj = read_symbols(Path(path))
+
+            entry = {
+                "stat": stat,
+                "valid": obj is not None,
+                "exports": sorted(obj.exports) if obj else [],
+                "imports": sorted(obj.imports) if obj else []
+            }
+
+            self._entries[key] = entry
+            self._dirty = True
+
+        if not entry["valid"]:
+            return None
+
+        return set(entry["exports"]), set(entry["imports"])
+
+    def select(self, objects: list[Path], libraries: list[Path]) -> list[Path]:
+        """Return the libraries in the transitive closure of what the objects reference, in their original order.
+
+        Startup objects (crt0*) are always kept, since nothing references them by name. When an
+        object or library can't be parsed the selection can't be trusted and every library is kept.
+        """
+
+        library_symbols = {lib: self.symbols(lib) for lib in libraries}
+        pending: set[str] = set()
+        defined: set[str] = set()
+
+        for obj in objects:
+
+            symbols = self.symbols(obj)
+
+            if symbols is None:
+                return list(libraries)
+
+            defined |= symbols[0]
+            pending |= symbols[1]
+
+        if any(symbols is None for symbols in library_symbols.values()):
+            return list(libraries)
+
+        providers: dict[str, Path] = {}
+
+        for lib in sorted(libraries):
+
+            for name in library_symbols[lib][0]:
+                providers.setdefault(name, lib)
+
+        selected = {lib for lib in libraries if lib.name.startswith('crt0')}
+
+        for lib in selected:
+            pending |= library_symbols[lib][1]
+
+        while pending:
+
+            name = pending.pop()
+
+            if name in defined:
+                continue
+
+            defined.add(name)
+            lib = providers.get(name)
+
+            if lib is not None and lib not in selected:
+
+                selected.add(lib)
+                defined |= library_symbols[lib][0]
+                pending |= library_symbols[lib][1] - defined
+
+        return [lib for lib in libraries if lib in selected]
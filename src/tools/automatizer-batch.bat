@@ -8,12 +8,20 @@ set "toolsDirectory=%~dp0.."
 
 :: Set the full path to automatizer.exe
 set "automatizerPath=%toolsDirectory%\libs\pvsneslib\devkitsnes\automatizer.exe"
+set "clientPath=%toolsDirectory%\libs\pvsneslib\devkitsnes\buildclient.exe"
 
 :: Check if automatizer.exe exists
 if exist "%automatizerPath%" (
     :: Change to the user-specified directory
     cd /d "%userDirectory%"
 
+    :: A running build server (buildserver.exe) builds without any startup cost, only exit code 3 means none answered
+    if exist "%clientPath%" (
+        "%clientPath%" "%userDirectory%" "%MemoryMap%" "%Speed%"
+        if not errorlevel 3 goto done
+        if errorlevel 4 goto done
+    )
+
     :: Execute automatizer.exe with the userDirectory as an argument
     "%automatizerPath%" "%userDirectory%" "%MemoryMap%" "%Speed%"
     echo Execution successful!
@@ -24,5 +32,7 @@ if exist "%automatizerPath%" (
     
 )
 
+:done
+
 :: Pause at the end of the script
 pause
@@ -1,12 +1,31 @@
-from tkinter import StringVar, messagebox, filedialog, SOLID
+from tkinter import StringVar, messagebox, filedialog, simpledialog, SOLID
 from pathlib import Path
 import tkinter as tk
 import subprocess
+import multiprocessing
 import webbrowser
+import base64
 import atexit
 import sys
 import os
 
+# The built-in converter needs NumPy and Pillow; without them every conversion goes through gfx4snes.exe
+try:
+
+    import snesgfx
+    import gfxbatch
+    import tmxcompiler
+    import tileextractor
+    import snespreview
+
+except ImportError:
+
+    snesgfx = None
+    gfxbatch = None
+    tmxcompiler = None
+    tileextractor = None
+    snespreview = None
+
 class shutil:
     """Reimplementation of class shutil to avoid errors in Wine"""
 
@@ -134,10 +153,10 @@ class Gfx4SnesExecutor:
             "-b,        add blank tile management (for multiple bgs)",
             "-s,        size of image blocks in pixels {[8],16,32,64} <int>",
             "-k,        output in packed pixel format",
-            "-z,        add blank tile management (for multiple bgs)",
+            "-z,        output in lz77 compressed pixel format",
             "-W,        width of image block in pixels <int>",
             "-H,        height of image block in pixels <int>",
-            "-f,        generate the whole picture with an offset for tile number {0..2047}",
+            "-f,        generate the whole picture with an offset for tile number {0..2047} <int>",
             "-m,        include map for output",
             "-g,        include high priority bit in map",
             "-y,        generate map in pages of 32x32 (good for scrolling)",
@@ -174,10 +193,10 @@ class Gfx4SnesExecutor:
             "-b,        add blank tile management (for multiple bgs)",
             "-s,        size of image blocks in pixels {[8],16,32,64} <int>",
             "-k,        output in packed pixel format",
-            "-z,        add blank tile management (for multiple bgs)",
+            "-z,        output in lz77 compressed pixel format",
             "-W,        width of image block in pixels <int>",
             "-H,        height of image block in pixels <int>",
-            "-f,        generate the whole picture with an offset for tile number {0..2047}",
+            "-f,        generate the whole picture with an offset for tile number {0..2047} <int>",
             "-m,        include map for output",
             "-g,        include high priority bit in map",
             "-y,        generate map in pages of 32x32 (good for scrolling)",
@@ -211,6 +230,12 @@ class Gfx4SnesExecutor:
         nwindow.destroy()
 
         input_path = Path(input_file)
+
+        if snesgfx is not None and snesgfx.supports(args):
+
+            self._convert(input_path, args)
+            return
+
         command = [str(self.gfx4snes_path)] + args
 
         if input_path.suffix.lower() == '.bmp':
@@ -223,8 +248,157 @@ class Gfx4SnesExecutor:
 
         result = subprocess.run(command, cwd=str(input_path.parent), capture_output=True)
 
+        if result.returncode == 0 and snespreview is not None:
+
+            written = [input_path.with_suffix(suffix) for suffix in ('.pic', '.pc7') if input_path.with_suffix(suffix).is_file()]
+
+            if written:
+
+                PreviewWindow.show(f"gfx4snes: {input_path.name}", written, args=args)
+                return
+
         messagebox.showinfo("Result: ", str(result))
 
+    def _convert(self, input_path: Path, args: list):
+        """Convert the image in this process with the built-in gfx4snes engine, writing the same files next to it."""
+
+        try:
+
+            converter, _ = snesgfx.Gfx4Snes.from_args(args)
+            written = converter.convert_file(input_path)
+
+        except SystemExit:
+
+            messagebox.showerror("Fatal", f"Invalid gfx4snes options: {' '.join(args)}")
+            return
+
+        except Exception as e:
+
+            messagebox.showerror("Fatal", f"Error while converting {input_path.name}: {e}")
+            return
+
+        pictures = [path for path in written.values() if path.suffix.lower() in ('.pic', '.pc7')]
+
+        # Show what the SNES will draw rather than only the file names
+        if snespreview is not None and pictures:
+
+            PreviewWindow.show("Written " + ", ".join(path.name for path in written.values()), pictures, args=args)
+            return
+
+        messagebox.showinfo("Result: ", "Written " + ", ".join(path.name for path in written.values()))
+
+class PreviewWindow:
+
+    @staticmethod
+    def show(title: str, pictures: list, previews: list | None = None, args: list | None = None) -> None:
+        """Open a window with the previews of converted images (.pic/.pc7), rendered back as the SNES shows them.
+
+        args are the gfx4snes flags the pictures were just converted with, else each one's gfx.json rule is used.
+        """
+
+        if previews is None:
+
+            previewer = snespreview.Previewer(gfxbatch.GfxCache(snespreview.default_preview_dir()))
+            previews = []
+
+            for picture in pictures:
+
+                try:
+
+                    previews.append({"asset": str(picture), "png": previewer.preview(picture, args)[0]})
+
+                except Exception as e:
+
+                    previews.append({"asset": str(picture), "error": str(e)})
+
+        window = tk.Toplevel()
+        window.title(title)
+
+        images = []
+        columns = 4
+
+        for i, preview in enumerate(previews):
+
+            frame = tk.Frame(window)
+            frame.grid(row=i // columns, column=i % columns, padx=4, pady=4)
+
+            if "png" in preview:
+
+                image = tk.PhotoImage(master=window, data=base64.b64encode(preview["png"]).decode())
+                images.append(image)
+                tk.Label(frame, image=image).pack()
+
+            else:
+
+                tk.Label(frame, text=f"Failed: {preview['error']}").pack()
+
+            tk.Label(frame, text=Path(preview["asset"]).name).pack()
+
+        # Tk drops an image once Python no longer references it, so the window keeps its own
+        window.images = images
+
+class GfxPreviewExecutor:
+
+    def run(self):
+        """Preview every converted image of a graphics folder, reusing the thumbnails of unchanged files."""
+
+        if snespreview is None:
+
+            messagebox.showerror("Fatal", "Previewing graphics needs NumPy and Pillow (pip install numpy pillow)")
+            return -1
+
+        res_dir = filedialog.askdirectory(title="Select the graphics folder (res) to preview")
+
+        if not res_dir:
+
+            messagebox.showerror("Fatal", "No directory selected")
+            return -1
+
+        previews = snespreview.Previewer(gfxbatch.GfxCache(snespreview.default_preview_dir())).preview_directory(Path(res_dir))
+
+        if not previews:
+
+            messagebox.showerror("Fatal", f"No .pic or .pc7 files in {res_dir}")
+            return -1
+
+        PreviewWindow.show(f"Previews of {res_dir}", [], previews)
+
+        return 0
+
+class GfxBatchExecutor:
+
+    def run(self):
+        """Convert every image of a graphics folder with the options of its gfx.json manifest, reusing cached outputs."""
+
+        if gfxbatch is None:
+
+            messagebox.showerror("Fatal", "Converting a whole folder needs NumPy and Pillow (pip install numpy pillow)")
+            return -1
+
+        res_dir = filedialog.askdirectory(title="Select the graphics folder (res) to convert")
+
+        if not res_dir:
+
+            messagebox.showerror("Fatal", "No directory selected")
+            return -1
+
+        try:
+
+            report = gfxbatch.GfxBatch(res_dir, cache=gfxbatch.GfxCache()).run()
+
+        except Exception as e:
+
+            messagebox.showerror("Fatal", f"Error while converting {res_dir}: {e}")
+            return -1
+
+        failed = [f"{result['asset']}: {result['error']}" for result in report["results"] if result["status"] == "failed"]
+
+        messagebox.showinfo("SNES-IDE", "\n".join([
+            f"{report['assets']} images: {report['converted']} converted, {report['cached']} from cache, {report['up_to_date']} up to date, {report['failed']} failed in {report['wall_s']:.2f}s"
+        ] + failed))
+
+        return 1 if failed else 0
+
 class SnesToolsExecutor:
 
     def __init__(self, path_manager: PathManager):
@@ -277,6 +451,10 @@ class Tmx2SnesExecutor:
                 return -1
             
             input_path = Path(input_file)
+
+            if tmxcompiler is not None:
+                return self._compile(input_path, Path(input_file2).stem)
+
             subprocess.run([str(self.tmx2snes_path), str(input_path), str(input_file2)], cwd=str(input_path.parent))
 
         except subprocess.CalledProcessError as e:
@@ -287,6 +465,19 @@ class Tmx2SnesExecutor:
         messagebox.showinfo("SNES-IDE", "Success!")
         return 0
 
+    def _compile(self, input_path: Path, map_name: str):
+        """Compile the map with the built-in TMX compiler, next to the .tmx like tmx2snes."""
+
+        result = tmxcompiler.compile_map(input_path, map_name)
+
+        if "error" in result:
+
+            messagebox.showerror("Fatal", f"Error while compiling {input_path.name}: {result['error']}")
+            return -1
+
+        messagebox.showinfo("SNES-IDE", "Success! Written: " + ", ".join(result["files"]))
+        return 0
+
 class FontCopier:
 
     def __init__(self, path_manager: PathManager):
@@ -346,7 +537,10 @@ class TilesetExtractorOpener:
         self.tse_path = path_manager.get_tool_path("libs", "pvsneslib", "tools", "tilesetextractor", "index.html")
 
     def run(self):
-        """Open the tileset extractor in the default web browser."""
+        """Extract the tileset and map of an image in-process, or open the tileset extractor in the default web browser."""
+
+        if tileextractor is not None:
+            return self._extract()
 
         # Register cleanup on exit
         server = HTTPServer(self.tse_path)
@@ -354,6 +548,32 @@ class TilesetExtractorOpener:
 
         server.run()
 
+    def _extract(self):
+        """Write the unique tiles (_tiles.png), the map (.json) and a Tiled map (.tmx) next to the selected image."""
+
+        input_file = filedialog.askopenfilename(filetypes=[("Images", "*.png *.gif *.bmp")])
+
+        if not input_file:
+            return -1
+
+        size = simpledialog.askinteger("Tileset extractor", "Tile size in pixels (8 or 16):", initialvalue=8, minvalue=4, maxvalue=128)
+
+        if not size:
+            return -1
+
+        try:
+
+            result = tileextractor.TileExtractor(size, size).extract_file(Path(input_file))
+
+        except Exception as e:
+
+            messagebox.showerror("Fatal", f"Error while extracting {Path(input_file).name}: {e}")
+            return -1
+
+        rows, cols = result["map"].shape
+        messagebox.showinfo("SNES-IDE", f"{cols}x{rows} map, {len(result['tiles'])} unique tiles. Written: " + ", ".join(result["files"]))
+        return 0
+
 class GfxToolsApp:
 
     def __init__(self):
@@ -369,10 +589,12 @@ class GfxToolsApp:
 
         self._add_button("Mode 3 and 7 tileset and tilemap editor", "Click to run M8TE", M8TEExecutor(self.path_manager).run)
         self._add_button("gfx4snes of pvsneslib! convert your image to .pic, .pal and .map format", "Click to select your image", Gfx4SnesExecutor(self.path_manager).run)
+        self._add_button("Convert a whole graphics folder with the options of its gfx.json (only changed images)", "Click to select your graphics folder", GfxBatchExecutor().run)
+        self._add_button("Preview the converted graphics (.pic, .pal and .map) of a folder as the SNES shows them", "Click to select your graphics folder", GfxPreviewExecutor().run)
         self._add_button("SNES file info viewer(snestools of pvsneslib)", "Click to select your smc/sfc file", SnesToolsExecutor(self.path_manager).run)
         self._add_button("TMX and map converter(tmx2snes)", "Click to select your tmx and map files", Tmx2SnesExecutor(self.path_manager).run)
         self._add_button("The pvsneslib text font in your hands, just copy as font.png", "Click to generate the text font in the desired folder", FontCopier(self.path_manager).run)
-        self._add_button("Online Tileset extractor by André Michelle", "Click to run tileset extractor", TilesetExtractorOpener(self.path_manager).run)
+        self._add_button("Tileset extractor (after André Michelle's): unique tiles and map of a screenshot", "Click to run tileset extractor", TilesetExtractorOpener(self.path_manager).run)
 
     def _add_button(self, label_text, button_text, command):
         """Create a label and button in the main window."""
@@ -395,4 +617,7 @@ class GfxToolsApp:
 if __name__ == "__main__":
     """Run the GfxToolsApp if this script is executed directly."""
 
+    # Folder conversions run on worker processes, which frozen executables have to dispatch here
+    multiprocessing.freeze_support()
+
     GfxToolsApp().run()
@@ -0,0 +1,363 @@
+from concurrent.futures import ProcessPoolExecutor
+from snesgfx import Gfx4Snes, CONVERTER_VERSION
+from pathlib import Path
+import multiprocessing
+import tempfile
+import argparse
+import hashlib
+import fnmatch
+import shlex
+import json
+import time
+import sys
+import os
+
+# Bump when the cache layout changes; output changes bump snesgfx.CONVERTER_VERSION, which is part of every key too
+CACHE_VERSION = 1
+
+IMAGE_SUFFIXES = {".png", ".bmp"}
+
+MANIFEST_NAME = "gfx.json"
+
+
+def default_cache_dir() -> Path:
+    """Return the per-user converted graphics cache directory, SNES_IDE_CACHE overrides its parent."""
+
+    if os.environ.get('SNES_IDE_CACHE'):
+        return Path(os.environ['SNES_IDE_CACHE']).parent / 'gfxcache'
+
+    if sys.platform == 'win32' and os.environ.get('LOCALAPPDATA'):
+        return Path(os.environ['LOCALAPPDATA']) / 'snes-ide' / 'gfxcache'
+
+    return Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache')) / 'snes-ide' / 'gfxcache'
+
+
+def file_digest(path: Path) -> str:
+    """Return the SHA-256 of a file's content."""
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as f:
+
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+def convert_asset(image: Path, options: str) -> dict:
+    """Convert one image with gfx4snes options and return its outputs and timing (runs in a worker process)."""
+
+    start = time.perf_counter()
+
+    try:
+
+        converter, _ = Gfx4Snes.from_args(shlex.split(options))
+        outputs = converter.convert(*converter.load(image))
+
+    except SystemExit:
+
+        return {"error": f"invalid options: {options}", "ms": (time.perf_counter() - start) * 1000}
+
+    except Exception as e:
+
+        return {"error": str(e), "ms": (time.perf_counter() - start) * 1000}
+
+    return {"outputs": outputs, "ms": (time.perf_counter() - start) * 1000}
+
+
+class GfxCache:
+
+    def __init__(self, root: Path | None = None):
+        """Initialize a content-addressed cache of converted graphics: one file per output kind, plus an index of the kinds."""
+
+        self.root = Path(root) if root else default_cache_dir()
+
+    def _path(self, key: str, kind: str) -> Path:
+        """Return where an output of a key is stored."""
+
+        return self.root / key[:2] / f"{key[2:]}.{kind}"
+
+    def fetch(self, key: str) -> dict[str, bytes] | None:
+        """Return the cached outputs of a key, or None on a miss."""
+
+        try:
+
+            kinds = json.loads(self._path(key, 'json').read_text())
+
+            return {kind: self._path(key, kind).read_bytes() for kind in kinds}
+
+        except (OSError, ValueError):
+
+            return None
+
+    def store(self, key: str, outputs: dict[str, bytes]):
+        """Add the outputs of a conversion, ignoring failures (the cache is best effort)."""
+
+        try:
+
+            self._path(key, 'json').parent.mkdir(parents=True, exist_ok=True)
+
+            # The kinds index is written last, so a half-stored entry is a miss
+            for kind, data in list(outputs.items()) + [('json', json.dumps(sorted(outputs)).encode())]:
+
+                fd, tmp_name = tempfile.mkstemp(dir=self._path(key, kind).parent, suffix='.tmp')
+
+                try:
+
+                    with os.fdopen(fd, 'wb') as f:
+
+                        f.write(data)
+
+                    os.replace(tmp_name, self._path(key, kind))
+
+                except OSError:
+
+                    Path(tmp_name).unlink(missing_ok=True)
+                    raise
+
+        except OSError as e:
+
+            print(f"Graphics cache store failed: {e}")
+
+
+class GfxBatch:
+
+    def __init__(self, res_dir: Path, manifest: Path | None = None, workers: int = 0, cache: GfxCache | None = None, state_path: Path | None = None):
+        """Initialize a GfxBatch converting every PNG/BMP of res_dir with the options its manifest gives them."""
+
+        self.res_dir = Path(res_dir).absolute()
+        self.manifest_path = Path(manifest) if manifest else self.res_dir / MANIFEST_NAME
+        self.workers = workers if workers > 0 else (os.cpu_count() or 1)
+        self.cache = cache
+
+        # Stat and key of every image at the last run, so unchanged images are not even read
+        self.state_path = Path(state_path) if state_path else self.res_dir / '.snes-ide' / 'gfxbatch.json'
+
+        self.defaults, self.rules = self._load_manifest()
+
+    def _load_manifest(self) -> tuple[str, list[tuple[str, str]]]:
+        """Read the manifest: {"defaults": "gfx4snes options", "assets": {"glob pattern": "options", ...}}."""
+
+        if not self.manifest_path.is_file():
+            return "", []
+
+        with open(self.manifest_path) as f:
+
+            manifest = json.load(f)
+
+        return manifest.get("defaults", ""), list(manifest.get("assets", {}).items())
+
+    def options(self, rel_path: str) -> str | None:
+        """Return the options of an asset: the first matching rule, else the defaults; None excludes it."""
+
+        for pattern, options in self.rules:
+
+            if fnmatch.fnmatch(rel_path, pattern):
+                return options
+
+        return self.defaults
+
+    def find_assets(self) -> list[tuple[Path, str]]:
+        """Return every image of the tree with its options, skipping build directories."""
+
+        assets = []
+
+        for root, dirs, files in os.walk(self.res_dir):
+
+            dirs[:] = sorted(name for name in dirs if not name.startswith('.'))
+
+            for name in sorted(files):
+
+                image = Path(root) / name
+
+                if image.suffix.lower() not in IMAGE_SUFFIXES:
+                    continue
+
+                options = self.options(image.relative_to(self.res_dir).as_posix())
+
+                if options is not None:
+                    assets.append((image, options))
+
+        return assets
+
+    def _load_state(self) -> dict:
+        """Load the image stats and keys of the previous run."""
+
+        try:
+
+            with open(self.state_path) as f:
+
+                state = json.load(f)
+
+            # Keys remembered by an older converter would point at outdated outputs
+            return state["assets"] if state.get("version") == CACHE_VERSION and state.get("converter") == CONVERTER_VERSION else {}
+
+        except (OSError, ValueError, KeyError):
+
+            return {}
+
+    def _save_state(self, state: dict):
+        """Write the image stats and keys of this run."""
+
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix('.tmp')
+
+        with open(tmp_path, 'w') as f:
+
+            json.dump({"version": CACHE_VERSION, "converter": CONVERTER_VERSION, "assets": state}, f, indent=1)
+
+        os.replace(tmp_path, self.state_path)
+
+    def _key(self, image: Path, options: str, previous: dict | None) -> tuple[str, list[int]]:
+        """Return the cache key of an image and options, reusing the last key when the file's stat is unchanged."""
+
+        st = image.stat()
+        stat = [st.st_mtime_ns, st.st_size]
+
+        if previous and previous["stat"] == stat and previous["options"] == options:
+            return previous["key"], stat
+
+        content = file_digest(image)
+
+        return hashlib.sha256(f"{CACHE_VERSION}\0{CONVERTER_VERSION}\0{' '.join(shlex.split(options))}\0{content}".encode()).hexdigest(), stat
+
+    @staticmethod
+    def _write_outputs(image: Path, outputs: dict[str, bytes]) -> bool:
+        """Write filename.pic/.pal/.map next to the image, leaving identical files untouched so builds don't see them change."""
+
+        changed = False
+
+        for kind, data in outputs.items():
+
+            path = image.with_suffix(f".{kind}")
+
+            try:
+
+                if path.stat().st_size == len(data) and path.read_bytes() == data:
+                    continue
+
+            except OSError:
+
+                pass
+
+            path.write_bytes(data)
+            changed = True
+
+        return changed
+
+    def run(self) -> dict:
+        """Convert the assets whose content or options changed, in parallel, and return the per-asset report."""
+
+        start = time.perf_counter()
+        state = self._load_state()
+        new_state = {}
+        results = []
+        pending = []
+
+        for image, options in self.find_assets():
+
+            rel_path = image.relative_to(self.res_dir).as_posix()
+            key, stat = self._key(image, options, state.get(rel_path))
+            new_state[rel_path] = {"stat": stat, "options": options, "key": key}
+
+            previous = state.get(rel_path)
+            outputs_present = all(image.with_suffix(f".{kind}").exists() for kind in (previous or {}).get("kinds", ["pic"]))
+
+            if previous and previous["key"] == key and outputs_present:
+
+                new_state[rel_path]["kinds"] = previous.get("kinds", ["pic"])
+                results.append({"asset": rel_path, "status": "up to date", "ms": 0.0})
+                continue
+
+            cached = self.cache.fetch(key) if self.cache else None
+
+            if cached is not None:
+
+                self._write_outputs(image, cached)
+                new_state[rel_path]["kinds"] = sorted(cached)
+                results.append({"asset": rel_path, "status": "cached", "ms": 0.0})
+                continue
+
+            pending.append((rel_path, image, options, key))
+
+        if len(pending) > 1 and self.workers > 1:
+
+            with ProcessPoolExecutor(max_workers=min(self.workers, len(pending))) as pool:
+
+                converted = list(pool.map(convert_asset, [image for _, image, _, _ in pending], [options for _, _, options, _ in pending]))
+
+        else:
+
+            converted = [convert_asset(image, options) for _, image, options, _ in pending]
+
+        for (rel_path, image, options, key), result in zip(pending, converted):
+
+            if "error" in result:
+
+                # Forget the asset, so the next run retries it
+                del new_state[rel_path]
+                results.append({"asset": rel_path, "status": "failed", "ms": result["ms"], "error": result["error"]})
+                continue
+
+            self._write_outputs(image, result["outputs"])
+            new_state[rel_path]["kinds"] = sorted(result["outputs"])
+
+            if self.cache:
+                self.cache.store(key, result["outputs"])
+
+            results.append({"asset": rel_path, "status": "converted", "ms": result["ms"]})
+
+        self._save_state(new_state)
+
+        results.sort(key=lambda result: result["asset"])
+
+        return {
+            "assets": len(results),
+            "converted": sum(result["status"] == "converted" for result in results),
+            "cached": sum(result["status"] == "cached" for result in results),
+            "up_to_date": sum(result["status"] == "up to date" for result in results),
+            "failed": sum(result["status"] == "failed" for result in results),
+            "wall_s": time.perf_counter() - start,
+            "results": results
+        }
+
+
+def print_report(report: dict, verbose: bool = True):
+    """Print the per-asset timings and the summary of a batch conversion."""
+
+    for result in report["results"]:
+
+        if verbose or result["status"] in ("converted", "failed"):
+            print(f"{result['status']:>10} {result['ms']:8.1f} ms  {result['asset']}" + (f"  ({result['error']})" if "error" in result else ""))
+
+    print(f"{report['assets']} assets: {report['converted']} converted, {report['cached']} from cache, "
+          f"{report['up_to_date']} up to date, {report['failed']} failed, in {report['wall_s']:.2f}s")
+
+
+if __name__ == "__main__":
+
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Convert every image of a project's graphics tree with the gfx4snes options of its manifest.")
+    parser.add_argument("res_dir", type=Path, help="graphics directory, e.g. the project's res/")
+    parser.add_argument("--manifest", type=Path, default=None, help=f"options manifest (default: res_dir/{MANIFEST_NAME})")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="images converted at once, 0 uses every core")
+    parser.add_argument("--cache", type=Path, default=None, help="converted graphics cache (default: per-user cache dir)")
+    parser.add_argument("--no-cache", action="store_true", help="don't share converted outputs through the cache")
+    parser.add_argument("-v", "--verbose", action="store_true", help="also list the up to date and cached assets")
+    parser.add_argument("--report", type=Path, default=None, help="write the full JSON report here")
+
+    cli = parser.parse_args()
+
+    report = GfxBatch(cli.res_dir, cli.manifest, cli.workers, None if cli.no_cache else GfxCache(cli.cache)).run()
+
+    print_report(report, cli.verbose)
+
+    if cli.report:
+
+        with open(cli.report, 'w') as f:
+
+            json.dump(report, f, indent=1)
+
+    sys.exit(1 if report["failed"] else 0)
@@ -0,0 +1,302 @@
+from pathlib import Path
+import numpy as np
+import argparse
+import time
+
+# LzssDecodeVram (pvsneslib lzsss.asm) reads the GBA BIOS LZ77 format: a 0x10 header byte and the 24 bit decompressed size,
+# then groups of 8 tokens behind a flag byte (bit 7 first, 1 = match). A match is 2 bytes: (length - 3) << 4 | (distance - 1) >> 8,
+# then (distance - 1) & 0xFF; a literal is 1 byte.
+LZ77_TYPE = 0x10
+
+MIN_MATCH = 3
+MAX_MATCH = 18
+WINDOW = 4096
+
+# The decoder counts the remaining bytes in a 16 bit register, only the low 16 bits of the size are used
+MAX_SIZE = 0xFFFF
+
+# Candidates tried per position by the hash chain search
+DEFAULT_DEPTH = 64
+
+
+def _equal_bytes(xor: np.ndarray) -> np.ndarray:
+    """Count the equal leading bytes of little endian words from their XOR: the zero bytes below its lowest set bit."""
+
+    lowest = xor & (~xor + np.uint64(1))
+    counts = np.full(len(xor), 8)
+    nonzero = xor != 0
+    counts[nonzero] = np.log2(lowest[nonzero].astype(np.float64)).astype(np.int64) // 8
+
+    return counts
+
+
+def find_matches(data: np.ndarray, depth: int = DEFAULT_DEPTH) -> tuple[np.ndarray, np.ndarray]:
+    """Return the longest match (length, distance) in the window at every position, nearest first on ties.
+
+    Positions are grouped by their first 3 bytes with one sort, so the hash chain of a position is the entries before it in its
+    group; every chain step is then tested for all positions at once.
+    """
+
+    n = len(data)
+    lengths = np.zeros(n, dtype=np.int64)
+    distances = np.zeros(n, dtype=np.int64)
+
+    if n < MIN_MATCH:
+        return lengths, distances
+
+    wide = data.astype(np.int64)
+    keys = wide[:-2] << 16 | wide[1:-1] << 8 | wide[2:]
+    order = np.argsort(keys, kind="stable")
+    sorted_keys = keys[order]
+
+    # Bytes 3-10 and 11-18 after every position as little endian words, so a match is measured with two XORs
+    padded = np.concatenate([data, np.zeros(2 * MAX_MATCH, dtype=np.uint8)])
+    windows = np.lib.stride_tricks.sliding_window_view(padded, 8)
+    head = np.ascontiguousarray(windows[MIN_MATCH:MIN_MATCH + n]).view(np.uint64).ravel()
+    tail = np.ascontiguousarray(windows[MIN_MATCH + 8:MIN_MATCH + 8 + n]).view(np.uint64).ravel()
+
+    # Rows of the sorted order still looking for a better match
+    active = np.arange(1, len(order))
+
+    for step in range(1, depth + 1):
+
+        active = active[active >= step]
+
+        if len(active) == 0:
+            break
+
+        positions = order[active]
+        candidates = order[active - step]
+
+        # Chains only hold earlier positions with the same first 3 bytes, nearest first
+        valid = (sorted_keys[active - step] == sorted_keys[active]) & (positions - candidates <= WINDOW)
+        active, positions, candidates = active[valid], positions[valid], candidates[valid]
+
+        first = _equal_bytes(head[positions] ^ head[candidates])
+        second = _equal_bytes(tail[positions] ^ tail[candidates])
+        length = np.minimum(MIN_MATCH + first + np.where(first == 8, second, 0), MAX_MATCH)
+
+        better = length > lengths[positions]
+        lengths[positions[better]] = length[better]
+        distances[positions[better]] = (positions - candidates)[better]
+
+        # A maximal match can't be beaten by a farther one
+        active = active[lengths[positions] < MAX_MATCH]
+
+    # Matches can't run past the end of the data
+    lengths = np.minimum(lengths, n - np.arange(n))
+    lengths[lengths < MIN_MATCH] = 0
+
+    return lengths, distances
+
+
+def parse(lengths: np.ndarray, distances: np.ndarray) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Choose the tokens with lazy matching: a match is deferred by one literal when the next position has a longer one.
+
+    Returns the token positions, lengths (0 for literals) and distances.
+    """
+
+    n = len(lengths)
+    lengths_list = lengths.tolist()
+    positions, token_lengths = [], []
+    i = 0
+
+    while i < n:
+
+        length = lengths_list[i]
+
+        if length and (i + 1 >= n or lengths_list[i + 1] <= length):
+
+            positions.append(i)
+            token_lengths.append(length)
+            i += length
+
+        else:
+
+            positions.append(i)
+            token_lengths.append(0)
+            i += 1
+
+    positions = np.array(positions, dtype=np.int64)
+    token_lengths = np.array(token_lengths, dtype=np.int64)
+
+    return positions, token_lengths, np.where(token_lengths > 0, distances[positions], 0)
+
+
+def encode(data: np.ndarray, positions: np.ndarray, lengths: np.ndarray, distances: np.ndarray) -> bytes:
+    """Write the header, flag bytes and tokens, placing every byte with array arithmetic."""
+
+    count = len(positions)
+    is_match = lengths > 0
+    sizes = 1 + is_match
+
+    # Flag byte of every 8 tokens, first token in bit 7
+    flags = np.packbits(np.concatenate([is_match, np.zeros(-count % 8, dtype=bool)]))
+
+    # Offset of every token after the header: its flag bytes so far plus the tokens before it
+    before = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+    offsets = 4 + np.arange(count) // 8 + 1 + before
+    flag_offsets = 4 + np.arange(len(flags)) + np.concatenate([[0], np.cumsum(sizes)])[np.arange(0, count, 8)]
+
+    out = np.zeros(4 + len(flags) + int(sizes.sum()), dtype=np.uint8)
+    out[0] = LZ77_TYPE
+    out[1:4] = np.frombuffer(len(data).to_bytes(3, 'little'), dtype=np.uint8)
+    out[flag_offsets] = flags
+
+    literals = ~is_match
+    out[offsets[literals]] = data[positions[literals]]
+
+    code = (lengths[is_match] - MIN_MATCH) << 12 | (distances[is_match] - 1)
+    out[offsets[is_match]] = code >> 8
+    out[offsets[is_match] + 1] = code & 0xFF
+
+    return out.tobytes()
+
+
+def compress(data: bytes, depth: int = DEFAULT_DEPTH) -> bytes:
+    """Compress data into the LZ77 stream LzssDecodeVram decodes (gfx4snes -z)."""
+
+    # A size of 0 would make the decoder's byte counter wrap around
+    if not 0 < len(data) <= MAX_SIZE:
+        raise Exception(f"LzssDecodeVram decodes 1 to {MAX_SIZE} bytes, not {len(data)}")
+
+    array = np.frombuffer(data, dtype=np.uint8)
+
+    return encode(array, *parse(*find_matches(array, depth)))
+
+
+def decompress(stream: bytes) -> bytes:
+    """Decode a stream the way LzssDecodeVram does: check the type, decode the 16 bit size, stop at that many bytes."""
+
+    if len(stream) < 4 or stream[0] & 0xF0 != LZ77_TYPE:
+        raise Exception("Not an LZ77 (type 0x10) stream")
+
+    size = stream[1] | stream[2] << 8
+    out = bytearray()
+    i = 4
+
+    while len(out) < size:
+
+        flags = stream[i]
+        i += 1
+
+        for bit in range(7, -1, -1):
+
+            if len(out) >= size:
+                break
+
+            if not flags >> bit & 1:
+
+                out.append(stream[i])
+                i += 1
+                continue
+
+            length = (stream[i] >> 4) + MIN_MATCH
+            distance = ((stream[i] & 0x0F) << 8 | stream[i + 1]) + 1
+            i += 2
+
+            if distance > len(out):
+                raise Exception(f"Match at byte {len(out)} reaches {distance} bytes back, before the start")
+
+            length = min(length, size - len(out))
+            start = len(out) - distance
+
+            # Overlapping matches repeat the last distance bytes
+            if distance >= length:
+                out += out[start:start + length]
+
+            else:
+                out += (out[start:] * (length // distance + 1))[:length]
+
+    return bytes(out)
+
+
+def verify(data: bytes, stream: bytes) -> bool:
+    """Tell whether a stream decodes back to data."""
+
+    try:
+
+        return decompress(stream) == data
+
+    except (Exception, IndexError):
+
+        return False
+
+
+def benchmark(files: list[Path], depth: int = DEFAULT_DEPTH) -> dict:
+    """Compress and verify every file (in MAX_SIZE streams), returning the ratio and the compression and decompression speeds."""
+
+    original = compressed = 0
+    compress_s = decompress_s = 0.0
+    failed = []
+
+    for path in files:
+
+        data = path.read_bytes()
+        ok = True
+
+        # LzssDecodeVram takes at most MAX_SIZE bytes a stream, bigger files are measured as the streams they would be split into
+        for chunk in (data[offset:offset + MAX_SIZE] for offset in range(0, len(data), MAX_SIZE)):
+
+            start = time.perf_counter()
+            stream = compress(chunk, depth)
+            compress_s += time.perf_counter() - start
+
+            start = time.perf_counter()
+            ok = verify(chunk, stream) and ok
+            decompress_s += time.perf_counter() - start
+
+            compressed += len(stream)
+
+        if not ok:
+            failed.append(str(path))
+
+        original += len(data)
+
+    return {
+        "files": len(files),
+        "bytes": original,
+        "compressed": compressed,
+        "ratio": compressed / original if original else 0.0,
+        "compress_mb_s": original / compress_s / 1e6 if compress_s else 0.0,
+        "decompress_mb_s": original / decompress_s / 1e6 if decompress_s else 0.0,
+        "failed": failed
+    }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Compress files for pvsneslib's LzssDecodeVram (LZ77 type 0x10, like gfx4snes -z).")
+    parser.add_argument("files", type=Path, nargs="*", help="files to compress, e.g. .pic tiles")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="output file (single input only, default: replace the input)")
+    parser.add_argument("-d", "--decompress", action="store_true", help="decompress instead")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH, help="match candidates tried per position (higher compresses better, slower)")
+    parser.add_argument("--no-verify", action="store_true", help="skip decoding every compressed file back")
+    parser.add_argument("--benchmark", type=Path, default=None, metavar="DIR", help="compress every .pic/.map/.bin under DIR and report ratio and MB/s")
+
+    cli = parser.parse_args()
+
+    if cli.benchmark:
+
+        files = sorted(path for path in cli.benchmark.rglob("*") if path.suffix.lower() in {".pic", ".map", ".bin", ".pc7", ".mp7"})
+        report = benchmark(files, cli.depth)
+
+        print(f"{report['files']} files, {report['bytes']} -> {report['compressed']} bytes ({report['ratio'] * 100:.1f}%), "
+              f"compress {report['compress_mb_s']:.2f} MB/s, decompress {report['decompress_mb_s']:.2f} MB/s")
+
+        for path in report["failed"]:
+            print(f"Round trip FAILED: {path}")
+
+    if cli.output and len(cli.files) != 1:
+        parser.error("--output needs exactly one input file")
+
+    for path in cli.files:
+
+        data = path.read_bytes()
+        result = decompress(data) if cli.decompress else compress(data, cli.depth)
+
+        if not cli.decompress and not cli.no_verify and not verify(data, result):
+            raise Exception(f"Round trip failed for {path}")
+
+        (cli.output or path).write_bytes(result)
+        print(f"{path}: {len(data)} -> {len(result)} bytes")
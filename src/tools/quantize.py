@@ -0,0 +1,279 @@
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import argparse
+import time
+
+MAX_PALETTES = 8
+
+# Coordinate of unused palette entries: far from every 5 bit color, yet finite for the distance algebra
+UNUSED = 1e4
+
+
+def to_555(rgb: np.ndarray, rounded: bool = False) -> np.ndarray:
+    """Reduce RGB888 components to the 5 bits of SNES colors, truncating or rounding (-d) them like gfx4snes."""
+
+    # gfx4snes first keeps 63 levels per component (the 6 bit VGA palette), then halves them, rounding up with -d
+    levels = rgb.astype(np.int32) >> 2
+
+    return np.minimum((levels + 1) >> 1, 31) if rounded else levels >> 1
+
+
+def pack_555(components: np.ndarray) -> np.ndarray:
+    """Pack (..., 3) 5 bit components into BGR555 codes."""
+
+    return components[..., 0] | components[..., 1] << 5 | components[..., 2] << 10
+
+
+def unpack_555(codes: np.ndarray) -> np.ndarray:
+    """Split BGR555 codes into (..., 3) 5 bit components."""
+
+    return np.stack([codes & 31, codes >> 5 & 31, codes >> 10 & 31], axis=-1)
+
+
+def _distances(points: np.ndarray, centers: np.ndarray) -> np.ndarray:
+    """Return the squared distances between (n, 3) points and (..., k, 3) centers as (n, ..., k)."""
+
+    flat = centers.reshape(-1, 3)
+
+    # |p - c|^2 = |p|^2 - 2 p.c + |c|^2, one matrix product instead of an (n, k, 3) difference array
+    distances = (points ** 2).sum(axis=1)[:, None] - 2 * points @ flat.T + (flat ** 2).sum(axis=1)[None]
+
+    return np.maximum(distances, 0).reshape(len(points), *centers.shape[:-1])
+
+
+def kmeans(points: np.ndarray, weights: np.ndarray, k: int, rng: np.random.Generator, iterations: int = 8) -> np.ndarray:
+    """Cluster weighted (n, 3) points into at most k centers (k-means++ seeding), returned as (k, 3) or fewer rows."""
+
+    if len(points) <= k:
+        return points.astype(np.float64)
+
+    points = points.astype(np.float64)
+    centers = [points[rng.choice(len(points), p=weights / weights.sum())]]
+    nearest = ((points - centers[0]) ** 2).sum(axis=1)
+
+    for _ in range(1, k):
+
+        spread = nearest * weights
+
+        if spread.sum() == 0:
+            break
+
+        centers.append(points[rng.choice(len(points), p=spread / spread.sum())])
+        nearest = np.minimum(nearest, ((points - centers[-1]) ** 2).sum(axis=1))
+
+    centers = np.array(centers)
+
+    for _ in range(iterations):
+
+        labels = _distances(points, centers).argmin(axis=1)
+        totals = np.bincount(labels, weights=weights, minlength=len(centers))
+
+        moved = np.stack([np.bincount(labels, weights=weights * points[:, axis], minlength=len(centers)) for axis in range(3)], axis=1)
+        used = totals > 0
+        moved[used] /= totals[used, None]
+        moved[~used] = centers[~used]
+
+        if np.allclose(moved, centers):
+            break
+
+        centers = moved
+
+    return centers
+
+
+class Quantizer:
+
+    def __init__(self, colors: int = 16, palettes: int = 1, rounded: bool = False, sort_colors: bool = False,
+                 transparent: tuple[int, int, int] | None = None, iterations: int = 4, seed: int = 0):
+        """Initialize a Quantizer reducing true color images to BGR555 sub-palettes of colors entries (color 0 transparent)."""
+
+        if colors not in (4, 16, 128, 256):
+            raise Exception("Number of colors must be one of (4, 16, 128, 256)")
+
+        self.colors = colors
+
+        # 8bpp tiles have a single palette
+        self.palettes = 1 if colors >= 128 else max(1, min(palettes, MAX_PALETTES))
+        self.rounded = rounded
+        self.sort_colors = sort_colors
+        self.transparent = transparent
+        self.iterations = iterations
+        self.seed = seed
+
+    def _palette(self, codes: np.ndarray, counts: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+        """Return up to colors - 1 BGR555 colors representing weighted codes, exactly when there are few enough of them."""
+
+        if len(codes) == 0:
+            return np.zeros((0, 3))
+
+        return kmeans(unpack_555(codes), counts.astype(np.float64), self.colors - 1, rng)
+
+    def _fit(self, groups: list[tuple[np.ndarray, np.ndarray]], rng: np.random.Generator) -> np.ndarray:
+        """Return a (palettes, colors - 1, 3) array of sub-palettes, one fitted to the weighted unique colors of each group."""
+
+        fitted = np.full((self.palettes, self.colors - 1, 3), UNUSED)
+
+        for number, (codes, counts) in enumerate(groups):
+
+            centers = self._palette(codes, counts, rng)
+            fitted[number, :len(centers)] = centers
+
+        return fitted
+
+    def quantize(self, rgba: np.ndarray, block_width: int = 8, block_height: int = 8) -> tuple[np.ndarray, np.ndarray, dict]:
+        """Quantize an (height, width, 3 or 4) image into color indexes and a (256, 3) RGB palette whose 5 bit values are exact.
+
+        Each block_width x block_height tile gets one sub-palette: index = palette * colors + color, color 0 being transparent.
+        """
+
+        start = time.perf_counter()
+        rng = np.random.default_rng(self.seed)
+        height, width = rgba.shape[:2]
+
+        if width % block_width or height % block_height:
+            raise Exception(f"Image size {width}x{height} is not a multiple of the {block_width}x{block_height} tile size")
+
+        opaque = rgba[..., 3] >= 128 if rgba.shape[2] == 4 else np.ones((height, width), dtype=bool)
+
+        if self.transparent is not None:
+            opaque &= (rgba[..., :3] != np.array(self.transparent, dtype=np.uint8)).any(axis=-1)
+
+        codes = pack_555(to_555(rgba[..., :3], self.rounded))
+
+        # (tiles, pixels per tile) views of the codes and opacity, tiles in row-major order
+        rows, cols = height // block_height, width // block_width
+        tile_codes = codes.reshape(rows, block_height, cols, block_width).swapaxes(1, 2).reshape(rows * cols, -1)
+        tile_opaque = opaque.reshape(rows, block_height, cols, block_width).swapaxes(1, 2).reshape(rows * cols, -1)
+
+        # Every opaque pixel as (tile, unique color) so palette errors are computed once per distinct color
+        pixel_tiles = np.nonzero(tile_opaque)[0]
+        unique, inverse, counts = np.unique(tile_codes[tile_opaque], return_inverse=True, return_counts=True)
+        inverse = inverse.ravel()
+        points = unpack_555(unique).astype(np.float64)
+        tiles = rows * cols
+
+        assignment = self._initial_assignment(points, inverse, pixel_tiles, tiles, rng)
+
+        for _ in range(self.iterations):
+
+            fitted = self._fit(self._groups(unique, inverse, pixel_tiles, assignment), rng)
+
+            # error[color, palette]: squared distance of each distinct color to the closest entry of each sub-palette
+            error = _distances(points, fitted).min(axis=2)
+
+            tile_error = np.stack([np.bincount(pixel_tiles, weights=error[inverse, number], minlength=tiles) for number in range(self.palettes)], axis=1)
+            reassigned = tile_error.argmin(axis=1)
+
+            if np.array_equal(reassigned, assignment):
+                break
+
+            assignment = reassigned
+
+        fitted = self._fit(self._groups(unique, inverse, pixel_tiles, assignment), rng)
+        unused = fitted[..., 0] == UNUSED
+        entries = np.clip(np.rint(fitted), 0, 31).astype(np.int32)
+        entries[unused] = 0
+
+        if self.sort_colors:
+
+            # --order-palettes: each sub-palette ordered from dark to bright, keeping its number in the map
+            order = np.argsort(np.where(unused, np.inf, entries @ np.array([2, 4, 1])), axis=1, kind="stable")
+            entries = np.take_along_axis(entries, order[..., None], axis=1)
+            unused = np.take_along_axis(unused, order, axis=1)
+
+        # Nearest entry of the tile's sub-palette for every opaque pixel, over distinct colors first
+        nearest = _distances(points, np.where(unused[..., None], UNUSED, entries.astype(np.float64))).argmin(axis=2)
+
+        indexes = np.zeros(tile_codes.shape, dtype=np.uint8)
+        indexes[tile_opaque] = assignment[pixel_tiles] * self.colors + 1 + nearest[inverse, assignment[pixel_tiles]]
+
+        # Transparent pixels take color 0 of the tile's sub-palette, so the tile's palette number stays readable
+        indexes[~tile_opaque] = (assignment[:, None] * self.colors).repeat(tile_codes.shape[1], axis=1)[~tile_opaque]
+
+        pixels = indexes.reshape(rows, cols, block_height, block_width).swapaxes(1, 2).reshape(height, width)
+
+        palette = np.zeros((256, 3), dtype=np.uint8)
+
+        for number in range(self.palettes):
+
+            palette[number * self.colors + 1:(number + 1) * self.colors] = entries[number] << 3
+
+        quantized = entries[assignment[pixel_tiles], nearest[inverse, assignment[pixel_tiles]]]
+
+        return pixels, palette, {
+            "tiles": tiles,
+            "distinct_colors": len(unique),
+            "palettes_used": len(np.unique(assignment)),
+            "mse": float(((quantized - points[inverse]) ** 2).sum(axis=1).mean()) if len(inverse) else 0.0,
+            "ms": (time.perf_counter() - start) * 1000
+        }
+
+    def _initial_assignment(self, points: np.ndarray, inverse: np.ndarray, pixel_tiles: np.ndarray, tiles: int, rng: np.random.Generator) -> np.ndarray:
+        """Group tiles by their mean color with k-means, as a starting point for the sub-palette assignment."""
+
+        if self.palettes == 1 or len(inverse) == 0:
+            return np.zeros(tiles, dtype=np.int64)
+
+        weight = np.bincount(pixel_tiles, minlength=tiles).astype(np.float64)
+        means = np.stack([np.bincount(pixel_tiles, weights=points[inverse, axis], minlength=tiles) for axis in range(3)], axis=1)
+        used = weight > 0
+        means[used] /= weight[used, None]
+
+        centers = kmeans(means[used], weight[used], self.palettes, rng)
+
+        assignment = np.zeros(tiles, dtype=np.int64)
+        assignment[used] = _distances(means[used], centers).argmin(axis=1)
+
+        return assignment
+
+    def _groups(self, unique: np.ndarray, inverse: np.ndarray, pixel_tiles: np.ndarray, assignment: np.ndarray) -> list[tuple[np.ndarray, np.ndarray]]:
+        """Return the distinct colors and their pixel counts of the tiles of each sub-palette."""
+
+        groups = []
+        pixel_palettes = assignment[pixel_tiles]
+
+        for number in range(self.palettes):
+
+            counts = np.bincount(inverse[pixel_palettes == number], minlength=len(unique))
+            present = counts > 0
+            groups.append((unique[present], counts[present]))
+
+        return groups
+
+
+def load_rgba(path: Path) -> np.ndarray:
+    """Load any image as an (height, width, 4) RGBA array."""
+
+    with Image.open(path) as image:
+
+        return np.asarray(image.convert("RGBA"))
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Quantize a true color image to BGR555 sub-palettes, one per tile, as an indexed PNG for gfx4snes.")
+    parser.add_argument("image", type=Path, help="true color PNG/BMP")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="indexed PNG to write (default: image_indexed.png)")
+    parser.add_argument("-u", dest="colors", type=int, default=16, help="number of colors per palette {4,[16],128,256}")
+    parser.add_argument("-p", "--palettes", type=int, default=1, help="number of sub-palettes {[1]..8}")
+    parser.add_argument("-s", dest="size", type=int, default=8, help="size of the tiles sharing one palette {[8],16,32,64}")
+    parser.add_argument("-d", dest="rounded", action="store_true", help="palette rounding instead of truncation")
+    parser.add_argument("--order-palettes", dest="sort", action="store_true", help="order every sub-palette from dark to bright")
+    parser.add_argument("-t", "--transparent", default=None, metavar="RRGGBB", help="color treated as transparent, besides the alpha channel")
+
+    cli = parser.parse_args()
+
+    quantizer = Quantizer(
+        cli.colors, cli.palettes, cli.rounded, cli.sort,
+        tuple(bytes.fromhex(cli.transparent)) if cli.transparent else None
+    )
+    pixels, palette, stats = quantizer.quantize(load_rgba(cli.image), cli.size, cli.size)
+
+    output = cli.output or cli.image.with_name(f"{cli.image.stem}_indexed.png")
+    image = Image.fromarray(pixels, mode="P")
+    image.putpalette(palette.tobytes())
+    image.save(output)
+
+    print(f"{output}: {stats['distinct_colors']} colors in {stats['tiles']} tiles -> {stats['palettes_used']} palettes, "
+          f"mean squared error {stats['mse']:.2f}, {stats['ms']:.0f} ms")
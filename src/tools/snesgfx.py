@@ -0,0 +1,484 @@
+from quantize import Quantizer, load_rgba, to_555
+from tileindex import TileIndex, FLIP_SHIFT
+import lzss
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import argparse
+
+# Bump whenever the files written for the same image and flags change, gfxbatch keys its cached outputs with it
+# (2: quantized true color images, 3: Mode 7, 4: LZ77 -z)
+CONVERTER_VERSION = 4
+
+# Colors per palette (-u) -> bits per pixel of the tiles
+COLOR_DEPTHS = {4: 2, 16: 4, 128: 8, 256: 8}
+
+BLOCK_SIZES = (8, 16, 32, 64)
+
+# Blocks larger than a tile are laid out 16 tiles per row, the VRAM layout of OBJ and 16x16 BG tiles (tile n+1 right, n+16 below)
+SHEET_WIDTH = 128
+
+# Map entry bits: vhopppcc cccccccc
+TILE_MASK = 0x03FF
+PRIORITY_BIT = 0x2000
+
+MAP_PAGE = 32
+
+# gfx4snes flags handled in-process, anything else (-a, modes 5 and 6) still needs gfx4snes.exe
+SUPPORTED_FLAGS = {"-i", "-t", "-s", "-W", "-H", "-u", "-o", "-p", "-m", "-y", "-e", "-f", "-g", "-b", "-R", "-k", "-d", "-M", "-q", "-z",
+                   "--interleaved", "--quantize", "--order-palettes", "--flips", "--shared"}
+SUPPORTED_MODES = {1, 7}
+
+# Mode 7 VRAM: 16K words, the 128x128 map in the low bytes and up to 256 8bpp tiles in the high bytes
+MODE7_MAP_SIZE = 128
+MODE7_TILES = 256
+MODE7_VRAM_WORDS = 0x4000
+
+
+def load_indexed(path: Path) -> tuple[np.ndarray, np.ndarray]:
+    """Load a PNG or BMP palette image as a (height, width) array of color indexes and its (256, 3) RGB palette."""
+
+    with Image.open(path) as image:
+
+        if image.mode not in ("P", "L"):
+            raise Exception(f"{path} is not an indexed (palette) image but {image.mode}, convert it to 256 colors first")
+
+        pixels = np.asarray(image, dtype=np.uint8)
+        palette = np.zeros((256, 3), dtype=np.uint8)
+
+        if image.mode == "P":
+
+            colors = np.frombuffer(bytes(image.getpalette() or []), dtype=np.uint8)[:768].reshape(-1, 3)
+            palette[:len(colors)] = colors
+
+        else:
+
+            palette[:] = np.arange(256, dtype=np.uint8)[:, None]
+
+    return pixels, palette
+
+
+def to_bgr555(palette: np.ndarray, rounded: bool = False) -> np.ndarray:
+    """Convert (n, 3) RGB888 colors to SNES BGR555 words, truncating or rounding (-d) each component to 5 bits."""
+
+    rgb = to_555(palette, rounded)
+
+    return rgb[:, 0] | rgb[:, 1] << 5 | rgb[:, 2] << 10
+
+
+def split_blocks(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Cut an image into (count, height, width) blocks in row-major order."""
+
+    rows, cols = pixels.shape[0] // height, pixels.shape[1] // width
+
+    return pixels.reshape(rows, height, cols, width).swapaxes(1, 2).reshape(-1, height, width)
+
+
+def encode_planar(tiles: np.ndarray, bpp: int) -> np.ndarray:
+    """Encode (count, 8, 8) tiles as SNES planar data: bitplane pairs, each as 8 rows of two interleaved bytes."""
+
+    # planes[p] is (count, 8) bytes of bitplane p, leftmost pixel in bit 7
+    planes = np.packbits((tiles[None] >> np.arange(bpp, dtype=np.uint8)[:, None, None, None]) & 1, axis=-1)[..., 0]
+
+    # (pair, plane of the pair, count, row) -> (count, pair, row, plane of the pair)
+    return planes.reshape(bpp // 2, 2, *planes.shape[1:]).transpose(2, 0, 3, 1).reshape(len(tiles), bpp * 8)
+
+
+def encode_packed(tiles: np.ndarray) -> np.ndarray:
+    """Encode (count, 8, 8) tiles as packed pixels, one byte per pixel."""
+
+    return tiles.reshape(len(tiles), 64)
+
+
+def sheet_tile_numbers(numbers: np.ndarray, width: int, height: int) -> np.ndarray:
+    """Return the number of the top-left 8x8 tile of each width x height block in the 128 pixel wide VRAM sheet."""
+
+    if width == height == 8:
+        return numbers
+
+    per_row = SHEET_WIDTH // width
+
+    return (numbers // per_row) * (height // 8) * (SHEET_WIDTH // 8) + (numbers % per_row) * (width // 8)
+
+
+def arrange_sheet(blocks: np.ndarray) -> np.ndarray:
+    """Lay blocks out in the 128 pixel wide VRAM sheet and return its 8x8 tiles."""
+
+    count, height, width = blocks.shape
+
+    if width == height == 8:
+        return blocks
+
+    per_row = SHEET_WIDTH // width
+    rows = -(-count // per_row)
+
+    padded = np.zeros((rows * per_row, height, width), dtype=blocks.dtype)
+    padded[:count] = blocks
+
+    sheet = padded.reshape(rows, per_row, height, width).swapaxes(1, 2).reshape(rows * height, SHEET_WIDTH)
+
+    return split_blocks(sheet, 8, 8)
+
+
+def supports(args: list[str]) -> bool:
+    """Tell whether the built-in converter handles these gfx4snes flags, or gfx4snes.exe is still needed."""
+
+    if not {arg for arg in args if arg.startswith('-')} <= SUPPORTED_FLAGS:
+        return False
+
+    if "-M" not in args:
+        return True
+
+    value = args[args.index("-M") + 1] if args.index("-M") + 1 < len(args) else ""
+
+    return value.isdigit() and int(value) in SUPPORTED_MODES
+
+
+def page_map(entries: np.ndarray) -> np.ndarray:
+    """Reorder a (rows, cols) map into 32x32 pages, left to right then top to bottom, as the BG screen sizes expect."""
+
+    rows, cols = entries.shape
+    page_rows, page_cols = -(-rows // MAP_PAGE), -(-cols // MAP_PAGE)
+
+    padded = np.zeros((page_rows * MAP_PAGE, page_cols * MAP_PAGE), dtype=entries.dtype)
+    padded[:rows, :cols] = entries
+
+    return padded.reshape(page_rows, MAP_PAGE, page_cols, MAP_PAGE).swapaxes(1, 2).reshape(-1, MAP_PAGE, MAP_PAGE)
+
+
+class Gfx4Snes:
+
+    def __init__(self, block_width: int = 8, block_height: int = 8, colors: int = 256, output_colors: int | None = None,
+                 palette: bool = False, tilemap: bool = False, map_pages: bool = False, palette_entry: int = 0,
+                 tile_offset: int = 0, priority: bool = False, blank_tile: bool = False, reduce: bool = True,
+                 packed: bool = False, rounded: bool = False, flips: bool = False, quantize: bool = False,
+                 sort_colors: bool = False, mode: int = 1, interleaved: bool = False, compressed: bool = False):
+        """Initialize a Gfx4Snes converter with the options of gfx4snes (see from_args for the flags)."""
+
+        if block_width not in BLOCK_SIZES or block_height not in BLOCK_SIZES:
+            raise Exception(f"Block sizes must be one of {BLOCK_SIZES}")
+
+        if mode not in SUPPORTED_MODES:
+            raise Exception(f"Mode {mode} is not supported by the built-in converter")
+
+        # Mode 7 tiles are always 8bpp
+        if mode == 7:
+            colors = 256
+
+        if colors not in COLOR_DEPTHS:
+            raise Exception(f"Number of colors must be one of {tuple(COLOR_DEPTHS)}")
+
+        if not 0 <= palette_entry <= 7:
+            raise Exception("Palette entry must be between 0 and 7")
+
+        self.block_width = block_width
+        self.block_height = block_height
+        self.colors = colors
+        self.bpp = COLOR_DEPTHS[colors]
+        self.output_colors = colors if output_colors is None else output_colors
+        self.palette = palette
+        self.tilemap = tilemap
+        self.map_pages = map_pages
+        self.palette_entry = palette_entry
+        self.tile_offset = tile_offset
+        self.priority = priority
+        self.blank_tile = blank_tile
+        self.reduce = reduce
+        self.packed = packed
+        self.rounded = rounded
+
+        # Also reduce tiles that are mirrors of another one, using the map's flip bits (gfx4snes only merges identical tiles)
+        self.flips = flips
+
+        # True color images are always quantized, --quantize also requantizes palette images; --order-palettes orders the quantized palettes
+        self.quantize = quantize
+        self.sort_colors = sort_colors
+
+        self.mode = mode
+
+        # Mode 7 only: also write the map and tiles interleaved as one VRAM image (.vr7), loadable with a single DMA
+        self.interleaved = interleaved
+
+        # -z: .pic data LZ77 compressed for bgInitTileSetLz / LzssDecodeVram
+        self.compressed = compressed
+
+    @classmethod
+    def from_args(cls, args: list[str]) -> tuple["Gfx4Snes", Path | None]:
+        """Create a converter from gfx4snes command line flags and return it with the -i input file."""
+
+        cli = build_parser().parse_args(args)
+
+        return cls.from_namespace(cli), cli.input
+
+    @classmethod
+    def from_namespace(cls, cli: argparse.Namespace) -> "Gfx4Snes":
+        """Create a converter from parsed gfx4snes flags."""
+
+        return cls(
+            block_width=cli.width or cli.size,
+            block_height=cli.height or cli.size,
+            colors=cli.colors,
+            output_colors=cli.output_colors,
+            palette=cli.palette,
+            tilemap=cli.map,
+            map_pages=cli.pages,
+            palette_entry=cli.entry,
+            tile_offset=cli.offset,
+            priority=cli.priority,
+            blank_tile=cli.blank,
+            reduce=not cli.no_reduction,
+            packed=cli.packed,
+            rounded=cli.rounded,
+            flips=cli.flips,
+            quantize=cli.quantize,
+            sort_colors=cli.sort_colors,
+            mode=cli.mode,
+            interleaved=cli.interleaved,
+            compressed=cli.compressed
+        )
+
+    def convert(self, pixels: np.ndarray, palette: np.ndarray, index: TileIndex | None = None) -> dict[str, bytes]:
+        """Convert an indexed image and its RGB palette into the .pic and, if asked, .pal and .map data.
+
+        With a shared index the tiles are added to it and no .pic is returned: encode its tileset once every image is in.
+        """
+
+        height, width = pixels.shape
+
+        if width % self.block_width or height % self.block_height:
+            raise Exception(f"Image size {width}x{height} is not a multiple of the {self.block_width}x{self.block_height} block size")
+
+        if index is not None and not self.reduce:
+            raise Exception("A shared tileset needs tile reduction")
+
+        if self.mode == 7:
+            return self.convert_mode7(pixels, palette)
+
+        blocks = split_blocks(pixels, self.block_width, self.block_height)
+        blank = np.zeros((1, self.block_height, self.block_width), dtype=blocks.dtype)
+
+        if self.bpp < 8:
+
+            # Every tile uses one sub-palette: the high bits of its colors give the palette number, the low bits the pixels
+            palettes = blocks.reshape(len(blocks), -1).max(axis=1) >> self.bpp
+            blocks = blocks & ((1 << self.bpp) - 1)
+
+        else:
+
+            palettes = np.zeros(len(blocks), dtype=np.uint8)
+
+        result = {}
+
+        if self.reduce:
+
+            tiles = index if index is not None else TileIndex(self.flips)
+
+            if self.blank_tile and not len(tiles):
+                tiles.add(blank)
+
+            numbers, flips = tiles.add(blocks)
+
+            if index is None:
+                result["pic"] = self.encode(tiles.tileset())
+
+        else:
+
+            numbers, flips = np.arange(len(blocks)) + int(self.blank_tile), np.zeros(len(blocks), dtype=np.int64)
+            result["pic"] = self.encode(np.concatenate([blank, blocks]) if self.blank_tile else blocks)
+
+        if self.palette:
+            result["pal"] = self.palette_data(palette)
+
+        if self.tilemap:
+
+            entries = (sheet_tile_numbers(numbers, self.block_width, self.block_height) + self.tile_offset) & TILE_MASK
+            entries |= ((palettes.astype(np.int64) + self.palette_entry) & 7) << 10
+            entries |= flips << FLIP_SHIFT
+
+            if self.priority:
+                entries |= PRIORITY_BIT
+
+            entries = entries.reshape(height // self.block_height, width // self.block_width)
+
+            if self.map_pages:
+                entries = page_map(entries)
+
+            result["map"] = entries.astype('<u2').tobytes()
+
+        return result
+
+    def convert_mode7(self, pixels: np.ndarray, palette: np.ndarray) -> dict[str, bytes]:
+        """Convert an image of up to 1024x1024 pixels into Mode 7 tiles (.pc7), 128x128 byte map (.mp7) and palette."""
+
+        height, width = pixels.shape
+
+        if width % 8 or height % 8 or width > MODE7_MAP_SIZE * 8 or height > MODE7_MAP_SIZE * 8:
+            raise Exception(f"Mode 7 images must be at most 1024x1024 pixels in whole tiles, not {width}x{height}")
+
+        blocks = split_blocks(pixels, 8, 8)
+
+        # Mode 7 maps have no flip bits, only identical tiles can be merged
+        index = TileIndex(flips=False)
+
+        if self.blank_tile:
+            index.add(np.zeros((1, 8, 8), dtype=blocks.dtype))
+
+        if self.reduce:
+
+            numbers, _ = index.add(blocks)
+            tiles = index.tileset()
+
+        else:
+
+            numbers = np.arange(len(blocks)) + int(self.blank_tile)
+            tiles = np.concatenate([index.tileset(), blocks])
+
+        if len(tiles) > MODE7_TILES:
+            raise Exception(f"{len(tiles)} different tiles, Mode 7 only has room for {MODE7_TILES}")
+
+        # Parts of the 128x128 map outside the image point at tile 0
+        tilemap = np.zeros((MODE7_MAP_SIZE, MODE7_MAP_SIZE), dtype=np.uint8)
+        tilemap[:height // 8, :width // 8] = numbers.reshape(height // 8, width // 8)
+
+        pattern = encode_packed(tiles).ravel()
+        result = {"pc7": pattern.tobytes(), "mp7": tilemap.tobytes()}
+
+        if self.palette:
+            result["pal"] = self.palette_data(palette)
+
+        if self.interleaved:
+
+            vram = np.zeros((MODE7_VRAM_WORDS, 2), dtype=np.uint8)
+            vram[:, 0] = tilemap.ravel()
+            vram[:len(pattern), 1] = pattern
+            result["vr7"] = vram.tobytes()
+
+        return result
+
+    def palette_data(self, palette: np.ndarray) -> bytes:
+        """Return the first -o colors of a palette as BGR555 .pal data."""
+
+        colors = np.zeros((max(self.output_colors, 0), 3), dtype=np.uint8)
+        colors[:min(len(colors), 256)] = palette[:len(colors)]
+
+        return to_bgr555(colors, self.rounded).astype('<u2').tobytes()
+
+    def load(self, input_path: Path) -> tuple[np.ndarray, np.ndarray]:
+        """Load an image as color indexes and palette: palette images as they are, true color ones through the quantizer."""
+
+        with Image.open(input_path) as image:
+
+            indexed = image.mode in ("P", "L")
+
+        if indexed and not self.quantize:
+            return load_indexed(input_path)
+
+        # -o colors hold the sub-palettes, e.g. -u 16 -o 128 lets the quantizer use all 8 of them
+        quantizer = Quantizer(self.colors, max(1, self.output_colors // self.colors), self.rounded, self.sort_colors)
+        pixels, palette, _ = quantizer.quantize(load_rgba(input_path), self.block_width, self.block_height)
+
+        return pixels, palette
+
+    def encode(self, blocks: np.ndarray) -> bytes:
+        """Encode blocks as .pic data, laid out in the VRAM sheet."""
+
+        tiles = arrange_sheet(blocks)
+        data = (encode_packed(tiles) if self.packed else encode_planar(tiles, self.bpp)).tobytes()
+
+        return lzss.compress(data) if self.compressed else data
+
+    def convert_file(self, input_path: Path, output_base: Path | None = None) -> dict[str, Path]:
+        """Convert an image file and write filename.pic/.pal/.map next to it (or to output_base), returning the written files."""
+
+        input_path = Path(input_path)
+        output_base = Path(output_base) if output_base else input_path.with_suffix('')
+
+        written = {}
+
+        for kind, data in self.convert(*self.load(input_path)).items():
+
+            path = output_base.with_name(f"{output_base.name}.{kind}")
+            path.write_bytes(data)
+            written[kind] = path
+
+        return written
+
+    def convert_shared(self, input_paths: list[Path], tileset_base: Path) -> dict[str, Path]:
+        """Convert images into one shared tileset (tileset_base.pic) and a .pal/.map per image, like -f offsets without the bookkeeping."""
+
+        index = TileIndex(self.flips)
+        written = {}
+
+        for input_path in map(Path, input_paths):
+
+            for kind, data in self.convert(*self.load(input_path), index=index).items():
+
+                path = input_path.with_suffix(f".{kind}")
+                path.write_bytes(data)
+                written[f"{input_path.name}:{kind}"] = path
+
+        tileset_base = Path(tileset_base)
+        written["pic"] = tileset_base.with_name(f"{tileset_base.name}.pic")
+        written["pic"].write_bytes(self.encode(index.tileset()))
+
+        return written
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """Return the parser of the gfx4snes flags the built-in converter supports."""
+
+    parser = argparse.ArgumentParser(description="Convert PNG/BMP palette images to SNES .pic, .pal and .map files (gfx4snes compatible).")
+    parser.add_argument("-i", dest="input", type=Path, default=None, help="input image")
+    parser.add_argument("-t", dest="type", default=None, help="input type (png or bmp), read from the file itself")
+    parser.add_argument("-s", dest="size", type=int, default=8, help="size of image blocks in pixels {[8],16,32,64}")
+    parser.add_argument("-W", dest="width", type=int, default=None, help="width of image block in pixels")
+    parser.add_argument("-H", dest="height", type=int, default=None, help="height of image block in pixels")
+    parser.add_argument("-u", dest="colors", type=int, default=256, help="number of colors to use {4,16,128,[256]}")
+    parser.add_argument("-o", dest="output_colors", type=int, default=None, help="number of colors to output to filename.pal {0..256}")
+    parser.add_argument("-p", dest="palette", action="store_true", help="include palette for output")
+    parser.add_argument("-m", dest="map", action="store_true", help="include map for output")
+    parser.add_argument("-y", dest="pages", action="store_true", help="generate map in pages of 32x32 (good for scrolling)")
+    parser.add_argument("-e", dest="entry", type=int, default=0, help="palette entry to add to map tiles {0..7}")
+    parser.add_argument("-f", dest="offset", type=int, default=0, help="offset added to the tile numbers of the map {0..2047}")
+    parser.add_argument("-g", dest="priority", action="store_true", help="include high priority bit in map")
+    parser.add_argument("-b", dest="blank", action="store_true", help="add blank tile management (for multiple bgs)")
+    parser.add_argument("-R", dest="no_reduction", action="store_true", help="no tile reduction (not advised)")
+    parser.add_argument("-k", dest="packed", action="store_true", help="output in packed pixel format")
+    parser.add_argument("-z", dest="compressed", action="store_true", help="output in lz77 compressed pixel format")
+    parser.add_argument("-d", dest="rounded", action="store_true", help="palette rounding (to a maximum value of 63)")
+    parser.add_argument("-M", dest="mode", type=int, default=1, help="convert the whole picture for mode {[1],7}")
+    parser.add_argument("--interleaved", action="store_true", help="mode 7: also write map and tiles interleaved as one 32 KiB VRAM image (.vr7)")
+    parser.add_argument("-q", dest="quiet", action="store_true", help="quiet mode")
+
+    # gfx4snes -a (rearrange the palette, keeping the tilemap's palette numbers) is not supported, gfx-tools runs gfx4snes.exe for it
+    parser.add_argument("--quantize", dest="quantize", action="store_true", help="quantize palette images too (true color ones always are), -o colors giving the sub-palettes")
+    parser.add_argument("--order-palettes", dest="sort_colors", action="store_true", help="order the quantized sub-palettes from dark to bright")
+    parser.add_argument("--flips", action="store_true", help="also reduce tiles that are flipped copies of another one (map flip bits)")
+    parser.add_argument("--shared", type=Path, default=None, metavar="NAME", help="write one tileset NAME.pic for all the input images")
+    parser.add_argument("files", nargs="*", type=Path, help="more input images, converted with the same options")
+
+    return parser
+
+
+if __name__ == "__main__":
+
+    cli = build_parser().parse_args()
+
+    converter = Gfx4Snes.from_namespace(cli)
+    images = ([cli.input] if cli.input else []) + cli.files
+
+    if cli.shared:
+
+        written = converter.convert_shared(images, cli.shared)
+
+        if not cli.quiet:
+            print(f"{len(images)} images: " + ", ".join(path.name for path in written.values()))
+
+    else:
+
+        for image in images:
+
+            written = converter.convert_file(image)
+
+            if not cli.quiet:
+                print(f"{image}: " + ", ".join(path.name for path in written.values()))
@@ -0,0 +1,379 @@
+from snesgfx import build_parser, COLOR_DEPTHS, SHEET_WIDTH, MAP_PAGE, MODE7_MAP_SIZE
+from gfxbatch import GfxBatch, GfxCache, default_cache_dir, file_digest, MANIFEST_NAME
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import argparse
+import hashlib
+import shlex
+import time
+import lzss
+import io
+
+# Bump when the rendering changes, so older cached previews are not reused
+PREVIEW_VERSION = 2
+
+THUMBNAIL_SIZE = 256
+
+# Map entry bits: vhopppcc cccccccc
+TILE_MASK = 0x03FF
+FLIP_H = 0x4000
+FLIP_V = 0x8000
+
+
+def default_preview_dir() -> Path:
+    """Return the per-user preview cache directory, next to the converted graphics cache."""
+
+    return default_cache_dir().parent / 'previews'
+
+
+def decode_planar(data: bytes, bpp: int) -> np.ndarray:
+    """Decode SNES planar data into (count, 8, 8) color indexes (the inverse of snesgfx.encode_planar)."""
+
+    size = bpp * 8
+    raw = np.frombuffer(data[:len(data) // size * size], dtype=np.uint8)
+
+    # (count, pair, row, plane of the pair) -> (count, plane, row), then one bit per pixel, leftmost in bit 7
+    planes = raw.reshape(-1, bpp // 2, 8, 2).transpose(0, 1, 3, 2).reshape(-1, bpp, 8)
+    bits = np.unpackbits(planes[..., None], axis=-1)
+
+    return (bits << np.arange(bpp, dtype=np.uint8)[None, :, None, None]).sum(axis=1, dtype=np.uint8)
+
+
+def decode_palette(data: bytes) -> np.ndarray:
+    """Decode BGR555 .pal data into (count, 3) RGB888 colors, spreading 5 bits over 8."""
+
+    words = np.frombuffer(data[:len(data) // 2 * 2], dtype='<u2').astype(np.uint16)
+    rgb = np.stack([words & 31, words >> 5 & 31, words >> 10 & 31], axis=1).astype(np.uint8)
+
+    return rgb << 3 | rgb >> 2
+
+
+def tile_sheet(tiles: np.ndarray) -> np.ndarray:
+    """Lay (count, 8, 8) tiles out as the 128 pixel wide VRAM sheet, 16 tiles per row."""
+
+    per_row = SHEET_WIDTH // 8
+    rows = max(-(-len(tiles) // per_row), 1)
+
+    padded = np.zeros((rows * per_row, 8, 8), dtype=np.uint8)
+    padded[:len(tiles)] = tiles
+
+    return padded.reshape(rows, per_row, 8, 8).swapaxes(1, 2).reshape(rows * 8, SHEET_WIDTH)
+
+
+def unpage_map(entries: np.ndarray, cols: int) -> np.ndarray:
+    """Undo snesgfx.page_map: 32x32 pages, left to right then top to bottom, back into rows of cols entries."""
+
+    page_cols = -(-cols // MAP_PAGE)
+    pages = entries[:len(entries) // (MAP_PAGE * MAP_PAGE) * MAP_PAGE * MAP_PAGE].reshape(-1, MAP_PAGE, MAP_PAGE)
+    page_rows = len(pages) // page_cols
+
+    return pages[:page_rows * page_cols].reshape(page_rows, page_cols, MAP_PAGE, MAP_PAGE).swapaxes(1, 2).reshape(page_rows * MAP_PAGE, -1)
+
+
+def render_map(sheet: np.ndarray, entries: np.ndarray, bpp: int, block_width: int = 8, block_height: int = 8, tile_offset: int = 0,
+               palette_entry: int = 0) -> np.ndarray:
+    """Render (rows, cols) map entries into palette indexes: every block taken from the sheet, flipped and moved to its palette.
+
+    Color 0 of every palette is transparent, so it shows the backdrop (index 0). -f and -e offsets are taken back out.
+    """
+
+    rows, cols = entries.shape
+    entries = entries.astype(np.int64).ravel()
+    numbers = ((entries & TILE_MASK) - tile_offset) % (TILE_MASK + 1)
+
+    # The block of an entry starts at its tile in the sheet; out of range tiles read the padding (color 0)
+    padded = np.zeros((sheet.shape[0] + (TILE_MASK + 1) // 16 * 8 + block_height, SHEET_WIDTH + block_width), dtype=np.uint8)
+    padded[:sheet.shape[0], :SHEET_WIDTH] = sheet
+
+    ys = (numbers // 16 * 8)[:, None] + np.arange(block_height)
+    xs = (numbers % 16 * 8)[:, None] + np.arange(block_width)
+    blocks = padded[ys[:, :, None], xs[:, None, :]]
+
+    flip_h, flip_v = (entries & FLIP_H) != 0, (entries & FLIP_V) != 0
+    blocks = np.where(flip_h[:, None, None], blocks[:, :, ::-1], blocks)
+    blocks = np.where(flip_v[:, None, None], blocks[:, ::-1, :], blocks)
+
+    indexes = blocks.astype(np.int64)
+
+    if bpp < 8:
+        indexes += np.where(blocks != 0, ((entries >> 10) - palette_entry & 7)[:, None, None] << bpp, 0)
+
+    return indexes.reshape(rows, cols, block_height, block_width).swapaxes(1, 2).reshape(rows * block_height, cols * block_width)
+
+
+def looks_compressed(data: bytes) -> bool:
+    """Tell whether .pic data is a -z LZ77 stream: its header, and a whole number of tiles that decodes from it."""
+
+    if len(data) < 4 or data[0] != lzss.LZ77_TYPE or data[3] != 0:
+        return False
+
+    size = data[1] | data[2] << 8
+
+    # Planar tiles are at least 16 bytes; raw tiles starting with 0x10 rarely decode to exactly that many bytes
+    if size == 0 or size % 16:
+        return False
+
+    try:
+
+        return len(lzss.decompress(data)) == size
+
+    except (Exception, IndexError):
+
+        return False
+
+
+def nearest_manifest(path: Path) -> Path | None:
+    """Return the gfx.json of the closest directory above a file, if any."""
+
+    for directory in Path(path).absolute().parents:
+
+        if (directory / MANIFEST_NAME).is_file():
+            return directory
+
+    return None
+
+
+class Previewer:
+
+    def __init__(self, cache: GfxCache | None = None, size: int = THUMBNAIL_SIZE):
+        """Initialize a Previewer rendering .pic/.pal/.map (and Mode 7 .pc7/.mp7) files as PNG, at most size pixels a side."""
+
+        self.cache = cache
+        self.size = size
+
+        # Manifests by graphics directory, read once per directory preview
+        self._batches: dict[Path, GfxBatch] = {}
+
+    def options(self, pic: Path, args: list[str] | None = None) -> argparse.Namespace:
+        """Return the gfx4snes options the file was converted with: args if given, else its gfx.json rule, else the defaults."""
+
+        res_dir = nearest_manifest(pic) if args is None else None
+        args = list(args or [])
+
+        if res_dir is not None:
+
+            if res_dir not in self._batches:
+                self._batches[res_dir] = GfxBatch(res_dir)
+
+            source = next((pic.with_suffix(suffix) for suffix in ('.png', '.bmp') if pic.with_suffix(suffix).is_file()), pic.with_suffix('.png'))
+            args = shlex.split(self._batches[res_dir].options(source.absolute().relative_to(res_dir).as_posix()) or "")
+
+        # gfx4snes.exe takes flags the built-in converter doesn't, they don't change how the output is read
+        options = build_parser().parse_known_args(args)[0]
+
+        # Without -u the depth is guessed from the palette
+        if "-u" not in args:
+            options.colors = None
+
+        return options
+
+    def render(self, pic: Path, options: argparse.Namespace | None = None) -> np.ndarray:
+        """Render a converted image back to (height, width, 3) RGB, as the SNES shows it (color 0 is the backdrop)."""
+
+        pic = Path(pic)
+        options = options or self.options(pic)
+        pal = pic.with_suffix('.pal')
+        palette = decode_palette(pal.read_bytes()) if pal.is_file() else None
+
+        if pic.suffix.lower() == '.pc7':
+            indexes = self.render_mode7(pic)
+
+        else:
+            indexes = self.render_tiles(pic, options, palette)
+
+        # Maps are padded to whole blocks, 32x32 pages or the 128x128 Mode 7 map: show the source image's area
+        size = self.source_size(pic)
+
+        if size and (pic.with_suffix('.map').is_file() or pic.with_suffix('.mp7').is_file()):
+            indexes = indexes[:size[1], :size[0]]
+
+        if palette is None:
+
+            # Without a palette the indexes are shown as grays
+            palette = np.repeat(np.linspace(0, 255, max(int(indexes.max()) + 1, 2)).astype(np.uint8)[:, None], 3, axis=1)
+
+        colors = np.zeros((256, 3), dtype=np.uint8)
+        colors[:min(len(palette), 256)] = palette[:256]
+
+        return colors[np.minimum(indexes, 255)]
+
+    def render_mode7(self, pic: Path) -> np.ndarray:
+        """Render Mode 7 packed tiles (.pc7) through their 128x128 map (.mp7), or as a tile sheet without one."""
+
+        data = pic.read_bytes()
+        tiles = np.frombuffer(data[:len(data) // 64 * 64], dtype=np.uint8).reshape(-1, 8, 8)
+        tilemap = pic.with_suffix('.mp7')
+
+        if not tilemap.is_file():
+            return tile_sheet(tiles)
+
+        numbers = np.frombuffer(tilemap.read_bytes()[:MODE7_MAP_SIZE * MODE7_MAP_SIZE], dtype=np.uint8).astype(np.int64)
+        padded = np.zeros((256, 8, 8), dtype=np.uint8)
+        padded[:min(len(tiles), 256)] = tiles[:256]
+
+        side = int(np.sqrt(len(numbers)))
+
+        return padded[numbers[:side * side]].reshape(side, side, 8, 8).swapaxes(1, 2).reshape(side * 8, side * 8)
+
+    def render_tiles(self, pic: Path, options: argparse.Namespace, palette: np.ndarray | None) -> np.ndarray:
+        """Render planar (or -k packed) tiles through their .map, or as the tile sheet without one."""
+
+        data = pic.read_bytes()
+
+        if options.compressed or looks_compressed(data):
+            data = lzss.decompress(data)
+
+        bpp = self.bpp(options, palette)
+        tiles = np.frombuffer(data[:len(data) // 64 * 64], dtype=np.uint8).reshape(-1, 8, 8) if options.packed else decode_planar(data, bpp)
+        sheet = tile_sheet(tiles)
+
+        tilemap = pic.with_suffix('.map')
+
+        if not tilemap.is_file():
+            return sheet
+
+        entries = np.frombuffer(tilemap.read_bytes()[:tilemap.stat().st_size // 2 * 2], dtype='<u2')
+        block_width, block_height = options.width or options.size, options.height or options.size
+        cols = self.map_columns(pic, block_width, len(entries))
+
+        if options.pages:
+            entries = unpage_map(entries, cols)
+
+        else:
+
+            # A last partial row (a map narrower than guessed) is still drawn
+            entries = np.concatenate([entries, np.zeros(-len(entries) % cols, dtype=entries.dtype)]).reshape(-1, cols)
+
+        return render_map(sheet, entries, bpp, block_width, block_height, options.offset, options.entry)
+
+    @staticmethod
+    def bpp(options: argparse.Namespace, palette: np.ndarray | None) -> int:
+        """Return the bits per pixel: -u when the manifest gives it, else guessed from the palette size."""
+
+        if options.colors:
+            return COLOR_DEPTHS[options.colors]
+
+        if palette is None:
+            return 4
+
+        # 4 colors are 2bpp, up to 8 sub-palettes of 16 colors 4bpp, a full palette 8bpp
+        return 2 if len(palette) <= 4 else 4 if len(palette) <= 128 else 8
+
+    @staticmethod
+    def source_size(pic: Path) -> tuple[int, int] | None:
+        """Return the width and height of the image a file was converted from, if it is next to it (only its header is read)."""
+
+        for suffix in ('.png', '.bmp'):
+
+            source = pic.with_suffix(suffix)
+
+            if source.is_file():
+
+                with Image.open(source) as image:
+
+                    return image.size
+
+        return None
+
+    def map_columns(self, pic: Path, block_width: int, entries: int) -> int:
+        """Return the map's width in entries, from the source image, else a 32 entry wide screen."""
+
+        size = self.source_size(pic)
+
+        return max(size[0] // block_width, 1) if size else min(MAP_PAGE, max(entries, 1))
+
+    def key(self, pic: Path, options: argparse.Namespace) -> str:
+        """Return the cache key of a preview: the content of every file it is rendered from, the options, source size and preview size."""
+
+        parts = [str(PREVIEW_VERSION), str(self.size), repr(sorted(vars(options).items(), key=lambda item: item[0])), repr(self.source_size(pic))]
+
+        for path in (pic, pic.with_suffix('.pal'), pic.with_suffix('.map'), pic.with_suffix('.mp7')):
+            parts.append(file_digest(path) if path.is_file() else "-")
+
+        return hashlib.sha256("\0".join(parts).encode()).hexdigest()
+
+    def preview(self, pic: Path, args: list[str] | None = None) -> tuple[bytes, bool]:
+        """Return the PNG preview of a converted image (converted with args, if given) and whether it came from the cache."""
+
+        pic = Path(pic)
+        options = self.options(pic, args)
+        key = self.key(pic, options)
+
+        cached = self.cache.fetch(key) if self.cache else None
+
+        if cached is not None and "png" in cached:
+            return cached["png"], True
+
+        image = Image.fromarray(self.render(pic, options), "RGB")
+        image.thumbnail((self.size, self.size), Image.NEAREST)
+
+        buffer = io.BytesIO()
+        image.save(buffer, "PNG")
+        png = buffer.getvalue()
+
+        if self.cache:
+            self.cache.store(key, {"png": png})
+
+        return png, False
+
+    def preview_directory(self, directory: Path) -> list[dict]:
+        """Preview every .pic and .pc7 of a directory tree, returning the PNG, status and timing of each."""
+
+        previews = []
+
+        for pic in sorted(path for path in Path(directory).rglob('*') if path.suffix.lower() in ('.pic', '.pc7') and path.is_file()):
+
+            start = time.perf_counter()
+
+            try:
+
+                png, cached = self.preview(pic)
+
+            except Exception as e:
+
+                previews.append({"asset": str(pic), "status": "failed", "error": str(e), "ms": (time.perf_counter() - start) * 1000})
+                continue
+
+            previews.append({"asset": str(pic), "status": "cached" if cached else "rendered", "png": png, "ms": (time.perf_counter() - start) * 1000})
+
+        return previews
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Render converted .pic/.pal/.map (and Mode 7 .pc7/.mp7) files back to PNG previews.")
+    parser.add_argument("paths", type=Path, nargs="+", help=".pic/.pc7 files or directories to preview")
+    parser.add_argument("-o", "--output-dir", type=Path, required=True, help="directory the <name>.preview.png files are written to")
+    parser.add_argument("-s", "--size", type=int, default=THUMBNAIL_SIZE, help=f"largest side of the previews in pixels (default: {THUMBNAIL_SIZE})")
+    parser.add_argument("--no-cache", action="store_true", help="render everything again, without the preview cache")
+
+    cli = parser.parse_args()
+
+    start = time.perf_counter()
+    previewer = Previewer(None if cli.no_cache else GfxCache(default_preview_dir()), cli.size)
+    previews = []
+
+    for path in cli.paths:
+
+        if path.is_dir():
+            previews += previewer.preview_directory(path)
+
+        else:
+            png, cached = previewer.preview(path)
+            previews.append({"asset": str(path), "status": "cached" if cached else "rendered", "png": png, "ms": 0.0})
+
+    cli.output_dir.mkdir(parents=True, exist_ok=True)
+
+    for preview in previews:
+
+        if "png" in preview:
+            (cli.output_dir / f"{Path(preview['asset']).stem}.preview.png").write_bytes(preview["png"])
+
+        else:
+            print(f"FAILED {preview['asset']}: {preview['error']}")
+
+    rendered = sum(preview["status"] == "rendered" for preview in previews)
+    cached = sum(preview["status"] == "cached" for preview in previews)
+
+    print(f"{len(previews)} previews: {rendered} rendered, {cached} from cache, in {time.perf_counter() - start:.2f}s")
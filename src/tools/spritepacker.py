@@ -0,0 +1,297 @@
+from snesgfx import Gfx4Snes, split_blocks
+from tileindex import TileIndex
+from pathlib import Path
+import numpy as np
+import argparse
+
+# OBJSEL sizes the dynamic sprite engine supports (oamInitDynamicSprite: "64pix size is not supported") -> (small, large)
+OAM_SIZES = {
+    "OBJ_SIZE8_L16": (8, 16),
+    "OBJ_SIZE8_L32": (8, 32),
+    "OBJ_SIZE16_L32": (16, 32)
+}
+
+# metsprtype of t_metasprites
+SPRITE_TYPES = {32: "OBJ_SPRITE32", 16: "OBJ_SPRITE16", 8: "OBJ_SPRITE8"}
+
+# Frames the engine's lookup tables (lkup32oamS, lkup16oamS, lkup8oamS) can address in one graphics file
+MAX_FRAMES = {32: 64, 16: 128, 8: 128}
+
+# VRAM slots of one 4K word OBJ page, the most sprites of a size the engine can refresh in a frame
+PAGE_SLOTS = {32: 16, 16: 64, 8: 128}
+
+# OBJ tiles are always 4bpp
+COLORS = 16
+BYTES_PER_PIXEL = 0.5
+
+# Attribute bits (vhoopppc): the small sprites live in the second name table (oamInitDynamicSprite(0x0000, 0x1000, ...))
+FLIP_H = 0x40
+FLIP_V = 0x80
+SMALL_NAME_BIT = 0x01
+
+# metsprend of the last sprite of a meta sprite
+META_END = 0xFFFF
+
+
+def split_frames(pixels: np.ndarray, frame_width: int, frame_height: int) -> np.ndarray:
+    """Cut an animation sheet into (count, frame_height, frame_width) frames, row by row."""
+
+    height, width = pixels.shape
+
+    if width % frame_width or height % frame_height:
+        raise Exception(f"The sheet ({width}x{height}) is not a whole number of {frame_width}x{frame_height} frames")
+
+    return split_blocks(pixels, frame_width, frame_height)
+
+
+def cover(frame: np.ndarray, small: int, large: int, sprite_cost: int = 0) -> list[tuple[int, int, int]]:
+    """Cover the opaque pixels of a frame with (x, y, size) sprites, moving as few bytes per refresh as possible.
+
+    The grid starts at the frame's opaque bounding box. A large cell is one large sprite unless its occupied small cells
+    cost less, counting sprite_cost bytes per sprite (0: fewest bytes, ties go to fewer sprites).
+    """
+
+    opaque = (frame & (COLORS - 1)) != 0
+
+    if not opaque.any():
+        return []
+
+    rows, cols = np.flatnonzero(opaque.any(axis=1)), np.flatnonzero(opaque.any(axis=0))
+    top, left = rows[0], cols[0]
+
+    # Crop to the bounding box, padded to whole large cells
+    cropped = opaque[top:rows[-1] + 1, left:cols[-1] + 1]
+    height, width = -(-cropped.shape[0] // large) * large, -(-cropped.shape[1] // large) * large
+    grid = np.zeros((height, width), dtype=bool)
+    grid[:cropped.shape[0], :cropped.shape[1]] = cropped
+
+    per_side = large // small
+    occupied = grid.reshape(height // small, small, width // small, small).any(axis=(1, 3))
+    cells = occupied.reshape(height // large, per_side, width // large, per_side).swapaxes(1, 2)
+    counts = cells.sum(axis=(2, 3))
+
+    large_cost = large * large * BYTES_PER_PIXEL + sprite_cost
+    small_cost = small * small * BYTES_PER_PIXEL + sprite_cost
+
+    sprites = []
+
+    for row, col in zip(*np.nonzero(counts)):
+
+        y, x = top + row * large, left + col * large
+
+        if large_cost <= counts[row, col] * small_cost:
+
+            sprites.append((x, y, large))
+            continue
+
+        for sub_row, sub_col in zip(*np.nonzero(cells[row, col])):
+            sprites.append((x + sub_col * small, y + sub_row * small, small))
+
+    return sprites
+
+
+class SpritePacker:
+
+    def __init__(self, oam_size: str = "OBJ_SIZE16_L32", priority: int = 2, flips: bool = True, sprite_cost: int = 0):
+        """Initialize a SpritePacker for the dynamic sprite engine's OBJSEL size (oamInitDynamicSprite oamsize)."""
+
+        if oam_size not in OAM_SIZES:
+            raise Exception(f"OAM size must be one of {', '.join(OAM_SIZES)}")
+
+        if not 0 <= priority <= 3:
+            raise Exception("Priority must be between 0 and 3")
+
+        self.oam_size = oam_size
+        self.small, self.large = OAM_SIZES[oam_size]
+        self.priority = priority
+
+        # Mirrored sprites share graphics through the attribute's flip bits
+        self.flips = flips
+
+        self.sprite_cost = sprite_cost
+
+    def pack(self, frames: np.ndarray) -> dict:
+        """Split (count, height, width) indexed frames into sprites, keep every distinct sprite graphic once per size.
+
+        Returns the unique blocks per size and, per frame, its sprites as (x, y, size, frame id, attribute).
+        """
+
+        placed = []
+        blocks = {self.small: [], self.large: []}
+
+        for number, frame in enumerate(frames):
+
+            sprites = self.cover_frame(frame, number)
+
+            # Sprites of the bounding box grid may reach past the frame's right and bottom edges
+            padded = np.pad(frame, ((0, self.large), (0, self.large)))
+
+            for x, y, size in sprites:
+                blocks[size].append(padded[y:y + size, x:x + size])
+
+            placed.append(sprites)
+
+        numbers, attributes, graphics = {}, {}, {}
+
+        for size, pieces in blocks.items():
+
+            if not pieces:
+                continue
+
+            pieces = np.stack(pieces)
+
+            # Every sprite uses one palette: the high bits of its colors, as gfx4snes does for tiles
+            palettes = pieces.reshape(len(pieces), -1).max(axis=1).astype(np.int64) >> 4
+
+            index = TileIndex(self.flips)
+            numbers[size], flips = index.add(pieces & (COLORS - 1))
+            graphics[size] = index.tileset()
+
+            if len(graphics[size]) > MAX_FRAMES[size]:
+                raise Exception(f"{len(graphics[size])} different {size}x{size} sprites, the engine addresses {MAX_FRAMES[size]}")
+
+            attributes[size] = self.priority << 4 | (palettes & 7) << 1 | np.where(flips & 1, FLIP_H, 0) | np.where(flips & 2, FLIP_V, 0)
+
+            if size == self.small:
+                attributes[size] |= SMALL_NAME_BIT
+
+        used = {size: 0 for size in numbers}
+        metasprites = []
+
+        for sprites in placed:
+
+            entries = []
+
+            for x, y, size in sprites:
+
+                entries.append((x, y, size, int(numbers[size][used[size]]), int(attributes[size][used[size]])))
+                used[size] += 1
+
+            metasprites.append(entries)
+
+        return {"graphics": graphics, "metasprites": metasprites}
+
+    def cover_frame(self, frame: np.ndarray, number: int) -> list[tuple[int, int, int]]:
+        """Cover one frame with sprites, checking it fits the engine's VRAM slots."""
+
+        sprites = cover(frame, self.small, self.large, self.sprite_cost)
+
+        if not sprites:
+            raise Exception(f"Frame {number} is empty, a meta sprite needs at least one sprite")
+
+        for size in (self.small, self.large):
+
+            count = sum(sprite[2] == size for sprite in sprites)
+
+            if count > PAGE_SLOTS[size]:
+                raise Exception(f"Frame {number} needs {count} {size}x{size} sprites, a VRAM page holds {PAGE_SLOTS[size]}")
+
+        return sprites
+
+    def header(self, name: str, metasprites: list, sizes: list[int]) -> str:
+        """Return the C header declaring the graphics and the meta sprite tables, safe to include from several C files."""
+
+        guard = f"{name.upper()}_SPRITES_H"
+
+        lines = [f"// Meta sprites of {name}, written by spritepacker.py: draw frame n with oamDynamicMetaDraw(id, x, y, (u8 *){name}_frames[n])", ""]
+        lines += [f"#ifndef {guard}", f"#define {guard}", ""]
+        lines += [f"extern char {name}_{size}g, {name}_{size}g_end;" for size in sizes]
+        lines += [f"extern char {name}p;", ""]
+        lines += [f"extern const t_metasprites {name}_frame{number}[];" for number in range(len(metasprites))]
+        lines += ["", f"extern const t_metasprites *{name}_frames[];", "", "#endif"]
+
+        return "\n".join(lines) + "\n"
+
+    def source(self, name: str, metasprites: list) -> str:
+        """Return the C file defining the meta sprite tables (t_metasprites, one per frame, and the frame list) for oamDynamicMetaDraw."""
+
+        lines = [f"// Meta sprites of {name}, written by spritepacker.py", "", "#include <snes.h>", f'#include "{name}.h"', ""]
+
+        for number, entries in enumerate(metasprites):
+
+            lines.append(f"const t_metasprites {name}_frame{number}[] =")
+            lines.append("{")
+
+            for position, (x, y, size, frame_id, attribute) in enumerate(entries):
+
+                end = META_END if position == len(entries) - 1 else 0
+                lines.append(f"\t{x},{y},{frame_id},0x{attribute:02X}, {SPRITE_TYPES[size]}, &{name}_{size}g,0x{end:04X},0x0000,")
+
+            lines += ["};", ""]
+
+        lines.append(f"const t_metasprites *{name}_frames[] = {{{', '.join(f'{name}_frame{number}' for number in range(len(metasprites)))}}};")
+
+        return "\n".join(lines) + "\n"
+
+    def data_asm(self, name: str, sizes: list[int]) -> str:
+        """Return a data unit including the graphics and palette, one superfree section each, that assembles on its own like data.asm."""
+
+        lines = ['.include "hdr.asm"', ""]
+
+        for size in sizes:
+
+            lines += [f'.section ".rodata_{name}_{size}" superfree', "", f"{name}_{size}g:", f'.incbin "{name}_{size}.pic"', f"{name}_{size}g_end:", "", ".ends", ""]
+
+        lines += [f'.section ".rodata_{name}p" superfree', "", f"{name}p:", f'.incbin "{name}.pal"', "", ".ends"]
+
+        return "\n".join(lines) + "\n"
+
+    def pack_file(self, input_path: Path, frame_width: int, frame_height: int, output_base: Path | None = None) -> dict:
+        """Pack an animation sheet and write <name>_32/16/8.pic, <name>.pal, <name>.h, <name>.c and <name>_data.asm, returning statistics."""
+
+        input_path = Path(input_path)
+        output_base = Path(output_base) if output_base else input_path.with_suffix('')
+        name = output_base.name
+
+        converter = Gfx4Snes(colors=COLORS, output_colors=COLORS * 8, palette=True)
+        pixels, palette = converter.load(input_path)
+        frames = split_frames(pixels, frame_width, frame_height)
+
+        result = self.pack(frames)
+        sizes = sorted(result["graphics"], reverse=True)
+
+        for size in sizes:
+
+            encoder = Gfx4Snes(block_width=size, block_height=size, colors=COLORS)
+            output_base.with_name(f"{name}_{size}.pic").write_bytes(encoder.encode(result["graphics"][size]))
+
+        output_base.with_name(f"{name}.pal").write_bytes(converter.palette_data(palette))
+        output_base.with_name(f"{name}.h").write_text(self.header(name, result["metasprites"], sizes))
+        output_base.with_name(f"{name}.c").write_text(self.source(name, result["metasprites"]))
+
+        # Not <name>.asm: the automatizer takes an .asm beside a .c of the same name for the C unit's intermediate
+        output_base.with_name(f"{name}_data.asm").write_text(self.data_asm(name, sizes))
+
+        # Bytes the engine copies to VRAM when a frame is shown, against sending the whole frame
+        dma = [int(sum(size * size * BYTES_PER_PIXEL for _, _, size, _, _ in entries)) for entries in result["metasprites"]]
+
+        return {
+            "frames": len(frames),
+            "unique": {size: len(result["graphics"][size]) for size in sizes},
+            "sprites": max(len(entries) for entries in result["metasprites"]),
+            "rom_bytes": int(sum(len(result["graphics"][size]) * size * size * BYTES_PER_PIXEL for size in sizes)),
+            "frame_bytes": int(frame_width * frame_height * BYTES_PER_PIXEL),
+            "dma_max": max(dma),
+            "dma_mean": sum(dma) / len(dma)
+        }
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Pack animation frames into sprite graphics and meta sprite tables for pvsneslib's dynamic sprite engine.")
+    parser.add_argument("sheet", type=Path, help="animation sheet (PNG/BMP, 16 colors per palette), frames left to right then top to bottom")
+    parser.add_argument("-W", "--frame-width", type=int, required=True, help="frame width in pixels")
+    parser.add_argument("-H", "--frame-height", type=int, required=True, help="frame height in pixels")
+    parser.add_argument("-s", "--oam-size", default="OBJ_SIZE16_L32", choices=list(OAM_SIZES), help="oamInitDynamicSprite size (default: OBJ_SIZE16_L32)")
+    parser.add_argument("-g", "--priority", type=int, default=2, help="sprite priority {0..3} (default: 2)")
+    parser.add_argument("--no-flips", action="store_true", help="don't share graphics between mirrored sprites")
+    parser.add_argument("--sprite-cost", type=int, default=0, help="bytes a sprite is worth, to trade VRAM traffic for fewer OAM entries")
+    parser.add_argument("-o", "--output", type=Path, default=None, help="output base name (default: the sheet's)")
+
+    cli = parser.parse_args()
+
+    stats = SpritePacker(cli.oam_size, cli.priority, not cli.no_flips, cli.sprite_cost).pack_file(cli.sheet, cli.frame_width, cli.frame_height, cli.output)
+
+    print(f"{cli.sheet}: {stats['frames']} frames, unique sprites " + ", ".join(f"{count} of {size}x{size}" for size, count in stats['unique'].items()) +
+          f", {stats['rom_bytes']} bytes of graphics; per frame at most {stats['sprites']} sprites and "
+          f"{stats['dma_max']} bytes to VRAM (mean {stats['dma_mean']:.0f}, whole frame {stats['frame_bytes']})")
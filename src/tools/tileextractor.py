@@ -0,0 +1,200 @@
+from xml.sax.saxutils import quoteattr
+from tileindex import TileIndex
+from pathlib import Path
+from PIL import Image
+import numpy as np
+import argparse
+import json
+import math
+import time
+
+# The browser extractor scales its tolerance slider by this, so the same values merge the same tiles
+TOLERANCE_SCALE = 1024
+
+# Tiled's flip flags on a gid
+TILED_FLIP_H = 0x80000000
+TILED_FLIP_V = 0x40000000
+
+
+def load_pixels(path: Path) -> np.ndarray:
+    """Load an image as (height, width) uint32 RGBA pixels, so a tile compares as one row of words."""
+
+    with Image.open(path) as image:
+
+        rgba = np.ascontiguousarray(np.asarray(image.convert("RGBA"), dtype=np.uint8))
+
+    return rgba.view(np.uint32)[:, :, 0]
+
+
+def slice_tiles(pixels: np.ndarray, tile_width: int, tile_height: int) -> tuple[np.ndarray, int, int]:
+    """Return the (count, tile_height, tile_width) tiles of an image row by row, with the map's columns and rows."""
+
+    height, width = pixels.shape
+
+    if width % tile_width or height % tile_height:
+        raise Exception(f"The image ({width}x{height}) is not a whole number of {tile_width}x{tile_height} tiles")
+
+    cols, rows = width // tile_width, height // tile_height
+    tiles = pixels.reshape(rows, tile_height, cols, tile_width).swapaxes(1, 2).reshape(-1, tile_height, tile_width)
+
+    return tiles, cols, rows
+
+
+def merge_similar(tiles: np.ndarray, tolerance: int) -> np.ndarray:
+    """Map every tile to the first earlier kept tile within tolerance (summed RGBA channel differences), like the browser tool."""
+
+    channels = tiles.view(np.uint8).reshape(len(tiles), -1).astype(np.int32)
+    kept = []
+    targets = np.empty(len(tiles), dtype=np.int64)
+
+    for number, tile in enumerate(channels):
+
+        if kept:
+
+            differences = np.abs(channels[kept] - tile).sum(axis=1)
+            close = np.flatnonzero(differences <= tolerance)
+
+            if len(close):
+
+                targets[number] = targets[kept[close[0]]]
+                continue
+
+        targets[number] = len(kept)
+        kept.append(number)
+
+    return targets
+
+
+def sheet_size(count: int) -> tuple[int, int]:
+    """Return the rows and columns of a sheet of count tiles, as square as possible like the browser tool's tiles.png."""
+
+    rows = max(int(math.sqrt(count)), 1)
+
+    return rows, -(-count // rows)
+
+
+def sheet(tiles: np.ndarray) -> np.ndarray:
+    """Lay tiles out row by row on a sheet_size sheet."""
+
+    count, tile_height, tile_width = tiles.shape
+    rows, cols = sheet_size(count)
+
+    padded = np.zeros((rows * cols, tile_height, tile_width), dtype=tiles.dtype)
+    padded[:count] = tiles
+
+    return padded.reshape(rows, cols, tile_height, tile_width).swapaxes(1, 2).reshape(rows * tile_height, cols * tile_width)
+
+
+class TileExtractor:
+
+    def __init__(self, tile_width: int = 8, tile_height: int = 8, tolerance: int = 0, flips: bool = False):
+        """Initialize a TileExtractor splitting images into tile_width x tile_height tiles (tolerance as in the browser tool)."""
+
+        self.tile_width = tile_width
+        self.tile_height = tile_height
+        self.tolerance = tolerance
+        self.flips = flips
+
+    def extract(self, pixels: np.ndarray) -> dict:
+        """Return the unique tiles of (height, width) uint32 pixels and the map of the image (tile numbers, Tiled flip flags)."""
+
+        start = time.perf_counter()
+        blocks, cols, rows = slice_tiles(pixels, self.tile_width, self.tile_height)
+
+        index = TileIndex(self.flips)
+        numbers, flips = index.add(blocks)
+        tiles = index.tileset()
+
+        if self.tolerance > 0 and len(tiles) > 1:
+
+            # Only the unique tiles are compared, exact duplicates never reach the slow path
+            targets = merge_similar(tiles, self.tolerance * TOLERANCE_SCALE)
+            keep = np.unique(targets, return_index=True)[1]
+            tiles, numbers = tiles[keep], targets[numbers]
+
+        gids = numbers.astype(np.uint32)
+        gids |= np.where(flips & 1, TILED_FLIP_H, 0).astype(np.uint32)
+        gids |= np.where(flips & 2, TILED_FLIP_V, 0).astype(np.uint32)
+
+        return {
+            "tiles": tiles,
+            "map": gids.reshape(rows, cols),
+            "ms": (time.perf_counter() - start) * 1000
+        }
+
+    def tmx(self, result: dict, tiles_image: str) -> str:
+        """Return the result as a Tiled map (BG1 layer, per-tile attribute/palette/priority), ready for tmxcompiler."""
+
+        rows, cols = result["map"].shape
+        sheet_rows, sheet_cols = sheet_size(len(result["tiles"]))
+        properties = ('<properties><property name="attribute" value="0"/><property name="palette" value="0"/>'
+                      '<property name="priority" value="0"/></properties>')
+
+        lines = [
+            '<?xml version="1.0" encoding="UTF-8"?>',
+            f'<map version="1.9" tiledversion="1.9.1" orientation="orthogonal" renderorder="right-down" width="{cols}" height="{rows}" '
+            f'tilewidth="{self.tile_width}" tileheight="{self.tile_height}" infinite="0" nextobjectid="1">',
+            f' <tileset firstgid="1" name="tiles" tilewidth="{self.tile_width}" tileheight="{self.tile_height}" '
+            f'tilecount="{len(result["tiles"])}" columns="{sheet_cols}">',
+            f'  <image source={quoteattr(tiles_image)} width="{sheet_cols * self.tile_width}" height="{sheet_rows * self.tile_height}"/>'
+        ]
+
+        lines += [f'  <tile id="{number}">{properties}</tile>' for number in range(len(result["tiles"]))]
+
+        # gids start at 1, the flip flags stay on top
+        gids = (result["map"] & ~np.uint32(TILED_FLIP_H | TILED_FLIP_V)) + 1 | result["map"] & np.uint32(TILED_FLIP_H | TILED_FLIP_V)
+        csv = ",\n".join(",".join(map(str, row)) for row in gids.tolist())
+
+        lines += [
+            ' </tileset>',
+            f' <layer id="1" name="BG1" width="{cols}" height="{rows}">',
+            f'  <data encoding="csv">\n{csv}\n</data>',
+            ' </layer>',
+            ' <objectgroup color="#ff0000" id="2" name="Entities"/>',
+            '</map>'
+        ]
+
+        return "\n".join(lines) + "\n"
+
+    def extract_file(self, input_path: Path, output_dir: Path | None = None) -> dict:
+        """Extract an image and write <name>_tiles.png, <name>.json and <name>.tmx, returning the result."""
+
+        input_path = Path(input_path)
+        output_dir = Path(output_dir) if output_dir else input_path.parent
+        result = self.extract(load_pixels(input_path))
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        tiles_path = output_dir / f"{input_path.stem}_tiles.png"
+        pixels = sheet(result["tiles"])
+        Image.fromarray(pixels.view(np.uint8).reshape(*pixels.shape, 4), "RGBA").save(tiles_path)
+
+        rows, cols = result["map"].shape
+        (output_dir / f"{input_path.stem}.json").write_text(json.dumps({"map": result["map"].ravel().tolist(), "numCols": cols, "numRows": rows}))
+        (output_dir / f"{input_path.stem}.tmx").write_text(self.tmx(result, tiles_path.name))
+
+        result["files"] = [tiles_path.name, f"{input_path.stem}.json", f"{input_path.stem}.tmx"]
+
+        return result
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Extract the unique tiles and the map of a screenshot or mockup (like the browser tileset extractor).")
+    parser.add_argument("images", type=Path, nargs="+", help="PNG/GIF/BMP images to extract")
+    parser.add_argument("-W", "--tile-width", type=int, default=8, help="tile width in pixels (default: 8)")
+    parser.add_argument("-H", "--tile-height", type=int, default=8, help="tile height in pixels (default: 8)")
+    parser.add_argument("-t", "--tolerance", type=int, default=0, help="merge tiles this close, as the browser tool's slider (default: 0, exact)")
+    parser.add_argument("-f", "--flips", action="store_true", help="also merge mirrored tiles, using Tiled's flip flags in the map")
+    parser.add_argument("-o", "--output-dir", type=Path, default=None, help="output directory (default: next to each image)")
+
+    cli = parser.parse_args()
+
+    extractor = TileExtractor(cli.tile_width, cli.tile_height, cli.tolerance, cli.flips)
+
+    for image in cli.images:
+
+        result = extractor.extract_file(image, cli.output_dir)
+        rows, cols = result["map"].shape
+
+        print(f"{image}: {cols}x{rows} map, {len(result['tiles'])} unique tiles in {result['ms']:.0f} ms -> {', '.join(result['files'])}")
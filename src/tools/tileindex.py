@@ -0,0 +1,121 @@
+import numpy as np
+
+# Orientations of a tile, as the map's flip bits: bit 0 = horizontal (h), bit 1 = vertical (v)
+ORIENTATIONS = 4
+
+FLIP_SHIFT = 14
+
+
+def orientations(blocks: np.ndarray) -> np.ndarray:
+    """Return (count, 4, height, width): every block as is, mirrored horizontally, vertically and both."""
+
+    return np.stack([blocks, blocks[:, :, ::-1], blocks[:, ::-1, :], blocks[:, ::-1, ::-1]], axis=1)
+
+
+def _words(blocks: np.ndarray) -> np.ndarray:
+    """View (..., height, width) uint8 blocks as (..., words) uint64, compared word by word as a total order."""
+
+    flat = np.ascontiguousarray(blocks).reshape(*blocks.shape[:-2], -1)
+
+    if flat.shape[-1] % 8:
+        flat = np.concatenate([flat, np.zeros((*flat.shape[:-1], 8 - flat.shape[-1] % 8), dtype=np.uint8)], axis=-1)
+
+    return flat.view(np.uint64)
+
+
+def _less(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Compare (count, words) rows: True where a sorts before b at the first word they differ in."""
+
+    differs = a != b
+    first = differs.argmax(axis=1)
+    rows = np.arange(len(a))
+
+    return differs.any(axis=1) & (a[rows, first] < b[rows, first])
+
+
+class TileIndex:
+
+    def __init__(self, flips: bool = True):
+        """Initialize an empty TileIndex: a growing tileset where each distinct block (up to flips, if enabled) is stored once."""
+
+        self.flips = flips
+
+        # Canonical form (smallest orientation) -> tile number
+        self._ids: dict[bytes, int] = {}
+
+        # Stored blocks, each in the orientation it first appeared in, and that orientation, one chunk per add
+        self._tiles: list[np.ndarray] = []
+        self._orientations: list[np.ndarray] = []
+        self._count = 0
+
+    def __len__(self) -> int:
+
+        return self._count
+
+    def canonical(self, blocks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Return the canonical form of every block as (count, words) and the orientation that turns the block into it."""
+
+        if not self.flips:
+            return _words(blocks), np.zeros(len(blocks), dtype=np.int64)
+
+        candidates = _words(orientations(blocks))
+        best = candidates[:, 0]
+        chosen = np.zeros(len(blocks), dtype=np.int64)
+
+        for orientation in range(1, ORIENTATIONS):
+
+            better = _less(candidates[:, orientation], best)
+            best = np.where(better[:, None], candidates[:, orientation], best)
+            chosen[better] = orientation
+
+        return best, chosen
+
+    def add(self, blocks: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        """Add (count, height, width) blocks and return, for each, its tile number and the flip bits that map the stored tile onto it."""
+
+        if len(blocks) == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+        canonical, chosen = self.canonical(blocks)
+        keys = np.ascontiguousarray(canonical).view(np.dtype((np.void, canonical.shape[1] * 8))).ravel()
+
+        # One sort groups the batch
+        _, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        inverse = inverse.ravel()
+
+        # Distinct forms in order of first appearance; only those touch the dictionary, in one pass
+        groups = np.argsort(first)
+        blocks_first = first[groups]
+        found = [self._ids.get(key) for key in keys[blocks_first].tolist()]
+        new = np.array([number is None for number in found], dtype=bool)
+
+        group_numbers = np.array([-1 if number is None else number for number in found], dtype=np.int64)
+        group_numbers[new] = self._count + np.arange(np.count_nonzero(new))
+
+        if new.any():
+
+            added = blocks_first[new]
+            self._ids.update(zip(keys[added].tolist(), group_numbers[new].tolist()))
+            self._tiles.append(blocks[added].copy())
+            self._orientations.append(chosen[added])
+            self._count += len(added)
+
+        numbers = np.empty(len(first), dtype=np.int64)
+        numbers[groups] = group_numbers
+        numbers = numbers[inverse]
+
+        # Flips commute and undo themselves: block = flip(chosen) . flip(stored orientation) of the stored tile
+        return numbers, chosen ^ np.concatenate(self._orientations)[numbers]
+
+    def map_entries(self, numbers: np.ndarray, flips: np.ndarray) -> np.ndarray:
+        """Return the map entry bits of tile numbers and flips (vh in bits 15-14, the tile number below)."""
+
+        return numbers | flips << FLIP_SHIFT
+
+    def tileset(self) -> np.ndarray:
+        """Return the stored blocks as one (count, height, width) array."""
+
+        if not self._tiles:
+            return np.zeros((0, 8, 8), dtype=np.uint8)
+
+        return np.concatenate(self._tiles)
@@ -0,0 +1,318 @@
+from concurrent.futures import ProcessPoolExecutor
+import xml.etree.ElementTree as ET
+from snesgfx import page_map
+from pathlib import Path
+import numpy as np
+import multiprocessing
+import argparse
+import base64
+import zlib
+import time
+import sys
+import os
+
+# Tiled stores flips in the top bits of every gid
+TILED_FLIP_H = 0x80000000
+TILED_FLIP_V = 0x40000000
+TILED_FLIP_D = 0x20000000
+TILED_GID_MASK = 0x0FFFFFFF
+
+# mapLoad (pvsneslib map engine) looks up the low 10 bits of a map entry in the tile definitions and keeps its flip bits
+TILE_MASK = 0x3FF
+MAX_TILES = TILE_MASK + 1
+FLIP_H_BIT = 0x4000
+FLIP_V_BIT = 0x8000
+PALETTE_SHIFT = 10
+PRIORITY_SHIFT = 13
+
+# objLoadObjects reads x, y, type, minx, maxx words per object until this word
+OBJECTS_END = 0xFFFF
+
+
+def decode_layer(data: ET.Element, count: int) -> np.ndarray:
+    """Decode the gids of a layer's <data> (CSV, or base64 raw/zlib/gzip) into a uint32 array."""
+
+    encoding = data.get("encoding")
+    compression = data.get("compression")
+    text = (data.text or "").strip()
+
+    if data.find("chunk") is not None:
+        raise Exception("Infinite maps are not supported, resize the map in Tiled (Map > Map Properties)")
+
+    if encoding == "csv":
+
+        gids = np.array(text.replace(",", " ").split(), dtype=np.uint64).astype(np.uint32)
+
+    elif encoding == "base64":
+
+        raw = base64.b64decode(text)
+
+        if compression in ("zlib", "gzip"):
+
+            # wbits 47 accepts both zlib and gzip headers
+            raw = zlib.decompress(raw, 47)
+
+        elif compression:
+
+            raise Exception(f"Unsupported layer compression: {compression} (use CSV, base64, zlib or gzip)")
+
+        gids = np.frombuffer(raw, dtype="<u4").astype(np.uint32)
+
+    elif encoding is None:
+
+        gids = np.array([int(tile.get("gid", 0)) for tile in data.iter("tile")], dtype=np.uint32)
+
+    else:
+
+        raise Exception(f"Unsupported layer encoding: {encoding}")
+
+    if len(gids) != count:
+        raise Exception(f"Layer holds {len(gids)} tiles, the map has {count}")
+
+    return gids
+
+
+def read_tile_properties(tileset: ET.Element, firstgid: int, definitions: np.ndarray, attributes: np.ndarray):
+    """Fill the definition and attribute words of a tileset's tiles from their palette, priority and attribute properties."""
+
+    for tile in tileset.iter("tile"):
+
+        number = firstgid - 1 + int(tile.get("id"))
+
+        if number >= MAX_TILES:
+            raise Exception(f"Tile {number} is past the {MAX_TILES} tiles a map entry can address")
+
+        properties = {prop.get("name"): prop.get("value", prop.text) for prop in tile.iter("property")}
+
+        palette = int(properties.get("palette", 0))
+        priority = int(properties.get("priority", 0))
+
+        definitions[number] = number | (palette & 7) << PALETTE_SHIFT | (priority & 1) << PRIORITY_SHIFT
+
+        # Attributes are written in hex in Tiled, like the T_SOLID (FF00) constants of map.h
+        attributes[number] = int(str(properties.get("attribute", "0")), 16)
+
+
+class TmxMap:
+
+    def __init__(self, path: Path):
+        """Initialize a TmxMap by streaming the file once: tile properties, layers and objects are decoded as they end."""
+
+        self.path = Path(path)
+        self.width = self.height = 0
+        self.tile_width = self.tile_height = 8
+        self.layers: dict[str, np.ndarray] = {}
+        self.objects: list[tuple[int, int, int, int, int]] = []
+
+        # Every tile is its own definition until its properties say otherwise
+        self.definitions = np.arange(MAX_TILES, dtype=np.uint16)
+        self.attributes = np.zeros(MAX_TILES, dtype=np.uint16)
+        self.tile_count = 0
+
+        self._parse()
+
+    def _parse(self):
+        """Walk the file with iterparse, clearing every element once it is used so big maps stay small in memory."""
+
+        for event, element in ET.iterparse(self.path, events=("start", "end")):
+
+            if event == "start":
+
+                if element.tag == "map":
+
+                    self.width, self.height = int(element.get("width")), int(element.get("height"))
+                    self.tile_width, self.tile_height = int(element.get("tilewidth")), int(element.get("tileheight"))
+
+                    if element.get("infinite") == "1":
+                        raise Exception("Infinite maps are not supported, resize the map in Tiled (Map > Map Properties)")
+
+                continue
+
+            if element.tag == "tileset":
+
+                self._tileset(element)
+                element.clear()
+
+            elif element.tag == "layer":
+
+                self._layer(element)
+                element.clear()
+
+            elif element.tag == "object":
+
+                self._object(element)
+                element.clear()
+
+    def _tileset(self, element: ET.Element):
+        """Read an embedded or external (.tsx) tileset."""
+
+        firstgid = int(element.get("firstgid", 1))
+
+        if element.get("source"):
+
+            element = ET.parse(self.path.parent / element.get("source")).getroot()
+
+        self.tile_count = max(self.tile_count, firstgid - 1 + int(element.get("tilecount", 0)))
+        read_tile_properties(element, firstgid, self.definitions, self.attributes)
+
+    def _layer(self, element: ET.Element):
+        """Decode a tile layer into map entries: tile numbers with the SNES flip bits."""
+
+        width, height = int(element.get("width", self.width)), int(element.get("height", self.height))
+        gids = decode_layer(element.find("data"), width * height)
+
+        if np.any(gids & TILED_FLIP_D):
+            raise Exception(f"Layer {element.get('name')} has rotated tiles, the SNES can only flip them")
+
+        tiles = (gids & TILED_GID_MASK).astype(np.int64)
+
+        if tiles.max(initial=0) > MAX_TILES:
+            raise Exception(f"Layer {element.get('name')} uses tile {tiles.max() - 1}, past the {MAX_TILES} a map entry can address")
+
+        # gid 0 is an empty cell, drawn with tile 0 like tmx2snes does
+        entries = np.maximum(tiles - 1, 0).astype(np.uint16)
+        entries |= np.where(gids & TILED_FLIP_H, FLIP_H_BIT, 0).astype(np.uint16)
+        entries |= np.where(gids & TILED_FLIP_V, FLIP_V_BIT, 0).astype(np.uint16)
+
+        self.layers[element.get("name") or f"layer{len(self.layers)}"] = entries.reshape(height, width)
+
+    def _object(self, element: ET.Element):
+        """Read an object as objLoadObjects expects it: x, y, type, minx, maxx."""
+
+        properties = {prop.get("name"): prop.get("value", prop.text) for prop in element.iter("property")}
+
+        x, y = int(float(element.get("x", 0))), int(float(element.get("y", 0)))
+
+        # Tiled 1.9 renamed the object's type to class
+        kind = int(element.get("type", element.get("class", 0)) or 0)
+
+        self.objects.append((x, y, kind, int(properties.get("minx", 0)), int(properties.get("maxx", 0))))
+
+    def map_data(self, name: str) -> bytes:
+        """Return a layer as .m16: width and height in pixels, size in bytes, then the entries row by row."""
+
+        entries = self.layers[name]
+        height, width = entries.shape
+
+        if max(width * self.tile_width, height * self.tile_height) > 0xFFFF:
+            raise Exception(f"Layer {name} is {width}x{height} tiles, mapLoad takes at most 65535 pixels a side")
+
+        # mapLoad skips the size word, it only has to fit
+        header = np.array([width * self.tile_width, height * self.tile_height, entries.nbytes & 0xFFFF], dtype="<u2")
+
+        return header.tobytes() + entries.astype("<u2").tobytes()
+
+    def paged_map(self, name: str) -> bytes:
+        """Return a layer as a plain BG map (.map, tile definitions applied) in 32x32 pages, for bgInitMapSet."""
+
+        entries = self.layers[name]
+        resolved = self.definitions[entries & TILE_MASK] | entries & (FLIP_H_BIT | FLIP_V_BIT)
+
+        return page_map(resolved).astype("<u2").tobytes()
+
+    def definitions_data(self) -> bytes:
+        """Return the .t16 tile definitions: tile number, palette and priority of every tile of the tileset."""
+
+        return self.definitions[:self.tile_count].astype("<u2").tobytes()
+
+    def attributes_data(self) -> bytes:
+        """Return the .b16 tile attributes (T_SOLID, T_LADDER, slopes...) of every tile of the tileset."""
+
+        return self.attributes[:self.tile_count].astype("<u2").tobytes()
+
+    def objects_data(self) -> bytes:
+        """Return the .o16 object table, ended by FFFF."""
+
+        words = [value & 0xFFFF for obj in self.objects for value in obj] + [OBJECTS_END]
+
+        return np.array(words, dtype="<u2").tobytes()
+
+    def outputs(self, map_name: str, pages: bool = False) -> dict[str, bytes]:
+        """Return every output file name and content: <layer>.m16 per layer, and <map_name>.t16/.b16/.o16."""
+
+        outputs = {}
+
+        for name in self.layers:
+
+            outputs[f"{name}.m16"] = self.map_data(name)
+
+            if pages:
+                outputs[f"{name}.map"] = self.paged_map(name)
+
+        outputs[f"{map_name}.t16"] = self.definitions_data()
+        outputs[f"{map_name}.b16"] = self.attributes_data()
+        outputs[f"{map_name}.o16"] = self.objects_data()
+
+        return outputs
+
+
+def compile_map(tmx: Path, map_name: str | None = None, output_dir: Path | None = None, pages: bool = False) -> dict:
+    """Compile one .tmx and write its outputs (next to it by default), returning the written files and timing."""
+
+    start = time.perf_counter()
+    tmx = Path(tmx)
+    output_dir = Path(output_dir) if output_dir else tmx.parent
+
+    try:
+
+        outputs = TmxMap(tmx).outputs(map_name or tmx.stem, pages)
+
+        output_dir.mkdir(parents=True, exist_ok=True)
+
+        for name, data in outputs.items():
+            (output_dir / name).write_bytes(data)
+
+    except Exception as e:
+
+        return {"map": str(tmx), "error": str(e), "ms": (time.perf_counter() - start) * 1000}
+
+    return {"map": str(tmx), "files": sorted(outputs), "ms": (time.perf_counter() - start) * 1000}
+
+
+def compile_directory(directory: Path, pages: bool = False, workers: int = 0, output_dir: Path | None = None) -> list[dict]:
+    """Compile every .tmx under a directory, several maps at once; with output_dir the outputs mirror the directory's layout there."""
+
+    directory = Path(directory)
+    maps = sorted(directory.rglob("*.tmx"))
+    workers = workers if workers > 0 else (os.cpu_count() or 1)
+
+    # Maps of different subdirectories may share names, so each keeps its own output subdirectory
+    output_dirs = [Path(output_dir) / tmx.parent.relative_to(directory) if output_dir else None for tmx in maps]
+
+    if len(maps) > 1 and workers > 1:
+
+        with ProcessPoolExecutor(max_workers=min(workers, len(maps))) as pool:
+
+            return list(pool.map(compile_map, maps, [None] * len(maps), output_dirs, [pages] * len(maps)))
+
+    return [compile_map(tmx, None, out, pages) for tmx, out in zip(maps, output_dirs)]
+
+
+if __name__ == "__main__":
+
+    multiprocessing.freeze_support()
+
+    parser = argparse.ArgumentParser(description="Compile Tiled .tmx maps for pvsneslib's map engine (like tmx2snes).")
+    parser.add_argument("tmx", type=Path, help="map to compile, or a directory to compile every .tmx under it")
+    parser.add_argument("map_name", nargs="?", default=None, help="base name of the .t16/.b16/.o16 files (default: the map's name)")
+    parser.add_argument("-o", "--output-dir", type=Path, default=None, help="output directory (default: next to the map), in directory mode laid out like the maps")
+    parser.add_argument("-y", "--pages", action="store_true", help="also write every layer as a 32x32 paged BG map (.map)")
+    parser.add_argument("-w", "--workers", type=int, default=0, help="maps compiled at once in directory mode, 0 uses every core")
+
+    cli = parser.parse_args()
+
+    # Every map of a directory is named after its own file
+    if cli.tmx.is_dir() and cli.map_name:
+        parser.error("map_name names a single map, it can't be given with a directory")
+
+    results = compile_directory(cli.tmx, cli.pages, cli.workers, cli.output_dir) if cli.tmx.is_dir() else [compile_map(cli.tmx, cli.map_name, cli.output_dir, cli.pages)]
+
+    for result in results:
+
+        if "error" in result:
+            print(f"FAILED {result['map']}: {result['error']}")
+
+        else:
+            print(f"{result['map']}: {', '.join(result['files'])} ({result['ms']:.1f} ms)")
+
+    sys.exit(1 if any("error" in result for result in results) else 0)
@@ -0,0 +1,16 @@
+from pathlib import Path
+import pytest
+import sys
+
+ROOT = Path(__file__).parent.parent.resolve()
+
+# The tools import each other as sibling modules, as they do when run as scripts
+for directory in (ROOT / "src" / "tools", ROOT / "src" / "libs" / "pvsneslib" / "devkitsnes"):
+    sys.path.insert(0, str(directory))
+
+
+@pytest.fixture(autouse=True)
+def user_cache(tmp_path, monkeypatch):
+    """Keep the per-user caches (objects, toolchain, graphics) of every test in its own directory."""
+
+    monkeypatch.setenv("SNES_IDE_CACHE", str(tmp_path / "cache" / "objcache"))
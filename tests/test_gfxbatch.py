@@ -0,0 +1,106 @@
+from gfxbatch import GfxBatch, GfxCache
+from PIL import Image
+from pathlib import Path
+import numpy as np
+import gfxbatch
+import json
+
+OPTIONS = "-s 8 -o 16 -u 16 -p -m"
+
+
+def make_image(path: Path, seed: int = 0):
+    """Write a 16 color 32x32 palette image."""
+
+    pixels = np.random.default_rng(seed).integers(0, 16, (32, 32), dtype=np.uint8)
+    image = Image.fromarray(pixels, mode="P")
+    image.putpalette([value for index in range(16) for value in (index * 16, 255 - index * 16, 128)] + [0] * (3 * 240))
+    image.save(path)
+
+
+def make_tree(root: Path) -> Path:
+    """Write a res/ tree of two images and a manifest converting them with OPTIONS."""
+
+    res = root / "res"
+    res.mkdir()
+
+    make_image(res / "hero.png", 0)
+    make_image(res / "font.png", 1)
+    (res / "gfx.json").write_text(json.dumps({"defaults": OPTIONS}))
+
+    return res
+
+
+def run(res: Path, cache: GfxCache | None = None) -> dict:
+    """Run one batch conversion, as a fresh GfxBatch like every CLI run."""
+
+    return GfxBatch(res, workers=1, cache=cache).run()
+
+
+def test_second_run_converts_nothing(tmp_path):
+    """Unchanged images with unchanged options are up to date on the next run."""
+
+    res = make_tree(tmp_path)
+
+    first = run(res)
+    second = run(res)
+
+    assert (first["converted"], first["failed"]) == (2, 0)
+    assert (second["converted"], second["up_to_date"]) == (0, 2)
+    assert (res / "hero.pic").exists() and (res / "hero.pal").exists() and (res / "hero.map").exists()
+
+
+def test_changed_options_or_contents_reconvert(tmp_path):
+    """New options for one image, or new pixels in another, reconvert just those."""
+
+    res = make_tree(tmp_path)
+    run(res)
+
+    (res / "gfx.json").write_text(json.dumps({"defaults": OPTIONS, "assets": {"hero.png": OPTIONS + " -R"}}))
+    make_image(res / "font.png", 2)
+
+    report = run(res)
+
+    assert {result["asset"]: result["status"] for result in report["results"]} == {"font.png": "converted", "hero.png": "converted"}
+    assert run(res)["up_to_date"] == 2
+
+
+def test_other_converter_version_invalidates_state(tmp_path):
+    """Keys remembered by another converter version are dropped, the outputs come from a conversion, not the state."""
+
+    res = make_tree(tmp_path)
+    run(res)
+
+    state_path = res / ".snes-ide" / "gfxbatch.json"
+    state = json.loads(state_path.read_text())
+    state["converter"] -= 1
+    state_path.write_text(json.dumps(state))
+
+    assert run(res)["converted"] == 2
+
+
+def test_cache_is_shared_across_trees(tmp_path):
+    """A second tree with the same images and options takes its outputs from the cache."""
+
+    cache = GfxCache(tmp_path / "cache")
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+
+    first = make_tree(tmp_path / "first")
+    second = make_tree(tmp_path / "second")
+
+    assert run(first, cache)["converted"] == 2
+    assert run(second, cache)["cached"] == 2
+    assert (second / "hero.pic").read_bytes() == (first / "hero.pic").read_bytes()
+
+
+def test_converter_version_is_part_of_the_key(tmp_path, monkeypatch):
+    """Outputs cached by another converter version are never handed out."""
+
+    cache = GfxCache(tmp_path / "cache")
+    (tmp_path / "first").mkdir()
+    (tmp_path / "second").mkdir()
+
+    run(make_tree(tmp_path / "first"), cache)
+    monkeypatch.setattr(gfxbatch, "CONVERTER_VERSION", gfxbatch.CONVERTER_VERSION + 1)
+
+    assert run(make_tree(tmp_path / "second"), cache)["converted"] == 2
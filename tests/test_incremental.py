@@ -0,0 +1,118 @@
+from automatizer import SNESAutomatizer
+from depscan import DependencyScanner
+from toolstubs import stub_commands
+from pathlib import Path
+import automatizer as automatizer_module
+import watcher
+
+
+def make_project(root: Path) -> Path:
+    """Write a project where main.c includes game.h, which includes types.h, and other.c includes neither; data.asm includes hdr.inc."""
+
+    project = root / "game"
+    project.mkdir()
+
+    (project / "types.h").write_text("typedef unsigned char u8;\n")
+    (project / "game.h").write_text('#include "types.h"\nextern u8 lives;\n')
+    (project / "main.c").write_text('#include "game.h"\nu8 lives;\nint main(void) { return lives; }\n')
+    (project / "other.c").write_text("int other(void) { return 1; }\n")
+    (project / "data.asm").write_text(".include \"hdr.inc\"\n")
+    (project / "hdr.inc").write_text("; header\n")
+
+    return project
+
+
+def build(project: Path) -> int:
+    """Run one incremental build with the stand-in toolchain, as a fresh automatizer like every CLI run."""
+
+    return SNESAutomatizer(project, "LOROM", "SLOW", False, incremental=True, tool_commands=stub_commands()).build()
+
+
+def test_unchanged_project_builds_nothing(tmp_path):
+    """A second build finds every object up to date."""
+
+    project = make_project(tmp_path)
+
+    assert build(project) == 3
+    assert build(project) == 0
+
+
+def test_edited_header_makes_its_dependents_stale(tmp_path):
+    """Editing a header (even one included through another header) rebuilds only the units including it."""
+
+    project = make_project(tmp_path)
+    build(project)
+
+    (project / "types.h").write_text("typedef unsigned char u8;\ntypedef unsigned short u16;\n")
+
+    assert build(project) == 1
+    assert build(project) == 0
+
+
+def test_edited_include_rebuilds_assembly_units(tmp_path):
+    """.include dependencies of assembly files are tracked like C headers."""
+
+    project = make_project(tmp_path)
+    build(project)
+
+    (project / "hdr.inc").write_text("; header, edited\n")
+
+    assert build(project) == 1
+
+
+def test_scanner_reports_affected_sources(tmp_path):
+    """affected() follows includes transitively and keeps unrelated sources out."""
+
+    project = make_project(tmp_path)
+    sources = [project / "main.c", project / "other.c", project / "data.asm"]
+
+    scanner = DependencyScanner(project, [], tmp_path / "deps.json")
+    scanner.scan(sources)
+
+    assert scanner.affected([project / "types.h"], sources) == [project / "main.c"]
+    assert scanner.affected([project / "hdr.inc"], sources) == [project / "data.asm"]
+    assert str((project / "types.h").resolve()) in scanner.dependencies(project / "main.c")
+
+
+def test_watch_updates_the_index_and_rebuilds_affected_units(tmp_path, monkeypatch, capsys):
+    """Watch mode picks up a new C file, drops a deleted one from the link and rebuilds the dependents of an edited header."""
+
+    project = make_project(tmp_path)
+    automatizer = SNESAutomatizer(project, "LOROM", "SLOW", False, tool_commands=stub_commands())
+    linkfile = project / "linkfile"
+
+    # Each wait first checks the previous rebuild, then makes the next edit; Ctrl+C once all are done
+    steps = [
+        (lambda: (project / "extra.c").write_text("int extra(void) { return 2; }\n"), lambda: None),
+        (lambda: (project / "other.c").unlink(), lambda: project / "extra.c" in automatizer.c_files and str(project / "extra.obj") in linkfile.read_text()),
+        (lambda: (project / "game.h").write_text('#include "types.h"\nextern u8 lives, level;\n'), lambda: project / "other.c" not in automatizer.c_files and str(project / "other.obj") not in linkfile.read_text()),
+    ]
+
+    checks = []
+
+    class ScriptedWatcher(watcher.ProjectWatcher):
+
+        def __init__(self, root, ignore, polling=False):
+
+            super().__init__(root, ignore, polling)
+            self._backend.interval = 0.02
+
+        def wait(self, debounce):
+
+            if not steps:
+                raise KeyboardInterrupt
+
+            edit, check = steps.pop(0)
+            checks.append(check())
+            edit()
+
+            return super().wait(debounce)
+
+    monkeypatch.setattr(automatizer_module, "ProjectWatcher", ScriptedWatcher)
+
+    automatizer.watch(debounce=0.05, polling=True)
+
+    rebuilt = [line.split()[1] for line in capsys.readouterr().out.splitlines() if line.startswith("Rebuilt ")]
+
+    assert checks == [None, True, True]
+    assert rebuilt == ["1", "0", "1"]
@@ -0,0 +1,75 @@
+from wlaobj import WlaObject, SymbolIndex
+from linkorder import LinkOrder
+from pathlib import Path
+
+LIB_DIR = Path(__file__).parent.parent / "libs" / "pvsneslib" / "lib" / "LoROM_SlowROM"
+LIBRARIES = sorted(LIB_DIR.glob("*.obj"))
+
+
+def test_library_symbols():
+    """The shipped objects parse into their exported and imported symbols."""
+
+    libc = WlaObject(LIB_DIR / "libc.obj")
+    crt0 = WlaObject(LIB_DIR / "crt0_snes.obj")
+
+    assert {"consoleInit", "oamInit", "LzssDecodeVram"} <= libc.exports
+    assert "tcc__div" in libc.imports and "tcc__div" not in libc.exports
+    assert {"main", "consoleInit"} <= crt0.imports
+
+
+def test_select_keeps_what_startup_references(tmp_path):
+    """crt0 is always linked and pulls in libc and libtcc through its references, libm is left out."""
+
+    index = SymbolIndex(tmp_path / "symbols.json")
+
+    assert [lib.name for lib in index.select([], LIBRARIES)] == ["crt0_snes.obj", "libc.obj", "libtcc.obj"]
+
+
+def test_select_links_everything_when_an_object_is_unreadable(tmp_path):
+    """An object that can't be parsed makes the selection untrustworthy, so every library is kept."""
+
+    broken = tmp_path / "main.obj"
+    broken.write_bytes(b"not a WLA object")
+
+    assert SymbolIndex(tmp_path / "symbols.json").select([broken], LIBRARIES) == LIBRARIES
+
+
+def test_symbol_index_is_cached(tmp_path):
+    """A saved index answers for unchanged objects without reading them again."""
+
+    index = SymbolIndex(tmp_path / "symbols.json")
+    symbols = index.symbols(LIB_DIR / "libtcc.obj")
+    index.save()
+
+    assert SymbolIndex(tmp_path / "symbols.json").symbols(LIB_DIR / "libtcc.obj") == symbols
+
+
+def test_libraries_come_before_the_libraries_they_use():
+    """crt0 uses libc, which uses libtcc: the default order lists users first."""
+
+    order = [lib.name for lib in LinkOrder._library_order(LIBRARIES)]
+
+    assert order.index("crt0_snes.obj") < order.index("libc.obj") < order.index("libtcc.obj")
+
+
+def test_saved_order_is_kept_and_new_objects_are_placed(tmp_path):
+    """A confirmed order survives, an object added later goes right after the entry preceding it in the default order."""
+
+    project = tmp_path / "game"
+    project.mkdir()
+    objects = [project / "main.obj", project / "sprites.obj"]
+
+    order = LinkOrder(project, LIB_DIR, tmp_path / "linkorder.json")
+    lines = order.resolve(objects, LIBRARIES)
+
+    assert lines[0] == "[objects]"
+    assert lines[-len(LIBRARIES):] == [str(lib) for lib in LinkOrder._library_order(LIBRARIES)]
+
+    # The user moves sprites.obj in front of main.obj, then adds a file
+    confirmed = [lines[0], lines[2], lines[1]] + lines[3:]
+    order.save(confirmed)
+
+    lines = order.resolve(objects + [project / "text.obj"], LIBRARIES)
+
+    # text.obj follows sprites.obj by default, so it is placed right after it
+    assert lines[:4] == ["[objects]", str(project / "sprites.obj"), str(project / "text.obj"), str(project / "main.obj")]
@@ -0,0 +1,62 @@
+from pathlib import Path
+import numpy as np
+import pytest
+import lzss
+
+FONT = Path(__file__).parent / "template" / "pvsneslibfont.pic"
+
+
+@pytest.mark.parametrize("data", [
+    b"A",
+    b"ABC" * 1000,
+    bytes(range(256)) * 8,
+    np.random.default_rng(0).integers(0, 256, 5000, dtype=np.uint8).tobytes(),
+    np.random.default_rng(1).integers(0, 4, lzss.MAX_SIZE, dtype=np.uint8).tobytes()
+], ids=["one byte", "repeats", "ramp", "random", "largest"])
+def test_round_trip(data):
+    """Every stream decodes back to its input."""
+
+    stream = lzss.compress(data)
+
+    assert stream[0] == lzss.LZ77_TYPE
+    assert int.from_bytes(stream[1:4], "little") == len(data)
+    assert lzss.decompress(stream) == data
+
+
+def test_tiles_compress():
+    """Real tile data round trips and shrinks."""
+
+    data = FONT.read_bytes()
+    stream = lzss.compress(data)
+
+    assert lzss.verify(data, stream)
+    assert len(stream) < len(data)
+
+
+def test_overlapping_match():
+    """A match longer than its distance repeats the last bytes, as LzssDecodeVram copies byte by byte."""
+
+    # Literal "ab", then a match of 18 bytes at distance 2
+    stream = bytes([lzss.LZ77_TYPE, 20, 0, 0, 0b00100000]) + b"ab" + bytes([(18 - 3) << 4, 1])
+
+    assert lzss.decompress(stream) == b"ab" * 10
+
+
+@pytest.mark.parametrize("size", [0, lzss.MAX_SIZE + 1])
+def test_sizes_the_decoder_cannot_take(size):
+    """Empty data and more than 64 KiB are refused."""
+
+    with pytest.raises(Exception):
+        lzss.compress(bytes(size))
+
+
+def test_benchmark_covers_whole_files(tmp_path):
+    """Files bigger than one stream are measured in full, as several streams."""
+
+    big = tmp_path / "big.pic"
+    big.write_bytes(bytes(range(256)) * 1000)
+
+    report = lzss.benchmark([big])
+
+    assert report["bytes"] == 256000
+    assert report["failed"] == []
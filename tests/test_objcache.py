@@ -0,0 +1,67 @@
+from automatizer import SNESAutomatizer
+from objcache import ObjectCache
+from toolstubs import stub_commands
+from pathlib import Path
+import os
+
+
+def test_store_then_fetch(tmp_path):
+    """A stored object is copied back byte for byte, unknown keys miss."""
+
+    cache = ObjectCache(tmp_path / "cache")
+    built = tmp_path / "main.obj"
+    built.write_bytes(b"WLAa object")
+
+    cache.store("ab" * 32, built)
+
+    assert cache.fetch("ab" * 32, tmp_path / "copy.obj")
+    assert (tmp_path / "copy.obj").read_bytes() == b"WLAa object"
+    assert not cache.fetch("cd" * 32, tmp_path / "missing.obj")
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_failed_store_leaves_no_temporary_file(tmp_path):
+    """A store whose copy fails is skipped without leaving its temporary file in the cache."""
+
+    cache = ObjectCache(tmp_path / "cache")
+
+    cache.store("ab" * 32, tmp_path / "missing.obj")
+
+    assert not cache.fetch("ab" * 32, tmp_path / "copy.obj")
+    assert not list((tmp_path / "cache").rglob("*.tmp"))
+
+
+def test_evict_removes_least_recently_used(tmp_path):
+    """Eviction brings the cache under its cap, oldest objects first."""
+
+    cache = ObjectCache(tmp_path / "cache", max_size=250)
+    built = tmp_path / "unit.obj"
+    built.write_bytes(b"x" * 100)
+
+    for age, key in enumerate(("aa" * 32, "bb" * 32, "cc" * 32)):
+
+        cache.store(key, built)
+        os.utime(cache._path(key), (1000 + age, 1000 + age))
+
+    cache.evict()
+
+    assert not cache._path("aa" * 32).exists()
+    assert cache._path("bb" * 32).exists() and cache._path("cc" * 32).exists()
+
+
+def test_identical_units_are_shared_across_projects(tmp_path):
+    """A second project with the same sources takes every object from the cache instead of compiling it."""
+
+    cache = ObjectCache(tmp_path / "cache")
+
+    for name in ("first", "second"):
+
+        project = tmp_path / name
+        project.mkdir()
+        (project / "main.c").write_text("int main(void) { return 0; }\n")
+        (project / "data.asm").write_text("; data\n")
+
+        SNESAutomatizer(project, "LOROM", "SLOW", False, object_cache=cache, tool_commands=stub_commands()).build()
+
+    assert (cache.hits, cache.misses) == (2, 2)
+    assert (tmp_path / "second" / "main.obj").read_bytes() == (tmp_path / "first" / "main.obj").read_bytes()
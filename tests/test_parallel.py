@@ -0,0 +1,74 @@
+from automatizer import SNESAutomatizer, SNESMatrixBuild
+from toolstubs import stub_commands
+from pathlib import Path
+import pytest
+import sys
+
+# 816-tcc stand-in failing on broken.c at once and taking its time on every other file
+SLOW_OR_BROKEN_TCC = '''import subprocess
+import time
+import sys
+
+if any(arg.endswith("broken.c") for arg in sys.argv):
+    sys.exit("broken.c:1: error: declaration expected")
+
+time.sleep(5)
+sys.exit(subprocess.run({stub!r} + sys.argv[1:]).returncode)
+'''
+
+
+def make_project(root: Path, count: int) -> Path:
+    """Write a project of count C files."""
+
+    project = root / "game"
+    project.mkdir()
+
+    for number in range(count):
+        (project / f"unit{number}.c").write_text(f"int unit{number}(void) {{ return {number}; }}\n")
+
+    return project
+
+
+def test_failing_unit_stops_the_build(tmp_path):
+    """The first failure cancels the queued units and kills the running ones, and the build raises its error."""
+
+    project = make_project(tmp_path, 8)
+    (project / "broken.c").write_text("int broken(void) {\n")
+
+    commands = stub_commands()
+    tcc = tmp_path / "tcc.py"
+    tcc.write_text(SLOW_OR_BROKEN_TCC.format(stub=commands["816-tcc"]))
+    commands["816-tcc"] = [sys.executable, str(tcc)]
+
+    automatizer = SNESAutomatizer(project, "LOROM", "SLOW", False, jobs=2, incremental=True, tool_commands=commands)
+    automatizer.collect_files()
+    automatizer.c_files.sort(key=lambda file: file.name != "broken.c")
+
+    with pytest.raises(Exception, match="declaration expected"):
+        automatizer.compile_c_files()
+
+    # broken.c runs first, its neighbour is killed and the other units never start
+    assert not list(project.glob("*.obj"))
+    assert not (project / "output.sfc").exists()
+
+
+def test_matrix_variants_build_in_their_own_directories(tmp_path):
+    """Every configuration gets its objects, linkfile and ROM, none of them leaks into another's build directory."""
+
+    project = make_project(tmp_path, 3)
+    build_root = tmp_path / "build"
+    configurations = [("LOROM", "SLOW"), ("HIROM", "FAST")]
+
+    matrix = SNESMatrixBuild(project, configurations, False, build_dir=build_root, incremental=True, tool_commands=stub_commands())
+
+    assert matrix.build() == {"LoROM_SlowROM": 3, "HiROM_FastROM": 3}
+
+    for name in ("LoROM_SlowROM", "HiROM_FastROM"):
+
+        variant_dir = build_root / name
+
+        assert sorted(file.name for file in variant_dir.glob("*.obj")) == ["unit0.obj", "unit1.obj", "unit2.obj"]
+        assert all(line.startswith(("[", str(variant_dir))) for line in (variant_dir / "linkfile").read_text().splitlines() if line)
+        assert (project / f"output_{name}.sfc").exists()
+
+    assert not list(project.glob("*.obj"))
@@ -0,0 +1,38 @@
+from automatizer import SNESAutomatizer
+from toolstubs import stub_commands
+from pathlib import Path
+
+
+def make_project(root: Path) -> Path:
+    """Write a project of one C file."""
+
+    project = root / "game"
+    project.mkdir()
+
+    (project / "main.c").write_text("int main(void) { return 0; }\n")
+
+    return project
+
+
+def test_release_build_keeps_intermediates_out_of_the_project(tmp_path):
+    """Outside debug mode .ps/.asp/.asm intermediates go to the scratch area, which is removed after the build."""
+
+    project = make_project(tmp_path)
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+
+    SNESAutomatizer(project, "LOROM", "SLOW", False, scratch_root=scratch, tool_commands=stub_commands()).build()
+
+    assert (project / "main.obj").is_file()
+    assert not any((project / f"main{suffix}").exists() for suffix in (".ps", ".asp", ".asm"))
+    assert list(scratch.iterdir()) == []
+
+
+def test_debug_build_keeps_intermediates_beside_the_objects(tmp_path):
+    """Debug builds keep every intermediate next to its object for inspection."""
+
+    project = make_project(tmp_path)
+
+    SNESAutomatizer(project, "LOROM", "SLOW", True, scratch_root=tmp_path, tool_commands=stub_commands()).build()
+
+    assert all((project / f"main{suffix}").is_file() for suffix in (".obj", ".ps", ".asp", ".asm"))
@@ -0,0 +1,58 @@
+from automatizer import SNESAutomatizer
+from spritepacker import SpritePacker
+from toolstubs import stub_commands
+from PIL import Image
+from pathlib import Path
+import numpy as np
+
+
+def make_sheet(path: Path):
+    """Write a 16 color sheet of two 32x32 frames, the second the mirror of the first."""
+
+    frame = np.zeros((32, 32), dtype=np.uint8)
+    frame[4:28, 2:20] = 1
+    frame[10:14, 6:30] = 2
+
+    image = Image.fromarray(np.hstack([frame, frame[:, ::-1]]), mode="P")
+    image.putpalette([0, 0, 0, 248, 0, 0, 0, 248, 0] + [0] * (3 * 253))
+    image.save(path)
+
+
+def test_packed_files_build_and_link(tmp_path):
+    """The generated .c, .h and data unit are built as separate units and both objects are linked."""
+
+    project = tmp_path / "game"
+    project.mkdir()
+    (project / "main.c").write_text('#include "hero.h"\nint main(void) { return 0; }\n')
+
+    make_sheet(tmp_path / "hero.png")
+    SpritePacker().pack_file(tmp_path / "hero.png", 32, 32, project / "hero")
+
+    data = (project / "hero_data.asm").read_text()
+
+    assert data.startswith('.include "hdr.asm"\n')
+    assert '.incbin "hero.pal"' in data
+
+    automatizer = SNESAutomatizer(project, "LOROM", "SLOW", False, incremental=True, tool_commands=stub_commands())
+
+    assert automatizer.build() == 3
+
+    linked = (project / "linkfile").read_text().splitlines()
+
+    assert str(project / "hero.obj") in linked and str(project / "hero_data.obj") in linked
+
+
+def test_debug_build_keeps_the_data_unit(tmp_path):
+    """In debug mode the C unit's intermediate hero.asm lands beside hero.c without touching the data unit."""
+
+    project = tmp_path / "game"
+    project.mkdir()
+
+    make_sheet(tmp_path / "hero.png")
+    SpritePacker().pack_file(tmp_path / "hero.png", 32, 32, project / "hero")
+    data = (project / "hero_data.asm").read_text()
+
+    SNESAutomatizer(project, "LOROM", "SLOW", True, tool_commands=stub_commands()).build()
+
+    assert (project / "hero_data.asm").read_text() == data
+    assert (project / "hero.asm").exists()
@@ -0,0 +1,115 @@
+from pathlib import Path
+import numpy as np
+import subprocess
+import tmxcompiler
+import json
+import sys
+
+EXAMPLES = Path(__file__).parent.parent / "docs" / "examples"
+TILED = EXAMPLES / "maps" / "tiled" / "maplevel01.tmx"
+OBJECTS = EXAMPLES / "objects" / "mapandobjects" / "tiledMario.tmx"
+
+
+def words(path: Path) -> list[int]:
+    """Read a compiled file as little endian words."""
+
+    return np.frombuffer(path.read_bytes(), dtype="<u2").tolist()
+
+
+def test_tiled_example(tmp_path):
+    """The map of the tiled example compiles to the layer, definitions and attributes its Tiled JSON export describes."""
+
+    export = json.loads(TILED.with_suffix(".tmj").read_text())
+    layer = next(layer for layer in export["layers"] if layer["type"] == "tilelayer")
+    tileset = export["tilesets"][0]
+
+    result = tmxcompiler.compile_map(TILED, "tiledMap", tmp_path)
+
+    assert "error" not in result
+    assert result["files"] == ["BG1.m16", "tiledMap.b16", "tiledMap.o16", "tiledMap.t16"]
+
+    # mapLoad's header (width and height in pixels) then the entries: tile number and flip bits
+    m16 = words(tmp_path / "BG1.m16")
+    gids = np.array(layer["data"], dtype=np.uint32)
+    expected = (np.maximum((gids & tmxcompiler.TILED_GID_MASK).astype(np.int64) - 1, 0)
+                | np.where(gids & tmxcompiler.TILED_FLIP_H, tmxcompiler.FLIP_H_BIT, 0)
+                | np.where(gids & tmxcompiler.TILED_FLIP_V, tmxcompiler.FLIP_V_BIT, 0))
+
+    assert m16[:2] == [export["width"] * export["tilewidth"], export["height"] * export["tileheight"]]
+    assert m16[3:] == expected.tolist()
+
+    definitions = words(tmp_path / "tiledMap.t16")
+    attributes = words(tmp_path / "tiledMap.b16")
+
+    assert len(definitions) == len(attributes) == tileset["tilecount"]
+
+    for tile in tileset["tiles"]:
+
+        properties = {prop["name"]: prop["value"] for prop in tile["properties"]}
+
+        assert definitions[tile["id"]] == tile["id"] | int(properties["palette"]) << 10 | int(properties["priority"]) << 13
+        assert attributes[tile["id"]] == int(properties["attribute"], 16)
+
+    # No entities in this map, only the end marker
+    assert words(tmp_path / "tiledMap.o16") == [tmxcompiler.OBJECTS_END]
+
+
+def test_objects(tmp_path):
+    """Objects are written as x, y, type, minx, maxx, ended by FFFF."""
+
+    export = json.loads(OBJECTS.with_suffix(".tmj").read_text())
+    objects = next(layer for layer in export["layers"] if layer["type"] == "objectgroup")["objects"]
+
+    tmxcompiler.compile_map(OBJECTS, "mario", tmp_path)
+
+    expected = []
+
+    for obj in objects:
+
+        properties = {prop["name"]: prop["value"] for prop in obj.get("properties", [])}
+        expected += [int(obj["x"]), int(obj["y"]), int(obj["type"]), int(properties.get("minx", 0)), int(properties.get("maxx", 0))]
+
+    assert words(tmp_path / "mario.o16") == expected + [tmxcompiler.OBJECTS_END]
+
+
+def test_pages(tmp_path):
+    """With pages every layer is also written as a BG map in whole 32x32 pages."""
+
+    result = tmxcompiler.compile_map(TILED, "tiledMap", tmp_path, pages=True)
+    layer = tmxcompiler.TmxMap(TILED).layers["BG1"]
+    rows, cols = layer.shape
+
+    assert "BG1.map" in result["files"]
+    assert len(words(tmp_path / "BG1.map")) == -(-rows // 32) * -(-cols // 32) * 32 * 32
+
+
+def test_errors_are_reported(tmp_path):
+    """A broken map is reported in the result instead of raising."""
+
+    broken = tmp_path / "broken.tmx"
+    broken.write_text("<map")
+
+    assert "error" in tmxcompiler.compile_map(broken, output_dir=tmp_path)
+
+
+def test_directory_outputs_mirror_the_maps(tmp_path):
+    """In directory mode the outputs go below output_dir in the maps' own subdirectories, the maps' tree is left alone."""
+
+    before = {path: path.read_bytes() for path in (EXAMPLES / "maps").rglob("*") if path.is_file()}
+
+    results = tmxcompiler.compile_directory(EXAMPLES / "maps", workers=1, output_dir=tmp_path)
+
+    assert len(results) == 3 and not any("error" in result for result in results)
+    assert (tmp_path / "tiled" / "maplevel01.t16").exists() and (tmp_path / "mapscroll" / "tiledMario.o16").exists()
+    assert {path: path.read_bytes() for path in (EXAMPLES / "maps").rglob("*") if path.is_file()} == before
+
+
+def test_map_name_is_rejected_with_a_directory(tmp_path):
+    """A map name can't apply to every map of a directory, the CLI refuses it."""
+
+    script = Path(tmxcompiler.__file__)
+    result = subprocess.run([sys.executable, str(script), str(EXAMPLES / "maps"), "level", "-o", str(tmp_path)], capture_output=True, text=True)
+
+    assert result.returncode == 2
+    assert "map_name" in result.stderr
+    assert not list(tmp_path.iterdir())
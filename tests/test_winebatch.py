@@ -0,0 +1,92 @@
+from automatizer import SNESAutomatizer
+from pathlib import Path
+import toolstubs
+import json
+import sys
+
+# Stands in for wine: runs "cmd /c <batch>" line by line and every tool through toolstubs.py
+FAKE_WINE = '''#!{python}
+from pathlib import Path
+import subprocess
+import shlex
+import sys
+import re
+
+STUBS = [{python!r}, {stubs!r}]
+
+
+def unix(text):
+    return re.sub(r'Z:(\\\\[^"]*)', lambda match: match.group(1).replace('\\\\', '/'), text)
+
+
+def run(args, stdout=None):
+    return subprocess.run(STUBS + [Path(args[0]).stem] + args[1:], stdout=stdout).returncode
+
+
+if sys.argv[1] != 'cmd':
+    sys.exit(run([unix(arg) for arg in sys.argv[1:]]))
+
+code = 0
+
+for line in Path(unix(sys.argv[3])).read_text().splitlines():
+
+    words = shlex.split(unix(line))
+
+    if line == '@echo off':
+        continue
+
+    if words[0] == 'echo':
+        print(" ".join(words[1:]))
+
+    elif words[0] == 'if':
+        if code:
+            sys.exit(1)
+
+    elif words[0] == 'type':
+        Path(words[3]).touch()
+
+    elif '>' in words:
+        with open(words[words.index('>') + 1], 'w') as f:
+            code = run(words[:words.index('>')], f)
+
+    else:
+        code = run(words)
+'''
+
+
+def test_batch_steps_are_traced_per_unit(tmp_path):
+    """A Wine batch leaves a trace event per unit and stage, and no batch file in the project, even in debug mode."""
+
+    project = tmp_path / "game"
+    project.mkdir()
+
+    for name in ("main", "sprites", "text"):
+        (project / f"{name}.c").write_text(f"int {name}(void) {{ return 0; }}\n")
+
+    wine = tmp_path / "wine"
+    wine.write_text(FAKE_WINE.format(python=sys.executable, stubs=str(Path(toolstubs.__file__).absolute())))
+    wine.chmod(0o755)
+
+    automatizer = SNESAutomatizer(project, "LOROM", "SLOW", True, jobs=2, timings_dir=tmp_path / "timings")
+    tools = [automatizer.cc, automatizer.opt, automatizer.ctf, automatizer.assembler, automatizer.linker]
+
+    toolchain = automatizer.toolchain
+    toolchain.wine, toolchain.wineserver, toolchain.batch = str(wine), None, True
+    toolchain._commands = {tool: [str(wine), str(tool)] for tool in tools}
+
+    assert automatizer.build() == 3
+    assert not list(project.glob("*.bat"))
+
+    events = automatizer.trace.events
+    batches = [event for event in events if event["stage"] == "wine-batch"]
+    steps = [(Path(event["file"]).name, event["stage"]) for event in events if event["stage"] not in ("wine-batch", "wlalink")]
+
+    # Two workers: one batch of main.c and text.c, one of sprites.c
+    assert sorted(len(event["files"]) for event in batches) == [1, 2]
+    assert sorted(steps) == sorted((f"{name}.c", stage) for name in ("main", "sprites", "text") for stage in ("816-tcc", "816-opt", "constify", "wla-65816"))
+
+    # The batches are left out of the per-file totals, which their steps fill
+    timings = json.loads((tmp_path / "timings" / "build-timings.json").read_text())
+
+    assert timings["files"][str(project / "main.c")]["count"] == 4
+    assert timings["stages"]["wine-batch"]["count"] == 2